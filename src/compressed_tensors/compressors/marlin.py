@@ -0,0 +1,396 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from functools import lru_cache
+from typing import Dict, Generator, Optional, Tuple
+
+import numpy as np
+import torch
+from compressed_tensors.compressors import Compressor
+from compressed_tensors.compressors.marlin_24 import (
+    marlin_permute_weights,
+    marlin_unpermute_weights,
+    unpack_marlin_int32,
+)
+from compressed_tensors.compressors.utils import get_permutations_marlin
+from compressed_tensors.config import CompressionFormat
+from compressed_tensors.quantization import QuantizationArgs, QuantizationStrategy
+from compressed_tensors.quantization.lifecycle.forward import dequantize, quantize
+from compressed_tensors.utils import (
+    get_nested_weight_mappings,
+    is_quantization_param,
+    merge_names,
+)
+from safetensors import safe_open
+from torch import Tensor
+from tqdm import tqdm
+
+
+__all__ = [
+    "MarlinCompressor",
+    "pack_weight_marlin",
+    "pack_scales_marlin",
+    "unpack_weight_marlin",
+    "unpack_scales_marlin",
+]
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+MARLIN_SUPPORTED_GROUP_SIZES = [32, 64, 128]
+
+# the Marlin tile layout needs the output dim (size_n) to be a multiple of the
+# minimum kernel thread width and the input dim (size_k) a multiple of the tile size
+MARLIN_MIN_THREAD_N = 64
+MARLIN_TILE_SIZE = 16
+
+
+@Compressor.register(name=CompressionFormat.marlin.value)
+class MarlinCompressor(Compressor):
+    """
+    Compresses a dense quantized model for inference with the Marlin kernel. Weights
+    and scales are permuted into the Marlin tile layout at export time, so they can be
+    consumed by the kernel without being repacked at load time
+    """
+
+    COMPRESSION_PARAM_NAMES = ["weight_packed", "scale_packed"]
+
+    @staticmethod
+    def validate_quant_compatability(
+        model_quant_args: Dict[str, QuantizationArgs],
+        weight_shapes: Optional[Dict[str, Tuple[int, ...]]] = None,
+    ) -> bool:
+        """
+        Checks if every quantized module in the model is compatible with Marlin
+        compression. Quantization must be channel or group strategy with group_size
+        of 32, 64 or 128. Only symmetric quantization is supported. Weights must have
+        a number of output channels divisible by 64 and of input channels divisible
+        by 16
+
+        :param model_quant_args: dictionary of mapping module names to their
+            quantization configuration
+        :param weight_shapes: optional dictionary mapping module names to the
+            (output, input) shape of their weight, shapes are not checked if None
+        :return: True if all modules are compatible with Marlin compression, raises
+            a ValueError otherwise
+        """
+        weight_shapes = weight_shapes or {}
+        for name, quant_args in model_quant_args.items():
+            strategy = quant_args.strategy
+            group_size = quant_args.group_size
+            symmetric = quant_args.symmetric
+            if (
+                strategy != QuantizationStrategy.GROUP
+                and strategy != QuantizationStrategy.CHANNEL
+            ):
+                raise ValueError(
+                    f"Marlin Compressor is only valid for group and channel "
+                    f"quantization strategies, got {strategy} in {name}"
+                )
+
+            if (
+                strategy == QuantizationStrategy.GROUP
+                and group_size not in MARLIN_SUPPORTED_GROUP_SIZES
+            ):
+                raise ValueError(
+                    f"Marlin Compressor is only valid for group sizes "
+                    f"{MARLIN_SUPPORTED_GROUP_SIZES}, got {group_size} in {name}"
+                )
+
+            if not symmetric:
+                raise ValueError(
+                    f"Marlin Compressor is only valid for symmetric quantzation, "
+                    f"got symmetric={symmetric} in {name}"
+                )
+
+            weight_shape = weight_shapes.get(name)
+            if weight_shape is not None:
+                size_n, size_k = weight_shape[0], weight_shape[-1]
+                if size_n % MARLIN_MIN_THREAD_N != 0 or size_k % MARLIN_TILE_SIZE != 0:
+                    raise ValueError(
+                        f"Marlin Compressor is only valid for weights with output "
+                        f"channels divisible by {MARLIN_MIN_THREAD_N} and input "
+                        f"channels divisible by {MARLIN_TILE_SIZE}, got weight shape "
+                        f"{tuple(weight_shape)} in {name}"
+                    )
+
+        return True
+
+    def compress(
+        self,
+        model_state: Dict[str, Tensor],
+        names_to_scheme: Dict[str, QuantizationArgs],
+        **kwargs,
+    ) -> Dict[str, Tensor]:
+        """
+        Compresses a quantized state_dict for inference with the Marlin kernel
+
+        :param model_state: state dict of uncompressed model
+        :param names_to_scheme: quantization args for each quantized weight, needed for
+           quantize function to calculate bit depth
+        :return: compressed state dict
+        """
+        weight_shapes = {
+            prefix: model_state[merge_names(prefix, "weight")].shape
+            for prefix in names_to_scheme
+            if merge_names(prefix, "weight") in model_state
+        }
+        self.validate_quant_compatability(names_to_scheme, weight_shapes)
+
+        compressed_dict = {}
+        weight_suffix = ".weight"
+        _LOGGER.debug(
+            f"Compressing model with {len(model_state)} parameterized layers..."
+        )
+
+        for name, value in tqdm(model_state.items(), desc="Compressing model"):
+            if name.endswith(weight_suffix):
+                prefix = name[: -(len(weight_suffix))]
+                scale = model_state.get(merge_names(prefix, "weight_scale"), None)
+                zp = model_state.get(merge_names(prefix, "weight_zero_point"), None)
+                if scale is not None:  # weight is quantized, compress it
+
+                    # Marlin kernel requires float16 inputs
+                    scale = scale.to(torch.float16)
+                    value = value.to(torch.float16)
+
+                    # quantize weight, keeping it as a float16 for now
+                    quant_args = names_to_scheme[prefix]
+                    value = quantize(
+                        x=value, scale=scale, zero_point=zp, args=quant_args
+                    )
+
+                    # Marlin kernel expects input dim first
+                    value = value.t().contiguous().cpu()
+                    scale = scale.t().contiguous().cpu()
+                    og_weight_shape = value.shape
+
+                    # Marlin kernel expects unsigned values, shift zero-point
+                    value += (1 << quant_args.num_bits) // 2
+
+                    # pack quantized weight and scale
+                    value = pack_weight_marlin(value, quant_args)
+                    packed_scale = pack_scales_marlin(
+                        scale, quant_args, og_weight_shape
+                    )
+
+                    # save compressed values
+                    compressed_dict[merge_names(prefix, "scale_packed")] = packed_scale
+                    compressed_dict[merge_names(prefix, "weight_packed")] = value
+                    continue
+
+            if not is_quantization_param(name):
+                # export unquantized parameters without modifying
+                compressed_dict[name] = value.to("cpu")
+
+        return compressed_dict
+
+    def decompress(
+        self,
+        path_to_model_or_tensors: str,
+        device: str = "cpu",
+        names_to_scheme: Optional[Dict[str, QuantizationArgs]] = None,
+        **kwargs,
+    ) -> Generator[Tuple[str, Tensor], None, None]:
+        """
+        Reads a Marlin compressed state dict located at path_to_model_or_tensors
+        and returns a generator for sequentially decompressing back to a
+        dense state dict
+
+        :param path_to_model_or_tensors: path to compressed safetensors model
+            (directory with one or more safetensors files) or compressed tensors file
+        :param device: optional device to load intermediate weights into
+        :param names_to_scheme: quantization args for each quantized weight, needed
+            to infer the bit depth and scale layout of each packed weight
+        :return: iterator for generating decompressed weights
+        """
+        if names_to_scheme is None:
+            raise ValueError(
+                f"{self.__class__.__name__} requires names_to_scheme to decompress"
+            )
+
+        weight_mappings = get_nested_weight_mappings(
+            path_to_model_or_tensors, self.COMPRESSION_PARAM_NAMES
+        )
+        for weight_name in weight_mappings.keys():
+            weight_data = {}
+            for param_name, safe_path in weight_mappings[weight_name].items():
+                full_name = merge_names(weight_name, param_name)
+                with safe_open(safe_path, framework="pt", device=device) as f:
+                    weight_data[param_name] = f.get_tensor(full_name)
+
+            quant_args = names_to_scheme[weight_name]
+            packed_weight = weight_data["weight_packed"]
+
+            # packed weight is stored in (size_k // 16, size_n * 16 // pack_factor)
+            pack_factor = 32 // quant_args.num_bits
+            size_k = packed_weight.shape[0] * 16
+            size_n = packed_weight.shape[1] * pack_factor // 16
+            og_weight_shape = (size_k, size_n)
+
+            # unpack quantized weight and scale
+            value = unpack_weight_marlin(packed_weight, quant_args, og_weight_shape)
+            scale = unpack_scales_marlin(
+                weight_data["scale_packed"], quant_args, og_weight_shape
+            )
+
+            # Marlin kernel expects unsigned values, shift back to signed
+            value -= (1 << quant_args.num_bits) // 2
+
+            # restore output dim first
+            value = value.t().contiguous().to(torch.float16)
+            scale = scale.t().contiguous()
+
+            decompressed = dequantize(x_q=value, scale=scale, args=quant_args)
+            yield merge_names(weight_name, "weight"), decompressed
+            # scales are only stored in packed form, restore the unpacked scale
+            yield merge_names(weight_name, "weight_scale"), scale
+
+
+def pack_weight_marlin(
+    weight: Tensor,
+    quantization_args: QuantizationArgs,
+    tile: int = 16,
+) -> Tensor:
+    """
+    Permutes an unsigned quantized weight into the Marlin tile layout and packs it
+    into int32s
+
+    :param weight: unsigned quantized weight of shape (size_k, size_n)
+    :param quantization_args: quantization args the weight was quantized with
+    :param tile: marlin tile size
+    :return: packed int32 weight of shape (size_k // tile, size_n * tile // 8) for
+        4 bit weights
+    """
+    size_k = weight.shape[0]
+    size_n = weight.shape[1]
+    num_bits = quantization_args.num_bits
+    pack_factor = 32 // num_bits
+
+    # Reshuffle to marlin format
+    perm, _, _ = get_permutations_marlin(num_bits)
+    q_w = marlin_permute_weights(weight, size_k, size_n, perm, tile)
+
+    q_w = q_w.cpu().numpy().astype(np.uint32)
+
+    q_packed = np.zeros((q_w.shape[0], q_w.shape[1] // pack_factor), dtype=np.uint32)
+    for i in range(pack_factor):
+        q_packed |= q_w[:, i::pack_factor] << num_bits * i
+
+    q_packed = torch.from_numpy(q_packed.astype(np.int32))
+
+    return q_packed
+
+
+def pack_scales_marlin(
+    scales: Tensor, quantization_args: QuantizationArgs, w_shape: Tuple[int, int]
+) -> Tensor:
+    """
+    Permutes scales into the order expected by the Marlin kernel
+
+    :param scales: scales of shape (num_groups, size_n)
+    :param quantization_args: quantization args the weight was quantized with
+    :param w_shape: (size_k, size_n) shape of the quantized weight
+    :return: permuted scales of shape (num_groups, size_n)
+    """
+    size_k = w_shape[0]
+    size_n = w_shape[1]
+    num_bits = quantization_args.num_bits
+
+    _, scale_perm, scale_perm_single = get_permutations_marlin(num_bits)
+
+    if _is_grouped(quantization_args, size_k):
+        scales = scales.reshape((-1, len(scale_perm)))[:, scale_perm]
+    else:  # channelwise
+        scales = scales.reshape((-1, len(scale_perm_single)))[:, scale_perm_single]
+    scales = scales.reshape((-1, size_n)).contiguous()
+
+    return scales
+
+
+def unpack_weight_marlin(
+    packed: Tensor,
+    quantization_args: QuantizationArgs,
+    w_shape: Tuple[int, int],
+    tile: int = 16,
+) -> Tensor:
+    """
+    Inverse of pack_weight_marlin, unpacks and un-permutes an int32 packed weight
+
+    :param packed: packed int32 weight produced by pack_weight_marlin
+    :param quantization_args: quantization args the weight was packed with
+    :param w_shape: (size_k, size_n) shape of the weight before packing
+    :param tile: marlin tile size the weight was permuted with
+    :return: unsigned quantized values in shape w_shape, stored as int32
+    """
+    size_k, size_n = w_shape
+    num_bits = quantization_args.num_bits
+
+    q_w = unpack_marlin_int32(packed, num_bits)
+    inv_perm, _, _ = _get_inverse_permutations_marlin(num_bits)
+    return marlin_unpermute_weights(
+        q_w, size_k, size_n, inv_perm.to(packed.device), tile
+    )
+
+
+def unpack_scales_marlin(
+    scales: Tensor, quantization_args: QuantizationArgs, w_shape: Tuple[int, int]
+) -> Tensor:
+    """
+    Inverse of pack_scales_marlin
+
+    :param scales: packed scales produced by pack_scales_marlin
+    :param quantization_args: quantization args the scales were packed with
+    :param w_shape: (size_k, size_n) shape of the weight before packing
+    :return: scales in (num_groups, size_n) order
+    """
+    size_k = w_shape[0]
+    size_n = w_shape[1]
+    num_bits = quantization_args.num_bits
+
+    _, inv_scale_perm, inv_scale_perm_single = _get_inverse_permutations_marlin(
+        num_bits
+    )
+
+    if _is_grouped(quantization_args, size_k):
+        inv_perm = inv_scale_perm
+    else:  # channelwise
+        inv_perm = inv_scale_perm_single
+    inv_perm = inv_perm.to(scales.device)
+    scales = scales.reshape((-1, inv_perm.numel()))[:, inv_perm]
+    scales = scales.reshape((-1, size_n)).contiguous()
+
+    return scales
+
+
+def _is_grouped(quantization_args: QuantizationArgs, size_k: int) -> bool:
+    # a single group spanning all input channels is laid out like channelwise scales
+    return (
+        quantization_args.strategy == QuantizationStrategy.GROUP
+        and quantization_args.group_size < size_k
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_inverse_permutations_marlin(
+    num_bits: int,
+) -> Tuple[Tensor, Tensor, Tensor]:
+    # inverses of the weight and scale permutations from get_permutations_marlin,
+    # shared between all layers with the same bit depth
+    perm, scale_perm, scale_perm_single = get_permutations_marlin(num_bits)
+    return (
+        torch.argsort(perm),
+        torch.argsort(torch.tensor(scale_perm)),
+        torch.argsort(torch.tensor(scale_perm_single)),
+    )
@@ -13,7 +13,8 @@
 # limitations under the License.
 
 import logging
-from typing import Dict, Generator, Tuple
+from functools import lru_cache
+from typing import Dict, Generator, Optional, Tuple
 
 import numpy as np
 import torch
@@ -21,12 +22,18 @@ from compressed_tensors.compressors import Compressor
 from compressed_tensors.compressors.utils import (
     get_permutations_24,
     sparse_semi_structured_from_dense_cutlass,
+    sparse_semi_structured_to_dense_cutlass,
     tensor_follows_mask_structure,
 )
 from compressed_tensors.config import CompressionFormat
 from compressed_tensors.quantization import QuantizationArgs, QuantizationStrategy
-from compressed_tensors.quantization.lifecycle.forward import quantize
-from compressed_tensors.utils import is_quantization_param, merge_names
+from compressed_tensors.quantization.lifecycle.forward import dequantize, quantize
+from compressed_tensors.utils import (
+    get_nested_weight_mappings,
+    is_quantization_param,
+    merge_names,
+)
+from safetensors import safe_open
 from torch import Tensor
 from tqdm import tqdm
 
@@ -38,7 +45,7 @@ _LOGGER: logging.Logger = logging.getLogger(__name__)
 class Marlin24Compressor(Compressor):
     """
     Compresses a quantized model with 2:4 sparsity structure for inference with the
-    Marlin24 kernel. Decompression is not implemented for this compressor.
+    Marlin24 kernel
     """
 
     COMPRESSION_PARAM_NAMES = ["weight_packed", "scale_packed", "meta"]
@@ -175,11 +182,68 @@ class Marlin24Compressor(Compressor):
         return compressed_dict
 
     def decompress(
-        self, path_to_model_or_tensors: str, device: str = "cpu", **kwargs
+        self,
+        path_to_model_or_tensors: str,
+        device: str = "cpu",
+        names_to_scheme: Optional[Dict[str, QuantizationArgs]] = None,
+        **kwargs,
     ) -> Generator[Tuple[str, Tensor], None, None]:
-        raise NotImplementedError(
-            "Decompression is not implemented for the Marlin24 Compressor."
+        """
+        Reads a Marlin24 compressed state dict located at path_to_model_or_tensors
+        and returns a generator for sequentially decompressing back to a
+        dense state dict. Each layer is unpacked, un-permuted and expanded from its
+        2:4 sparse representation independently
+
+        :param path_to_model_or_tensors: path to compressed safetensors model
+            (directory with one or more safetensors files) or compressed tensors file
+        :param device: optional device to load intermediate weights into
+        :param names_to_scheme: quantization args for each quantized weight, needed
+            to infer the bit depth and scale layout of each packed weight
+        :return: iterator for generating decompressed weights
+        """
+        if names_to_scheme is None:
+            raise ValueError(
+                f"{self.__class__.__name__} requires names_to_scheme to decompress"
+            )
+
+        weight_mappings = get_nested_weight_mappings(
+            path_to_model_or_tensors, self.COMPRESSION_PARAM_NAMES
         )
+        for weight_name in weight_mappings.keys():
+            weight_data = {}
+            for param_name, safe_path in weight_mappings[weight_name].items():
+                full_name = merge_names(weight_name, param_name)
+                with safe_open(safe_path, framework="pt", device=device) as f:
+                    weight_data[param_name] = f.get_tensor(full_name)
+
+            quant_args = names_to_scheme[weight_name]
+            packed_weight = weight_data["weight_packed"]
+            meta = weight_data["meta"]
+
+            # Marlin24 kernel expects input dim first, with 2:4 compressed rows
+            size_k = packed_weight.shape[0] * 16
+            size_n = meta.shape[1] // 2
+            og_weight_shape = (size_k, size_n)
+
+            # unpack quantized weight and scale
+            value = unpack_weight_24(packed_weight, quant_args, og_weight_shape)
+            scale = unpack_scales_24(
+                weight_data["scale_packed"], quant_args, og_weight_shape
+            )
+
+            # Marlin24 kernel expects unsigned values, shift back to signed
+            value -= (1 << quant_args.num_bits) // 2
+
+            # restore output dim first and expand the 2:4 compressed weight
+            value = value.t().contiguous().to(torch.float16)
+            scale = scale.t().contiguous()
+            meta = meta.reshape(size_n, meta.numel() // size_n)
+            value = decompress_weight_24(value, meta)
+
+            decompressed = dequantize(x_q=value, scale=scale, args=quant_args)
+            yield merge_names(weight_name, "weight"), decompressed
+            # scales are only stored in packed form, restore the unpacked scale
+            yield merge_names(weight_name, "weight_scale"), scale
 
 
 def compress_weight_24(weight: Tensor):
@@ -189,6 +253,18 @@ def compress_weight_24(weight: Tensor):
     return w_comp, meta
 
 
+def decompress_weight_24(weight: Tensor, meta: Tensor) -> Tensor:
+    """
+    Inverse of compress_weight_24, expands a 2:4 compressed weight back to its
+    dense shape using the CUTLASS metadata produced at compression time
+
+    :param weight: compressed weight of shape (rows, columns // 2)
+    :param meta: reordered CUTLASS metadata of shape (rows, columns // 16)
+    :return: dense weight of shape (rows, columns)
+    """
+    return sparse_semi_structured_to_dense_cutlass(weight.contiguous(), meta)
+
+
 def marlin_permute_weights(q_w, size_k, size_n, perm, tile):
     assert q_w.shape == (size_k, size_n)
     assert size_k % tile == 0, f"size_k = {size_k}, tile = {tile}"
@@ -204,6 +280,24 @@ def marlin_permute_weights(q_w, size_k, size_n, perm, tile):
     return q_w
 
 
+def marlin_unpermute_weights(q_w, size_k, size_n, inv_perm, tile):
+    """
+    Inverse of marlin_permute_weights, restores a (size_k, size_n) weight from the
+    permuted tile layout given the inverse of the permutation it was shuffled with
+    """
+    assert q_w.shape == (size_k // tile, size_n * tile)
+
+    # Undo the permutation within each block of inv_perm.numel() elements
+    q_w = q_w.reshape((-1, inv_perm.numel()))[:, inv_perm].reshape(q_w.shape)
+
+    # Restore 16x64 marlin tiles to row major order
+    q_w = q_w.reshape((size_k // tile, size_n // tile, tile, tile))
+    q_w = q_w.permute((0, 2, 1, 3))
+    q_w = q_w.reshape((size_k, size_n))
+
+    return q_w
+
+
 def pack_weight_24(
     weight: Tensor,
     quantization_args: QuantizationArgs,
@@ -248,3 +342,91 @@ def pack_scales_24(scales, quantization_args, w_shape):
     scales = scales.reshape((-1, size_n)).contiguous()
 
     return scales
+
+
+def unpack_weight_24(
+    packed: Tensor,
+    quantization_args: QuantizationArgs,
+    w_shape: Tuple[int, int],
+    tile: int = 16,
+) -> Tensor:
+    """
+    Inverse of pack_weight_24, unpacks and un-permutes an int32 packed weight
+
+    :param packed: packed int32 weight produced by pack_weight_24
+    :param quantization_args: quantization args the weight was packed with
+    :param w_shape: (size_k, size_n) shape of the weight before packing
+    :param tile: marlin tile size the weight was permuted with
+    :return: unsigned quantized values in shape w_shape, stored as int32
+    """
+    size_k, size_n = w_shape
+    num_bits = quantization_args.num_bits
+
+    q_w = unpack_marlin_int32(packed, num_bits)
+    inv_perm, _, _ = _get_inverse_permutations_24(num_bits)
+    return marlin_unpermute_weights(
+        q_w, size_k, size_n, inv_perm.to(packed.device), tile
+    )
+
+
+def unpack_marlin_int32(packed: Tensor, num_bits: int) -> Tensor:
+    """
+    Unpacks int32 values packed along their columns in the Marlin format, where
+    value i of each pack_factor sized window is stored at bit num_bits * i
+
+    :param packed: packed int32 tensor
+    :param num_bits: number of bits each value was packed into
+    :return: unsigned values stored as int32, with pack_factor times more columns
+    """
+    pack_factor = 32 // num_bits
+    mask = (1 << num_bits) - 1
+
+    # extract every num_bits chunk of each int32 in a single broadcasted shift
+    shifts = torch.arange(
+        0, num_bits * pack_factor, num_bits, dtype=torch.int32, device=packed.device
+    )
+    unpacked = (packed.unsqueeze(-1) >> shifts) & mask
+    return unpacked.reshape(packed.shape[0], packed.shape[1] * pack_factor)
+
+
+def unpack_scales_24(
+    scales: Tensor, quantization_args: QuantizationArgs, w_shape: Tuple[int, int]
+) -> Tensor:
+    """
+    Inverse of pack_scales_24
+
+    :param scales: packed scales produced by pack_scales_24
+    :param quantization_args: quantization args the scales were packed with
+    :param w_shape: (size_k, size_n) shape of the weight before packing
+    :return: scales in (num_groups, size_n) order
+    """
+    size_k = w_shape[0]
+    size_n = w_shape[1]
+    num_bits = quantization_args.num_bits
+
+    _, inv_scale_perm, inv_scale_perm_single = _get_inverse_permutations_24(num_bits)
+
+    if (
+        quantization_args.strategy is QuantizationStrategy.GROUP
+        and quantization_args.group_size < size_k
+    ):
+        inv_perm = inv_scale_perm
+    else:  # channelwise
+        inv_perm = inv_scale_perm_single
+    inv_perm = inv_perm.to(scales.device)
+    scales = scales.reshape((-1, inv_perm.numel()))[:, inv_perm]
+    scales = scales.reshape((-1, size_n)).contiguous()
+
+    return scales
+
+
+@lru_cache(maxsize=None)
+def _get_inverse_permutations_24(num_bits: int) -> Tuple[Tensor, Tensor, Tensor]:
+    # inverses of the weight and scale permutations from get_permutations_24,
+    # shared between all layers with the same bit depth
+    perm, scale_perm, scale_perm_single = get_permutations_24(num_bits)
+    return (
+        torch.argsort(perm),
+        torch.argsort(torch.tensor(scale_perm)),
+        torch.argsort(torch.tensor(scale_perm_single)),
+    )
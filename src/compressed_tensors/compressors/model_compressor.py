@@ -33,16 +33,19 @@ from compressed_tensors.quantization import (
     QuantizationConfig,
     QuantizationStatus,
     apply_quantization_config,
+    clear_quantized_weight_cache,
     load_pretrained_quantization,
+    update_module_forward_quantized,
 )
 from compressed_tensors.quantization.utils import (
     is_module_quantized,
     iter_named_leaf_modules,
+    leaf_module_index,
 )
 from compressed_tensors.utils import get_safetensors_folder
-from compressed_tensors.utils.helpers import fix_fsdp_module_name
+from compressed_tensors.utils.helpers import fix_fsdp_module_name, update_parameter_data
 from torch import Tensor
-from torch.nn import Module, Parameter
+from torch.nn import Module
 from tqdm import tqdm
 from transformers import AutoConfig
 from transformers.file_utils import CONFIG_NAME
@@ -260,8 +263,15 @@ class ModelCompressor:
             setattr(model, SPARSITY_CONFIG_NAME, self.sparsity_compressor.config)
 
         if self.quantization_compressor is not None:
-            names_to_scheme = apply_quantization_config(model, self.quantization_config)
-            load_pretrained_quantization(model, model_path)
+            # the config and the quantization params are applied from a single walk
+            # of the model
+            with leaf_module_index(model):
+                names_to_scheme = apply_quantization_config(
+                    model, self.quantization_config
+                )
+                load_pretrained_quantization(
+                    model, model_path, format=self.quantization_config.format
+                )
             dense_gen = self.quantization_compressor.decompress(
                 model_path, names_to_scheme=names_to_scheme
             )
@@ -269,6 +279,7 @@ class ModelCompressor:
 
             def update_status(module):
                 module.quantization_status = QuantizationStatus.FROZEN
+                update_module_forward_quantized(module)
 
             model.apply(update_status)
             setattr(model, QUANTIZATION_CONFIG_NAME, self.quantization_config)
@@ -306,12 +317,12 @@ class ModelCompressor:
 
     def _replace_weights(self, dense_weight_generator, model):
         for name, data in tqdm(dense_weight_generator, desc="Decompressing model"):
-            # loading the decompressed weights into the model
-            model_device = operator.attrgetter(name)(model).device
-            data_old = operator.attrgetter(name)(model)
-            data_dtype = data_old.dtype
-            data_new = Parameter(data.to(model_device).to(data_dtype))
-            data_old.data = data_new.data
+            # loading the decompressed weights into the model, parameters without
+            # a module prefix belong to the model itself
+            module_name, _, param_name = name.rpartition(".")
+            module = operator.attrgetter(module_name)(model) if module_name else model
+            update_parameter_data(module, param_name, data)
+            clear_quantized_weight_cache(module)
 
 
 def map_modules_to_quant_args(model: Module) -> Dict:
@@ -13,7 +13,7 @@
 # limitations under the License.
 
 import logging
-from typing import Dict, Generator, Tuple
+from typing import Dict, Generator, Optional, Tuple
 
 import torch
 from compressed_tensors.compressors import Compressor
@@ -93,7 +93,11 @@ class QuantizationCompressor(Compressor):
         return compressed_dict
 
     def decompress(
-        self, path_to_model_or_tensors: str, device: str = "cpu", **kwargs
+        self,
+        path_to_model_or_tensors: str,
+        device: str = "cpu",
+        names_to_scheme: Optional[Dict[str, QuantizationArgs]] = None,
+        **kwargs,
     ) -> Generator[Tuple[str, Tensor], None, None]:
         """
         Reads a compressed state dict located at path_to_model_or_tensors
@@ -103,8 +107,11 @@ class QuantizationCompressor(Compressor):
         :param model_path: path to compressed safetensors model (directory with
             one or more safetensors files) or compressed tensors file
         :param device: optional device to load intermediate weights into
+        :param names_to_scheme: optional quantization args for each quantized weight,
+            if not provided the quantization strategy is inferred from the scale shape
         :return: compressed state dict
         """
+        names_to_scheme = names_to_scheme or {}
         weight_mappings = get_nested_weight_mappings(
             path_to_model_or_tensors, self.COMPRESSION_PARAM_NAMES
         )
@@ -122,6 +129,7 @@ class QuantizationCompressor(Compressor):
                     x_q=weight_data["weight"],
                     scale=scale,
                     zero_point=zero_point,
+                    args=names_to_scheme.get(weight_name),
                 )
                 yield merge_names(weight_name, "weight"), decompressed
 
@@ -14,7 +14,7 @@
 
 import logging
 import math
-from typing import Dict, Generator, Tuple
+from typing import Dict, Generator, Optional, Tuple
 
 import numpy as np
 import torch
@@ -103,8 +103,9 @@ class PackedQuantizationCompressor(Compressor):
     def decompress(
         self,
         path_to_model_or_tensors: str,
-        names_to_scheme: Dict[str, QuantizationArgs],
         device: str = "cpu",
+        names_to_scheme: Optional[Dict[str, QuantizationArgs]] = None,
+        **kwargs,
     ) -> Generator[Tuple[str, Tensor], None, None]:
         """
         Reads a compressed state dict located at path_to_model_or_tensors
@@ -114,8 +115,15 @@ class PackedQuantizationCompressor(Compressor):
         :param model_path: path to compressed safetensors model (directory with
             one or more safetensors files) or compressed tensors file
         :param device: optional device to load intermediate weights into
+        :param names_to_scheme: quantization args for each quantized weight, needed
+            to infer the bit depth of each packed weight
         :return: compressed state dict
         """
+        if names_to_scheme is None:
+            raise ValueError(
+                f"{self.__class__.__name__} requires names_to_scheme to decompress"
+            )
+
         weight_mappings = get_nested_weight_mappings(
             path_to_model_or_tensors, self.COMPRESSION_PARAM_NAMES
         )
@@ -138,6 +146,7 @@ class PackedQuantizationCompressor(Compressor):
                     x_q=unpacked,
                     scale=scale,
                     zero_point=zero_point,
+                    args=names_to_scheme.get(weight_name),
                 )
                 yield merge_names(weight_name, "weight"), decompressed
 
@@ -16,4 +16,5 @@
 
 from .helpers import *
 from .permutations_24 import *
+from .permutations_marlin import *
 from .semi_structured_conversions import *
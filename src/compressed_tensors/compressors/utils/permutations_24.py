@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import lru_cache
 
 import numpy
 import torch
@@ -29,6 +30,10 @@ __all__ = ["get_permutations_24"]
 #
 # As a result of this reordering, the vector loads inside the kernel will get the data
 # as it is needed for tensor-core (without the need to use ldmatrix instructions)
+#
+# The permutations only depend on num_bits, so they are computed once and shared by
+# every layer. The returned tensor and lists must not be modified in place.
+@lru_cache(maxsize=None)
 def get_permutations_24(num_bits):
     perm_list = []
     for i in range(32):
@@ -19,6 +19,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import lru_cache
+
 import torch
 
 
@@ -41,6 +43,11 @@ __all__ = [
 # matrix elements into reordered metadata matrix elements (or,
 # equivalently, for gathering reordered metadata matrix element back
 # into metadata matrix elements).
+#
+# The offsets only depend on the shape and datatype of the meta matrix,
+# so they are cached and shared between all layers of the same shape.
+# The returned tensor must not be modified in place.
+@lru_cache(maxsize=64)
 def _calculate_meta_reordering_scatter_offsets(m, meta_ncols, meta_dtype, device):
     dst_rows = torch.arange(0, m, device=device)[:, None].repeat(1, meta_ncols)
     dst_cols = torch.arange(0, meta_ncols, device=device).repeat(m, 1)
@@ -20,4 +20,6 @@ from .forward import *
 from .frozen import *
 from .initialize import *
 from .compressed import *
+from .folded import *
 from .apply import *
+from .sequential import *
@@ -12,19 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import logging
+import os
 import re
 from collections import OrderedDict
 from typing import Dict, Iterable, List, Optional
 from typing import OrderedDict as OrderedDictType
-from typing import Union
+from typing import Tuple, Union
 
 import torch
+from compressed_tensors.config import CompressionFormat
 from compressed_tensors.quantization.lifecycle.calibration import (
     set_module_for_calibration,
 )
 from compressed_tensors.quantization.lifecycle.compressed import (
-    compress_quantized_weights,
+    compress_quantized_modules,
+)
+from compressed_tensors.quantization.lifecycle.forward import (
+    clear_quantized_weight_cache,
 )
 from compressed_tensors.quantization.lifecycle.frozen import freeze_module_quantization
 from compressed_tensors.quantization.lifecycle.initialize import (
@@ -32,18 +38,20 @@ from compressed_tensors.quantization.lifecycle.initialize import (
 )
 from compressed_tensors.quantization.quant_args import QuantizationArgs
 from compressed_tensors.quantization.quant_config import (
+    LIFECYCLE_ORDER,
     QuantizationConfig,
     QuantizationStatus,
 )
 from compressed_tensors.quantization.quant_scheme import QuantizationScheme
 from compressed_tensors.quantization.utils import (
     KV_CACHE_TARGETS,
-    infer_quantization_status,
     is_kv_cache_quant_scheme,
     iter_named_leaf_modules,
+    record_quantized_modules,
 )
-from compressed_tensors.utils.helpers import fix_fsdp_module_name
+from compressed_tensors.utils.helpers import fix_fsdp_module_name, update_parameter_data
 from compressed_tensors.utils.safetensors_load import get_safetensors_folder
+from pydantic import BaseModel
 from torch.nn import Module
 
 
@@ -51,17 +59,34 @@ __all__ = [
     "load_pretrained_quantization",
     "apply_quantization_config",
     "apply_quantization_status",
+    "resolve_quantization_config",
+    "ResolvedQuantizationConfig",
+    "RESOLVED_QUANTIZATION_CONFIG_NAME",
+    "RESOLVED_QUANTIZATION_CONFIG_ATTRIBUTE",
     "find_name_or_class_matches",
 ]
 
 from compressed_tensors.quantization.utils.helpers import is_module_quantized
-from compressed_tensors.utils.safetensors_load import get_quantization_state_dict
+from compressed_tensors.utils.safetensors_load import LazyStateDict
 
 
 _LOGGER = logging.getLogger(__name__)
 
+RESOLVED_QUANTIZATION_CONFIG_NAME = "resolved_quantization_config.json"
+
+# attribute of the model holding the config resolved by apply_quantization_config
+RESOLVED_QUANTIZATION_CONFIG_ATTRIBUTE = "resolved_quantization_config"
+
+# compression formats storing weight scales packed instead of as weight_scale
+_PACKED_SCALE_FORMATS = {
+    CompressionFormat.marlin.value,
+    CompressionFormat.marlin_24.value,
+}
+
 
-def load_pretrained_quantization(model: Module, model_name_or_path: str):
+def load_pretrained_quantization(
+    model: Module, model_name_or_path: str, format: Optional[str] = None
+):
     """
     Loads the quantization parameters (scale and zero point) from model_name_or_path to
     a model that has already been initialized with a quantization config
@@ -69,71 +94,176 @@ def load_pretrained_quantization(model: Module, model_name_or_path: str):
     :param model: model to load pretrained quantization parameters to
     :param model_name_or_path: Hugging Face stub or local folder containing a quantized
     model, which is used to load quantization parameters
+    :param format: compression format of the checkpoint. Weight scales may only be
+        missing from formats that store them packed, such as marlin-24, as they are
+        restored by the decompressor
     """
     model_path = get_safetensors_folder(model_name_or_path)
-    state_dict = get_quantization_state_dict(model_path)
 
-    for name, submodule in iter_named_leaf_modules(model):
-        if not is_module_quantized(submodule):
-            continue
-        if submodule.quantization_scheme.weights is not None:
-            base_name = "weight"
-            _load_quant_args_from_state_dict(
-                base_name=base_name,
-                module_name=name,
-                module=submodule,
-                state_dict=state_dict,
-            )
-        if submodule.quantization_scheme.input_activations is not None:
-            base_name = "input"
-            _load_quant_args_from_state_dict(
-                base_name=base_name,
-                module_name=name,
-                module=submodule,
-                state_dict=state_dict,
-            )
-        if submodule.quantization_scheme.output_activations is not None:
-            base_name = "output"
-            _load_quant_args_from_state_dict(
-                base_name=base_name,
-                module_name=name,
-                module=submodule,
-                state_dict=state_dict,
-            )
+    # quantization parameters are read from the checkpoint as each module is visited
+    with LazyStateDict(model_path) as state_dict:
+        for name, submodule in iter_named_leaf_modules(model):
+            if not is_module_quantized(submodule):
+                continue
+            if submodule.quantization_scheme.weights is not None:
+                base_name = "weight"
+                _load_quant_args_from_state_dict(
+                    base_name=base_name,
+                    module_name=name,
+                    module=submodule,
+                    state_dict=state_dict,
+                    format=format,
+                )
+            if submodule.quantization_scheme.input_activations is not None:
+                base_name = "input"
+                _load_quant_args_from_state_dict(
+                    base_name=base_name,
+                    module_name=name,
+                    module=submodule,
+                    state_dict=state_dict,
+                    format=format,
+                )
+            if submodule.quantization_scheme.output_activations is not None:
+                base_name = "output"
+                _load_quant_args_from_state_dict(
+                    base_name=base_name,
+                    module_name=name,
+                    module=submodule,
+                    state_dict=state_dict,
+                    format=format,
+                )
+
+
+class ResolvedQuantizationConfig(BaseModel):
+    """
+    Quantization schemes of every targeted module of a model, resolved from a
+    QuantizationConfig. Can be saved next to a checkpoint and applied to the same
+    architecture without matching any targets
+
+    :param schemes: quantization schemes by scheme id, ids are "group:" followed by
+        the config group name or, for schemes merged with the kv cache scheme,
+        "module:" followed by the module name
+    :param modules: scheme id of each targeted module by module name
+    :param quantization_status: status to apply to the targeted modules
+    :param fingerprint: hash of the names and classes of the leaf modules of the
+        model the config was resolved for
+    """
+
+    schemes: Dict[str, QuantizationScheme]
+    modules: Dict[str, str]
+    quantization_status: QuantizationStatus
+    fingerprint: str
+
+    def save(self, save_directory: str):
+        """
+        :param save_directory: directory to save the resolved config to
+        """
+        path = os.path.join(save_directory, RESOLVED_QUANTIZATION_CONFIG_NAME)
+        with open(path, "w") as file:
+            file.write(self.model_dump_json(indent=2))
+
+    @classmethod
+    def load(cls, save_directory: str) -> "ResolvedQuantizationConfig":
+        """
+        :param save_directory: directory the resolved config was saved to
+        :return: loaded resolved config
+        """
+        path = os.path.join(save_directory, RESOLVED_QUANTIZATION_CONFIG_NAME)
+        with open(path, "r") as file:
+            return cls.model_validate_json(file.read())
+
+
+def resolve_quantization_config(
+    model: Module, config: QuantizationConfig
+) -> ResolvedQuantizationConfig:
+    """
+    Resolves the quantization scheme of every module of the model targeted by the
+    config, without modifying the model
+
+    :param model: model to resolve the quantization config for
+    :param config: quantization config
+    :return: resolved quantization config
+    """
+    return _resolve_quantization_config(_named_leaf_modules(model), config)
 
 
-def apply_quantization_config(model: Module, config: QuantizationConfig) -> Dict:
+def apply_quantization_config(
+    model: Module,
+    config: Optional[QuantizationConfig] = None,
+    resolved_config: Optional[ResolvedQuantizationConfig] = None,
+) -> Dict:
     """
-    Initializes the model for quantization in-place based on the given config
+    Initializes the model for quantization in-place based on the given config. The
+    config resolved for the model is attached to it as
+    `model.resolved_quantization_config`, so it can be saved without resolving the
+    config again
 
     :param model: model to apply quantization config to
     :param config: quantization config
+    :param resolved_config: optional config resolved for the same architecture with
+        `resolve_quantization_config`, skips matching the targets of config
+    :return: quantization args of the weights of each targeted module by name
     """
+    named_leaf_modules = _named_leaf_modules(model)
+    if resolved_config is None:
+        if config is None:
+            raise ValueError("Either config or resolved_config must be provided")
+        resolved_config = _resolve_quantization_config(named_leaf_modules, config)
+    else:
+        fingerprint = _leaf_modules_fingerprint(named_leaf_modules)
+        if fingerprint != resolved_config.fingerprint:
+            raise ValueError(
+                "Resolved quantization config does not match the modules of the "
+                "model, it was resolved for a different architecture"
+            )
+
+    names_to_scheme = OrderedDict()
+    for name, submodule in named_leaf_modules:
+        scheme_id = resolved_config.modules.get(name)
+        if scheme_id is not None:
+            submodule.quantization_scheme = resolved_config.schemes[scheme_id]
+            names_to_scheme[name] = submodule.quantization_scheme.weights
+
+    # apply current quantization status across all targeted layers
+    apply_quantization_status(model, resolved_config.quantization_status)
+    setattr(model, RESOLVED_QUANTIZATION_CONFIG_ATTRIBUTE, resolved_config)
+    return names_to_scheme
+
+
+def _resolve_quantization_config(
+    named_leaf_modules: List[Tuple[str, Module]], config: QuantizationConfig
+) -> ResolvedQuantizationConfig:
     # build mapping of targets to schemes for easier matching
     # use ordered dict to preserve target ordering in config
     target_to_scheme = OrderedDict()
     config = process_quantization_config(config)
-    names_to_scheme = OrderedDict()
-    for scheme in config.config_groups.values():
+    scheme_ids = {}
+    for group_name, scheme in config.config_groups.items():
+        scheme_ids[id(scheme)] = f"group:{group_name}"
         for target in scheme.targets:
             target_to_scheme[target] = scheme
 
+    # targets are sorted and compiled once rather than for every module
+    ignore_matcher = _TargetMatcher(config.ignore)
+    target_matcher = _TargetMatcher(target_to_scheme)
+
+    schemes = {}
+    modules = OrderedDict()
     # list of submodules to ignore
     ignored_submodules = []
-    # mark appropriate layers for quantization by setting their quantization schemes
-    for name, submodule in iter_named_leaf_modules(model):
-        # potentially fix module name to remove FSDP wrapper prefix
-        name = fix_fsdp_module_name(name)
-        if find_name_or_class_matches(name, submodule, config.ignore):
+    for name, submodule in named_leaf_modules:
+        if ignore_matcher.find_matches(name, submodule):
             ignored_submodules.append(name)
             continue  # layer matches ignore list, continue
-        targets = find_name_or_class_matches(name, submodule, target_to_scheme)
+        targets = target_matcher.find_matches(name, submodule)
         if targets:
             # target matched - add layer and scheme to target list
-            submodule.quantization_scheme = _scheme_from_targets(
-                target_to_scheme, targets, name
-            )
-            names_to_scheme[name] = submodule.quantization_scheme.weights
+            scheme = _scheme_from_targets(target_to_scheme, targets, name)
+            # merged schemes are created for this module only, ids are prefixed so
+            # a module name never collides with a config group name
+            scheme_id = scheme_ids.get(id(scheme), f"module:{name}")
+            schemes[scheme_id] = scheme
+            modules[name] = scheme_id
 
     if config.ignore is not None and ignored_submodules is not None:
         if set(config.ignore) - set(ignored_submodules):
@@ -142,10 +272,28 @@ def apply_quantization_config(model: Module, config: QuantizationConfig) -> Dict
                 "not found in the model: "
                 f"{set(config.ignore) - set(ignored_submodules)}"
             )
-    # apply current quantization status across all targeted layers
 
-    apply_quantization_status(model, config.quantization_status)
-    return names_to_scheme
+    return ResolvedQuantizationConfig(
+        schemes=schemes,
+        modules=modules,
+        quantization_status=config.quantization_status,
+        fingerprint=_leaf_modules_fingerprint(named_leaf_modules),
+    )
+
+
+def _named_leaf_modules(model: Module) -> List[Tuple[str, Module]]:
+    # potentially fix module names to remove FSDP wrapper prefix
+    return [
+        (fix_fsdp_module_name(name), submodule)
+        for name, submodule in iter_named_leaf_modules(model)
+    ]
+
+
+def _leaf_modules_fingerprint(named_leaf_modules: List[Tuple[str, Module]]) -> str:
+    fingerprint = hashlib.sha256()
+    for name, submodule in named_leaf_modules:
+        fingerprint.update(f"{name}:{submodule.__class__.__name__}\n".encode())
+    return fingerprint.hexdigest()
 
 
 def process_quantization_config(config: QuantizationConfig) -> QuantizationConfig:
@@ -181,25 +329,57 @@ def process_kv_cache_config(
     return config
 
 
-def apply_quantization_status(model: Module, status: QuantizationStatus):
+def apply_quantization_status(
+    model: Module, status: QuantizationStatus, num_workers: Optional[int] = None
+):
     """
     Applies in place the quantization lifecycle up to the given status
 
+    Every lifecycle step from the current status of each quantized module to the
+    given status is applied in a single traversal of the model, modules already at
+    or past the given status are left as is. The quantized modules are recorded so
+    their statuses can be read with `get_quantization_status_table`
+
     :param model: model to apply quantization to
     :param status: status to update the module to
+    :param num_workers: number of threads to compress module weights with, weights
+        are compressed sequentially if not set
     """
-    current_status = infer_quantization_status(model)
-
-    if status >= QuantizationStatus.INITIALIZED > current_status:
-        model.apply(initialize_module_for_quantization)
-
-    if current_status < status >= QuantizationStatus.CALIBRATION > current_status:
-        model.apply(set_module_for_calibration)
-    if current_status < status >= QuantizationStatus.FROZEN > current_status:
-        model.apply(freeze_module_quantization)
-
-    if current_status < status >= QuantizationStatus.COMPRESSED > current_status:
-        model.apply(compress_quantized_weights)
+    quantized_modules = OrderedDict()
+    modules_to_compress = []
+    for name, module in model.named_modules():
+        if getattr(module, "quantization_scheme", None) is None:
+            continue
+        quantized_modules[name] = module
+
+        current_status = getattr(module, "quantization_status", None)
+        for step_status in _lifecycle_steps(current_status, status):
+            if step_status == QuantizationStatus.COMPRESSED:
+                # compressed last, possibly in parallel across modules
+                modules_to_compress.append(module)
+            else:
+                _LIFECYCLE_STEP_FUNCTIONS[step_status](module)
+
+    compress_quantized_modules(modules_to_compress, num_workers=num_workers)
+    record_quantized_modules(model, quantized_modules)
+
+
+_LIFECYCLE_STEP_FUNCTIONS = {
+    QuantizationStatus.INITIALIZED: initialize_module_for_quantization,
+    QuantizationStatus.CALIBRATION: set_module_for_calibration,
+    QuantizationStatus.FROZEN: freeze_module_quantization,
+}
+
+
+def _lifecycle_steps(
+    current_status: Optional[QuantizationStatus], status: QuantizationStatus
+) -> List[QuantizationStatus]:
+    # statuses after the current one, up to and including the target
+    return [
+        step_status
+        for step_status in LIFECYCLE_ORDER
+        if current_status < step_status <= status
+    ]
 
 
 def find_name_or_class_matches(
@@ -243,6 +423,85 @@ def _find_matches(
     return matches
 
 
+class _TargetMatcher:
+    """
+    Matches module names and classes against a fixed set of targets, returning the
+    same ordered matches as `find_name_or_class_matches`. Targets are sorted and
+    regex patterns compiled once, exact targets are found with a hash lookup and
+    class matches are cached per class name
+
+    :param targets: targets to match against
+    :param check_contains: if True, non regex targets match class names that
+        contain them, ignoring case
+    """
+
+    def __init__(self, targets: Optional[Iterable[str]], check_contains: bool = False):
+        targets = sorted(targets or [], key=lambda x: ("re:" in x, x))
+        self._check_contains = check_contains
+
+        # targets are kept with their index in the sorted list to restore the order
+        # of matches found through different lookups
+        self._exact = {}
+        self._non_regex = []
+        self._regex = []
+        for idx, target in enumerate(targets):
+            if target.startswith("re:"):
+                self._regex.append((idx, target, re.compile(target[3:])))
+            else:
+                self._exact.setdefault(target, []).append((idx, target))
+                self._non_regex.append((idx, target))
+
+        # single pattern to rule out values that match none of the regex targets,
+        # patterns with groups are not combined as their group references would
+        # be renumbered
+        self._any_regex = None
+        if self._regex and all(pattern.groups == 0 for _, _, pattern in self._regex):
+            try:
+                self._any_regex = re.compile(
+                    "|".join(f"(?:{target[3:]})" for _, target, _ in self._regex)
+                )
+            except re.error:
+                pass  # patterns that can not be combined are checked one by one
+
+        self._class_matches = {}
+
+    def find_matches(self, name: str, module: Module) -> List[str]:
+        """
+        :param name: name of the module
+        :param module: module to match the class name of
+        :return: targets matching the module name followed by targets matching its
+            class name
+        """
+        class_name = module.__class__.__name__
+        class_matches = self._class_matches.get(class_name)
+        if class_matches is None:
+            class_matches = self._find_matches(class_name, self._check_contains)
+            self._class_matches[class_name] = class_matches
+
+        return self._find_matches(name, check_contains=False) + class_matches
+
+    def _find_matches(self, value: str, check_contains: bool) -> List[str]:
+        if check_contains:
+            lower_value = value.lower()
+            matches = [
+                match for match in self._non_regex if match[1].lower() in lower_value
+            ]
+        else:
+            matches = list(self._exact.get(value, []))
+
+        if self._regex and (
+            self._any_regex is None or self._any_regex.match(value) is not None
+        ):
+            matches.extend(
+                (idx, target)
+                for idx, target, pattern in self._regex
+                if pattern.match(value)
+            )
+            matches.sort(key=lambda match: match[0])
+
+        return [target for _, target in matches]
+
+
 def _infer_status(model: Module) -> Optional[QuantizationStatus]:
     for module in model.modules():
         status = getattr(module, "quantization_status", None)
@@ -252,7 +511,11 @@ def _infer_status(model: Module) -> Optional[QuantizationStatus]:
 
 
 def _load_quant_args_from_state_dict(
-    base_name: str, module_name: str, module: Module, state_dict: Dict
+    base_name: str,
+    module_name: str,
+    module: Module,
+    state_dict: Union[Dict, LazyStateDict],
+    format: Optional[str] = None,
 ):
     """
     Loads scale and zero point from a state_dict into the specified module
@@ -262,22 +525,37 @@ def _load_quant_args_from_state_dict(
     :param module_name: pytorch module name to look up in state_dict
     :module: pytorch module associated with module_name
     :state_dict: state_dict to search for matching quantization parameters
+    :format: compression format of the state_dict, weight scales may only be
+    missing if it stores them packed
     """
     scale_name = f"{base_name}_scale"
     zp_name = f"{base_name}_zero_point"
-    device = next(module.parameters()).device
 
     scale = getattr(module, scale_name, None)
     zp = getattr(module, zp_name, None)
     if scale is not None:
-        state_dict_scale = state_dict[f"{module_name}.{scale_name}"]
-        scale.data = state_dict_scale.to(device).to(scale.dtype)
+        state_dict_scale = state_dict.get(f"{module_name}.{scale_name}", None)
+        if state_dict_scale is not None:
+            update_parameter_data(module, scale_name, state_dict_scale)
+            scale = getattr(module, scale_name)
+        elif base_name != "weight" or format not in _PACKED_SCALE_FORMATS:
+            # packed scales are restored by the decompressor, any other missing
+            # scale would leave the module with an uninitialized one
+            raise ValueError(
+                f"Could not find {module_name}.{scale_name} in the checkpoint"
+            )
     if zp is not None:
         zp_from_state = state_dict.get(f"{module_name}.{zp_name}", None)
         if zp_from_state is not None:  # load the non-zero zero points
-            zp.data = zp_from_state.to(device).to(zp.dtype)
+            update_parameter_data(module, zp_name, zp_from_state)
+        elif not zp.is_meta and zp.shape == scale.shape:
+            zp.data.zero_()
         else:  # fill with zeros matching scale shape
-            zp.data = torch.zeros_like(scale, dtype=zp.dtype).to(device)
+            zeros = torch.zeros_like(scale, dtype=zp.dtype)
+            update_parameter_data(module, zp_name, zeros)
+
+    # zeroing through .data is not seen by the cache of the quantized weight
+    clear_quantized_weight_cache(module)
 
 
 def _scheme_from_targets(
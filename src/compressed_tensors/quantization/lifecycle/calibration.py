@@ -15,6 +15,9 @@
 
 import logging
 
+from compressed_tensors.quantization.lifecycle.forward import (
+    update_module_forward_quantized,
+)
 from compressed_tensors.quantization.quant_config import QuantizationStatus
 from torch.nn import Module
 
@@ -49,3 +52,4 @@ def set_module_for_calibration(module: Module):
         )
 
     module.quantization_status = QuantizationStatus.CALIBRATION
+    update_module_forward_quantized(module)
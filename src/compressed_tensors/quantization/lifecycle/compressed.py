@@ -14,28 +14,101 @@
 
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from typing import Iterable, Optional
 
 import torch
-from compressed_tensors.quantization.lifecycle.forward import quantize
+from compressed_tensors.quantization.lifecycle.forward import (
+    clear_quantized_weight_cache,
+    quantize,
+    update_module_forward_quantized,
+)
+from compressed_tensors.quantization.quant_args import (
+    QuantizationArgs,
+    QuantizationStrategy,
+)
 from compressed_tensors.quantization.quant_config import QuantizationStatus
 from torch.nn import Module
 
 
 __all__ = [
     "compress_quantized_weights",
+    "compress_quantized_model",
+    "compress_quantized_modules",
 ]
 
 
 _LOGGER = logging.getLogger(__name__)
 
+# max number of weight elements quantized at once, bounds the float temporaries of
+# compression to a few times this size
+DEFAULT_MAX_CHUNK_NUMEL = 2**24
 
-def compress_quantized_weights(module: Module):
+
+def compress_quantized_model(
+    model: Module,
+    num_workers: Optional[int] = None,
+    max_chunk_numel: int = DEFAULT_MAX_CHUNK_NUMEL,
+):
+    """
+    Compresses the weights of every quantized module in the model, see
+    `compress_quantized_weights`
+
+    :param model: model to compress to quantized representation
+    :param num_workers: number of threads to compress modules with, modules are
+        compressed sequentially if not set
+    :param max_chunk_numel: max number of weight elements quantized at once
+    """
+    compress_quantized_modules(
+        model.modules(), num_workers=num_workers, max_chunk_numel=max_chunk_numel
+    )
+
+
+def compress_quantized_modules(
+    modules: Iterable[Module],
+    num_workers: Optional[int] = None,
+    max_chunk_numel: int = DEFAULT_MAX_CHUNK_NUMEL,
+):
     """
-    Quantizes the module weight representation to use fewer bits in memory
+    Compresses the weights of every quantized module of the given modules, see
+    `compress_quantized_weights`
+
+    :param modules: modules to compress to quantized representation
+    :param num_workers: number of threads to compress modules with, modules are
+        compressed sequentially if not set
+    :param max_chunk_numel: max number of weight elements quantized at once
+    """
+    modules = list(modules)
+    if not num_workers or num_workers <= 1:
+        for module in modules:
+            compress_quantized_weights(module, max_chunk_numel=max_chunk_numel)
+        return
+
+    # torch ops release the GIL, so modules are quantized in parallel
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(
+                compress_quantized_weights, module, max_chunk_numel=max_chunk_numel
+            )
+            for module in modules
+        ]
+        for future in futures:
+            future.result()
+
+
+def compress_quantized_weights(
+    module: Module, max_chunk_numel: int = DEFAULT_MAX_CHUNK_NUMEL
+):
+    """
+    Quantizes the module weight representation to use fewer bits in memory. Rows
+    of the weight are quantized in chunks written directly to the compressed
+    weight, so temporaries never exceed the chunk size
 
     apply to full model with `model.apply(compress_quantized_weights)`
 
     :param module: module to compress to quantized representation
+    :param max_chunk_numel: max number of weight elements quantized at once
     """
     scheme = getattr(module, "quantization_scheme", None)
     if not scheme or not scheme.weights:
@@ -55,15 +128,63 @@ def compress_quantized_weights(module: Module):
 
         # mark as compressed here to maintain consistent status throughout the model
         module.quantization_status = QuantizationStatus.COMPRESSED
+        update_module_forward_quantized(module)
         return
 
+    # fake quantized weights are no longer used once the weight is compressed
+    clear_quantized_weight_cache(module)
+
     module.weight.requires_grad = False  # cannot use auto grad after compression
-    module.weight.data = quantize(
-        x=weight,
-        scale=scale,
-        zero_point=zero_point,
-        args=scheme.weights,
-        dtype=torch.int8,
+    module.weight.data = _quantize_in_chunks(
+        weight, scale, zero_point, scheme.weights, max_chunk_numel
     )
 
     module.quantization_status = QuantizationStatus.COMPRESSED
+    update_module_forward_quantized(module)
+
+
+@torch.no_grad()
+def _quantize_in_chunks(
+    weight: torch.Tensor,
+    scale: torch.Tensor,
+    zero_point: torch.Tensor,
+    args: QuantizationArgs,
+    max_chunk_numel: int,
+) -> torch.Tensor:
+    if weight.ndim != 2 or weight.numel() <= max_chunk_numel:
+        return quantize(
+            x=weight, scale=scale, zero_point=zero_point, args=args, dtype=torch.int8
+        )
+
+    rows, columns = weight.shape
+    chunk_rows = max(1, max_chunk_numel // columns)
+    if args.strategy == QuantizationStrategy.BLOCK:
+        # chunks must not split a block across its qparams rows
+        block_rows = args.block_shape()[0]
+        chunk_rows = max(block_rows, chunk_rows - chunk_rows % block_rows)
+
+    compressed = torch.empty(weight.shape, dtype=torch.int8, device=weight.device)
+    for start in range(0, rows, chunk_rows):
+        end = min(start + chunk_rows, rows)
+        compressed[start:end] = quantize(
+            x=weight[start:end],
+            scale=_slice_qparam_rows(scale, args, start, end),
+            zero_point=_slice_qparam_rows(zero_point, args, start, end),
+            args=args,
+            dtype=torch.int8,
+        )
+
+    return compressed
+
+
+def _slice_qparam_rows(
+    qparam: torch.Tensor, args: QuantizationArgs, start: int, end: int
+) -> torch.Tensor:
+    # qparams of the weight rows [start, end)
+    if qparam.numel() == 1:
+        # shared by all rows
+        return qparam
+    if args.strategy == QuantizationStrategy.BLOCK:
+        block_rows = args.block_shape()[0]
+        return qparam[start // block_rows : ceil(end / block_rows)]
+    return qparam[start:end]
@@ -0,0 +1,93 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+import torch
+from compressed_tensors.quantization.lifecycle.forward import (
+    _WEIGHT_FOLDED_NAME,
+    _unwrap_module_forward_quantized,
+    clear_quantized_weight_cache,
+    maybe_calibrate_or_quantize,
+    update_module_forward_quantized,
+)
+from compressed_tensors.quantization.lifecycle.frozen import freeze_module_quantization
+from compressed_tensors.quantization.quant_config import QuantizationStatus
+from torch.nn import Module
+
+
+__all__ = [
+    "fold_module_quantization",
+    "fold_quantization",
+]
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def fold_quantization(model: Module):
+    """
+    Folds the weight quantization of every quantized module in the model into its
+    weight, see `fold_module_quantization`
+
+    :param model: model to fold weight quantization for
+    """
+    model.apply(fold_module_quantization)
+
+
+@torch.no_grad()
+def fold_module_quantization(module: Module):
+    """
+    fake quantizes the module weight once and stores it as the plain weight, so the
+    forward call no longer quantizes the weight. Weight observers are deleted and
+    only activation quantization is kept in the forward call. Calibrating modules
+    are frozen first
+
+    apply to full model with `model.apply(fold_module_quantization)`
+
+    :param module: module to fold weight quantization for
+    """
+    scheme = getattr(module, "quantization_scheme", None)
+    if not scheme or not scheme.weights or not hasattr(module, "weight"):
+        # no quantization scheme or weights not quantized, nothing to do
+        return
+
+    if getattr(module, _WEIGHT_FOLDED_NAME, False):
+        # nothing to do, already folded
+        return
+
+    if module.quantization_status == QuantizationStatus.CALIBRATION:
+        freeze_module_quantization(module)
+
+    status = module.quantization_status
+    if status != QuantizationStatus.FROZEN:
+        _LOGGER.warning(
+            f"Attempting to fold quantization of module with status {status}, "
+            f"but status is not {QuantizationStatus.FROZEN} - skipping folding"
+        )
+        return
+
+    # scale and zero point are kept so the folded weight can still be compressed
+    clear_quantized_weight_cache(module)
+    module.weight.data = maybe_calibrate_or_quantize(
+        module, module.weight, "weight", scheme.weights
+    )
+    if hasattr(module, "weight_observer"):
+        delattr(module, "weight_observer")
+
+    # the stored scheme is left as is so the module config can still be saved, the
+    # marker keeps any later forward update from quantizing the weight again
+    setattr(module, _WEIGHT_FOLDED_NAME, True)
+    _unwrap_module_forward_quantized(module)
+    update_module_forward_quantized(module)
@@ -12,19 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from functools import wraps
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
 from math import ceil
-from typing import Optional
+from typing import Optional, Tuple
 
 import torch
-from compressed_tensors.quantization.observers.helpers import calculate_range
+import torch.nn.functional as F
+from compressed_tensors.quantization.observers.helpers import (
+    QuantizationPlan,
+    calculate_qparams,
+    get_quantization_plan,
+)
 from compressed_tensors.quantization.quant_args import (
     QuantizationArgs,
     QuantizationStrategy,
-    round_to_quantized_type,
+    QuantizationType,
 )
 from compressed_tensors.quantization.quant_config import QuantizationStatus
 from compressed_tensors.quantization.quant_scheme import QuantizationScheme
+from compressed_tensors.utils.helpers import is_torch_compiling
 from torch.nn import Module
 
 
@@ -33,10 +42,16 @@ __all__ = [
     "dequantize",
     "fake_quantize",
     "wrap_module_forward_quantized",
+    "update_module_forward_quantized",
+    "remove_quantization_wrappers",
     "maybe_calibrate_or_quantize",
+    "clear_quantized_weight_cache",
 ]
 
 
+_LOGGER = logging.getLogger(__name__)
+
+
 @torch.no_grad()
 def quantize(
     x: torch.Tensor,
@@ -169,14 +184,12 @@ def _process_quantization(
     do_dequantize: bool = True,
 ) -> torch.Tensor:
 
-    q_min, q_max = calculate_range(args, x.device)
-    group_size = args.group_size
+    plan = get_quantization_plan(args, x.device, x.dtype)
+    group_size = plan.group_size
 
-    if args.strategy == QuantizationStrategy.GROUP:
+    if plan.strategy == QuantizationStrategy.GROUP:
         output_dtype = dtype if dtype is not None else x.dtype
-        output = torch.zeros_like(x).to(output_dtype)
 
-        # TODO: vectorize the for loop
         # TODO: fix genetric assumption about the tensor size for computing group
 
         # TODO: make validation step for inputs
@@ -193,40 +206,89 @@ def _process_quantization(
                     "tesnor column shape must be divisble "
                     f"by the given group_size {group_size}"
                 )
-        for i in range(ceil(columns / group_size)):
-            # scale.shape should be [nchan, ndim]
-            # sc.shape should be [nchan, 1] after unsqueeze
-            sc = scale[:, i].view(-1, 1)
-            zp = zero_point[:, i].view(-1, 1) if zero_point is not None else None
-
-            idx = i * group_size
-            if do_quantize:
-                output[:, idx : (idx + group_size)] = _quantize(
-                    x[:, idx : (idx + group_size)],
-                    sc,
-                    zp,
-                    q_min,
-                    q_max,
-                    args,
-                    dtype=dtype,
-                )
-            if do_dequantize:
-                input = (
-                    output[:, idx : (idx + group_size)]
-                    if do_quantize
-                    else x[:, idx : (idx + group_size)]
+        num_groups = ceil(columns / group_size)
+        group_width = min(columns, group_size)
+
+        # view x as [nchan, ngroups, group_width] and scale as [nchan, ngroups, 1]
+        # so every group is processed against its own qparams in one broadcasted op
+        # qparams may carry trailing singleton dims, e.g. [nchan, ngroups, 1]
+        x = x.unflatten(1, (num_groups, group_width))
+        scale = scale.reshape(scale.shape[0], -1)[:, :num_groups].unsqueeze(2)
+        if zero_point is not None:
+            zero_point = zero_point.reshape(zero_point.shape[0], -1)
+            zero_point = zero_point[:, :num_groups].unsqueeze(2)
+
+        if do_quantize:
+            output = _quantize(
+                x,
+                scale,
+                zero_point,
+                plan,
+                dtype=dtype,
+            ).to(output_dtype)
+        if do_dequantize:
+            output = _dequantize(output if do_quantize else x, scale, zero_point)
+            output = output.to(output_dtype)
+
+        output = output.flatten(1, 2)
+
+    elif plan.strategy == QuantizationStrategy.BLOCK:
+        output_dtype = dtype if dtype is not None else x.dtype
+        block_rows, block_columns = plan.block_shape
+        rows, columns = x.shape
+        divisible = rows % block_rows == 0 and columns % block_columns == 0
+
+        # qparams are shaped [row_blocks, column_blocks]
+        qparams_shape = (ceil(rows / block_rows), ceil(columns / block_columns))
+        scale = scale.reshape(qparams_shape)
+        if zero_point is not None:
+            zero_point = zero_point.reshape(qparams_shape)
+
+        if divisible:
+            # view x as [row_blocks, block_rows, column_blocks, block_columns] and
+            # scale as [row_blocks, 1, column_blocks, 1] so every block is processed
+            # against its own qparams in one broadcasted op
+            x = x.unflatten(1, (-1, block_columns)).unflatten(0, (-1, block_rows))
+            scale = scale.unsqueeze(1).unsqueeze(3)
+            if zero_point is not None:
+                zero_point = zero_point.unsqueeze(1).unsqueeze(3)
+        else:
+            # partial blocks along the edges, expand qparams to the shape of x
+            scale = _expand_blocks(scale, block_rows, block_columns, rows, columns)
+            if zero_point is not None:
+                zero_point = _expand_blocks(
+                    zero_point, block_rows, block_columns, rows, columns
                 )
-                output[:, idx : (idx + group_size)] = _dequantize(input, sc, zp)
+
+        if do_quantize:
+            output = _quantize(
+                x,
+                scale,
+                zero_point,
+                plan,
+                dtype=dtype,
+            ).to(output_dtype)
+        if do_dequantize:
+            output = _dequantize(output if do_quantize else x, scale, zero_point)
+            output = output.to(output_dtype)
+
+        if divisible:
+            output = output.flatten(2, 3).flatten(0, 1)
 
     else:  # covers channel, token and tensor strategies
+        if plan.strategy == QuantizationStrategy.TOKEN and scale.numel() > 1:
+            # per token qparams broadcast along the hidden dimension, whatever
+            # shape they were computed with
+            scale = scale.reshape(*x.shape[:-1], 1)
+            if zero_point is not None:
+                zero_point = zero_point.reshape(*x.shape[:-1], 1)
+
         if do_quantize:
             output = _quantize(
                 x,
                 scale,
                 zero_point,
-                q_min,
-                q_max,
-                args,
+                plan,
                 dtype=dtype,
             )
         if do_dequantize:
@@ -235,13 +297,27 @@ def _process_quantization(
     return output
 
 
+def _expand_blocks(
+    qparam: torch.Tensor,
+    block_rows: int,
+    block_columns: int,
+    rows: int,
+    columns: int,
+) -> torch.Tensor:
+    # repeat each per block value over its block, cropping partial edge blocks
+    qparam = qparam.repeat_interleave(block_rows, dim=0)[:rows]
+    return qparam.repeat_interleave(block_columns, dim=1)[:, :columns]
+
+
 def wrap_module_forward_quantized(module: Module, scheme: QuantizationScheme):
     # expects a module already initialized and injected with the parameters in
     # initialize_module_for_quantization
-    if hasattr(module.forward, "__func__"):
-        forward_func_orig = module.forward.__func__
-    else:
-        forward_func_orig = module.forward.func
+    if getattr(module, _WEIGHT_FOLDED_NAME, False) and scheme.weights is not None:
+        # the folded weight is already quantized
+        scheme = scheme.model_copy(update={"weights": None})
+
+    forward_func_orig = _get_original_forward_func(module)
+    forward_with_weight = _FORWARDS_WITH_WEIGHT.get(forward_func_orig)
 
     @wraps(forward_func_orig)  # ensures docstring, names, etc are propagated
     def wrapped_forward(self, *args, **kwargs):
@@ -253,36 +329,275 @@ def wrap_module_forward_quantized(module: Module, scheme: QuantizationScheme):
                 module, input_, "input", scheme.input_activations
             )
 
-        if scheme.weights is not None:
-            # calibrate and (fake) quantize weights when applicable
-            unquantized_weight = self.weight.data.clone()
-            self.weight.data = maybe_calibrate_or_quantize(
-                module, self.weight, "weight", scheme.weights
+        if (
+            scheme.weights is not None
+            and forward_with_weight is not None
+            and len(args) == 1
+            and not kwargs
+        ):
+            # run the original op against an explicitly passed quantized weight,
+            # weight.data is never touched so concurrent calls are safe
+            quantized_weight = _get_quantized_weight(module, scheme.weights)
+            if torch.is_grad_enabled() and self.weight.requires_grad:
+                quantized_weight = _StraightThroughWeight.apply(
+                    self.weight, quantized_weight
+                )
+            output = forward_with_weight(module, input_, quantized_weight)
+        elif scheme.weights is not None:
+            # forwards that cannot be passed a weight run against the quantized
+            # weight swapped into weight.data. Concurrent calls would read each
+            # other's swapped weight, so they are serialized
+            with _WEIGHT_SWAP_LOCK:
+                unquantized_weight = self.weight.data
+                self.weight.data = _get_quantized_weight(module, scheme.weights)
+                try:
+                    output = forward_func_orig.__get__(module, module.__class__)(
+                        input_, *args[1:], **kwargs
+                    )
+                finally:
+                    # restore back to unquantized_value
+                    self.weight.data = unquantized_weight
+        else:
+            # perform wrapped forward call
+            output = forward_func_orig.__get__(module, module.__class__)(
+                input_, *args[1:], **kwargs
             )
 
-        # perform wrapped forward call
-        output = forward_func_orig.__get__(module, module.__class__)(
-            input_, *args[1:], **kwargs
-        )
-
         if scheme.output_activations is not None:
             # calibrate and (fake) quantize output activations when applicable
             output = maybe_calibrate_or_quantize(
                 module, output, "output", scheme.output_activations
             )
 
-        # restore back to unquantized_value
-        if scheme.weights is not None:
-            self.weight.data = unquantized_weight
-
         return output
 
+    # mark the wrapper so it can be told apart from forwards installed by others
+    wrapped_forward._quantized_forward = _FAKE_QUANTIZED_FORWARD
+
     # bind wrapped forward to module class so reference to `self` is correct
     bound_wrapped_forward = wrapped_forward.__get__(module, module.__class__)
     # set forward to wrapped forward
     setattr(module, "forward", bound_wrapped_forward)
 
 
+def update_module_forward_quantized(module: Module):
+    """
+    Installs the forward call needed by the current quantization status of a module.
+    Calibrating and frozen modules are wrapped to run the quantized forward, and
+    compressed linear modules with int8 weights and input activations are wrapped
+    to run an integer matmul. Initialized and other compressed modules run their
+    original forward without any wrapper overhead. Must be called after changing
+    the status of a module outside of the quantization lifecycle functions. In place
+    edits to the weight or qparams through `.data` must be followed by
+    `clear_quantized_weight_cache`
+
+    apply to full model with `model.apply(update_module_forward_quantized)`
+
+    :param module: module to update the forward call of
+    """
+    scheme = getattr(module, "quantization_scheme", None)
+    if scheme is None:
+        # no quantization scheme nothing to do
+        return
+
+    # the quantized weight is recomputed under the new status
+    clear_quantized_weight_cache(module)
+
+    status = getattr(module, "quantization_status", None)
+    weight_folded = getattr(module, _WEIGHT_FOLDED_NAME, False)
+    if status in _QUANTIZED_FORWARD_STATUSES and (
+        not weight_folded
+        or scheme.input_activations is not None
+        or scheme.output_activations is not None
+    ):
+        forward_kind = _FAKE_QUANTIZED_FORWARD
+    elif status == QuantizationStatus.COMPRESSED and _supports_int8_forward(module):
+        forward_kind = _INT8_FORWARD
+    else:
+        _unwrap_module_forward_quantized(module)
+        return
+
+    # the fake quantized wrapper checks the status at call time, so an installed
+    # wrapper of the same kind is kept as is
+    if (
+        hasattr(module, _ORIGINAL_FORWARD_NAME)
+        and _get_wrapped_forward_kind(module) == forward_kind
+    ):
+        return
+
+    if forward_kind == _FAKE_QUANTIZED_FORWARD:
+        wrap_module_forward_quantized(module, scheme)
+    else:
+        _wrap_module_forward_int8(module, scheme)
+
+
+def remove_quantization_wrappers(model: Module):
+    """
+    Restores the original forward call of every module in the model wrapped for
+    quantization. Quantization parameters and status are left untouched
+
+    :param model: model to remove the quantized forward wrappers from
+    """
+    for module in model.modules():
+        _unwrap_module_forward_quantized(module)
+
+
+def _unwrap_module_forward_quantized(module: Module):
+    if not hasattr(module, _ORIGINAL_FORWARD_NAME):
+        # forward was never wrapped, nothing to do
+        return
+
+    if _get_wrapped_forward_kind(module) is None:
+        _LOGGER.warning(
+            f"forward of {type(module)} was replaced after being wrapped for "
+            "quantization, skipping restoring its original forward"
+        )
+        return
+
+    forward_orig = getattr(module, _ORIGINAL_FORWARD_NAME)
+    delattr(module, _ORIGINAL_FORWARD_NAME)
+    if forward_orig is None:
+        # fall back to the forward of the module class
+        delattr(module, "forward")
+    else:
+        setattr(module, "forward", forward_orig)
+
+
+def _get_original_forward_func(module: Module):
+    if not hasattr(module, _ORIGINAL_FORWARD_NAME):
+        # keep the forward the module had before being wrapped so it can be restored,
+        # None if the module runs the forward of its class
+        setattr(module, _ORIGINAL_FORWARD_NAME, module.__dict__.get("forward"))
+    forward_orig = getattr(module, _ORIGINAL_FORWARD_NAME)
+
+    if forward_orig is None:
+        return module.__class__.forward
+    if hasattr(forward_orig, "__func__"):
+        return forward_orig.__func__
+    return forward_orig.func
+
+
+def _get_wrapped_forward_kind(module: Module) -> Optional[str]:
+    # kind of quantized wrapper currently installed, None if the forward is not
+    # a quantized wrapper
+    forward_func = getattr(module.__dict__.get("forward"), "__func__", None)
+    return getattr(forward_func, "_quantized_forward", None)
+
+
+def _supports_int8_forward(module: Module) -> bool:
+    scheme = module.quantization_scheme
+    weights = scheme.weights
+    inputs = scheme.input_activations
+    return (
+        isinstance(module, torch.nn.Linear)
+        and module.weight.dtype == torch.int8
+        and scheme.output_activations is None
+        and _is_int8_args(weights, _INT8_WEIGHT_STRATEGIES)
+        and weights.symmetric
+        and not weights.dynamic
+        and _is_int8_args(inputs, _INT8_INPUT_STRATEGIES)
+    )
+
+
+def _is_int8_args(args: Optional[QuantizationArgs], strategies) -> bool:
+    return (
+        args is not None
+        and args.type == QuantizationType.INT
+        and args.num_bits == 8
+        and args.strategy in strategies
+    )
+
+
+def _wrap_module_forward_int8(module: Module, scheme: QuantizationScheme):
+    # expects a compressed linear module with int8 weights, see _supports_int8_forward
+    forward_func_orig = _get_original_forward_func(module)
+
+    @wraps(forward_func_orig)
+    def int8_forward(self, input_):
+        return _int8_linear(self, input_, scheme.input_activations)
+
+    int8_forward._quantized_forward = _INT8_FORWARD
+    setattr(module, "forward", int8_forward.__get__(module, module.__class__))
+
+
+@torch.no_grad()
+def _int8_linear(
+    module: Module, input_: torch.Tensor, input_args: QuantizationArgs
+) -> torch.Tensor:
+    """
+    Runs a linear module with compressed int8 weights as an integer matmul of the
+    int8 quantized input and weight, rescaled by the product of their scales
+
+    :param module: compressed linear module
+    :param input_: float input to the module
+    :param input_args: quantization args of the input activations
+    :return: float output of the module, in the dtype of the input
+    """
+    if _supports_fused_dynamic_quantization(input_args):
+        input_q, input_scale, input_zero_point = _dynamic_quantize_per_token(
+            input_, input_args, do_dequantize=False
+        )
+    else:
+        if input_args.dynamic:
+            input_scale, input_zero_point = module.input_observer(input_)
+        else:
+            input_scale = module.input_scale
+            input_zero_point = module.input_zero_point
+        input_q = quantize(
+            input_, input_scale, input_zero_point, input_args, dtype=torch.int8
+        )
+
+    output_shape = (*input_.shape[:-1], module.out_features)
+    input_q = input_q.reshape(-1, input_q.shape[-1])
+
+    # per token scales and zero points are shaped [num_tokens, 1] and per channel
+    # weight scales [1, out_features], per tensor ones broadcast to both
+    input_scale = input_scale.reshape(-1, 1).to(input_.device).float()
+    weight_scale = module.weight_scale.reshape(1, -1).float()
+    if not input_args.symmetric:
+        input_zero_point = input_zero_point.reshape(-1, 1).to(input_.device)
+
+    output = _int8_mm(input_q, module.weight.t())
+    if output is not None:
+        if not input_args.symmetric:
+            # (x_q - zp) @ w_q.T == x_q @ w_q.T - zp * w_q.sum(1)
+            weight_sums = module.weight.sum(dim=1, dtype=torch.int32)
+            output -= input_zero_point.to(torch.int32) * weight_sums
+
+        # rescale in float32, the int32 accumulator can overflow half precision
+        output = output.float() * (input_scale * weight_scale)
+    else:
+        # no integer matmul on this device, the same product is computed from the
+        # dequantized input and weight
+        input_dq = input_q.float()
+        if not input_args.symmetric:
+            input_dq -= input_zero_point.float()
+        weight_dq = module.weight.float() * weight_scale.t()
+        output = torch.mm(input_dq * input_scale, weight_dq.t())
+
+    # the bias is added before casting, so a float32 bias does not promote the
+    # output of half precision inputs
+    if module.bias is not None:
+        output += module.bias.float()
+
+    return output.to(input_.dtype).reshape(output_shape)
+
+
+def _int8_mm(input_q: torch.Tensor, weight_q: torch.Tensor) -> Optional[torch.Tensor]:
+    # torch._int_mm is missing from older torch versions and has shape constraints
+    # in some builds. An int32 matmul gives the same result but is only implemented
+    # on CPU, None is returned if neither can run
+    int_mm = getattr(torch, "_int_mm", None)
+    if int_mm is not None:
+        try:
+            return int_mm(input_q, weight_q)
+        except RuntimeError:
+            pass
+    if input_q.device.type == "cpu":
+        return torch.mm(input_q.to(torch.int32), weight_q.to(torch.int32))
+    return None
+
+
 def maybe_calibrate_or_quantize(
     module: Module, value: torch.Tensor, base_name: str, args: "QuantizationArgs"
 ) -> torch.Tensor:
@@ -294,6 +609,11 @@ def maybe_calibrate_or_quantize(
         return value
 
     if args.dynamic:
+        if _supports_fused_dynamic_quantization(args):
+            # per token qparams are computed while quantizing, without the observer
+            output, _, _ = _dynamic_quantize_per_token(value, args)
+            return output
+
         # dynamic quantization - get scale and zero point directly from observer
         observer = getattr(module, f"{base_name}_observer")
         scale, zero_point = observer(value)
@@ -304,15 +624,349 @@ def maybe_calibrate_or_quantize(
 
         if module.quantization_status == QuantizationStatus.CALIBRATION:
             # calibration mode - get new quant params from observer
-            observer = getattr(module, f"{base_name}_observer")
+            scale, zero_point = _calibrate_qparams(module, value, base_name)
+    return fake_quantize(value, scale, zero_point, args)
 
-            updated_scale, updated_zero_point = observer(value)
 
-            # update scale and zero point
-            device = next(module.parameters()).device
-            scale.data = updated_scale.to(device)
-            zero_point.data = updated_zero_point.to(device)
-    return fake_quantize(value, scale, zero_point, args)
+def _calibrate_qparams(
+    module: Module, value: torch.Tensor, base_name: str
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # updates the static qparams of a calibrating module from its observer and
+    # returns the values computed by this call
+    scale = getattr(module, f"{base_name}_scale")
+    zero_point = getattr(module, f"{base_name}_zero_point")
+    observer = getattr(module, f"{base_name}_observer")
+    device = next(module.parameters()).device
+
+    # observers keep running state, serialize updates from concurrent calls
+    # and quantize with the values computed by this call
+    with _CALIBRATION_LOCK:
+        updated_scale, updated_zero_point = observer(value)
+        updated_scale = updated_scale.to(device)
+        updated_zero_point = updated_zero_point.to(device)
+
+        # update scale and zero point
+        scale.data = updated_scale
+        zero_point.data = updated_zero_point
+
+    if base_name == "weight":
+        # the cached quantized weight was computed with the previous qparams
+        _drop_cached_quantized_weight(module)
+
+    return updated_scale, updated_zero_point
+
+
+@torch.no_grad()
+def _observe_weight_before_freeze(module: Module):
+    # a weight updated or invalidated after it was last observed is observed again
+    # before its observer is deleted. Weights never observed during calibration
+    # keep their initial qparams
+    scheme = getattr(module, "quantization_scheme", None)
+    if (
+        scheme is None
+        or scheme.weights is None
+        or scheme.weights.dynamic
+        or module.quantization_status != QuantizationStatus.CALIBRATION
+        or not hasattr(module, _WEIGHT_OBSERVED_NAME)
+        or getattr(module, _WEIGHT_OBSERVED_NAME) == _get_observed_weight_key(module)
+    ):
+        return
+
+    _observe_weight(module)
+
+
+def _observe_weight(module: Module) -> Tuple[torch.Tensor, torch.Tensor]:
+    # the observer is reset so the statistics of a previous weight are not blended
+    # into the qparams of the current one
+    with _CALIBRATION_LOCK:
+        module.weight_observer.reset()
+        scale, zero_point = _calibrate_qparams(module, module.weight, "weight")
+        setattr(module, _WEIGHT_OBSERVED_NAME, _get_observed_weight_key(module))
+    return scale, zero_point
+
+
+@torch.no_grad()
+def _cache_frozen_quantized_weight(module: Module):
+    # the static weight of a frozen module is quantized once its qparams are final,
+    # so compiled graphs reuse it instead of quantizing it on every call
+    scheme = getattr(module, "quantization_scheme", None)
+    if (
+        scheme is None
+        or scheme.weights is None
+        or scheme.weights.dynamic
+        or getattr(module, _WEIGHT_FOLDED_NAME, False)
+        or module.quantization_status != QuantizationStatus.FROZEN
+        or module.weight.is_meta
+    ):
+        return
+
+    _get_cached_quantized_weight(module, scheme.weights)
+
+
+def _get_observed_weight_key(module: Module) -> Tuple[int, int]:
+    # in place updates bump the version counter of the weight, reassigning its
+    # data changes its data pointer
+    return module.weight._version, module.weight.data_ptr()
+
+
+class _StraightThroughWeight(torch.autograd.Function):
+    """
+    Runs the forward call with the quantized weight and passes its gradient
+    straight through to the unquantized weight
+    """
+
+    @staticmethod
+    def forward(ctx, weight: torch.Tensor, quantized_weight: torch.Tensor):
+        return quantized_weight.view_as(quantized_weight)
+
+    @staticmethod
+    def backward(ctx, grad_output: torch.Tensor):
+        return grad_output, None
+
+
+def _linear_forward_with_weight(
+    module: Module, input_: torch.Tensor, weight: torch.Tensor
+) -> torch.Tensor:
+    return F.linear(input_, weight, module.bias)
+
+
+def _conv_forward_with_weight(
+    module: Module, input_: torch.Tensor, weight: torch.Tensor
+) -> torch.Tensor:
+    return module._conv_forward(input_, weight, module.bias)
+
+
+# original forward functions that can be run against an explicitly passed weight,
+# so a quantized weight can be used without overwriting the module's weight
+_FORWARDS_WITH_WEIGHT = {
+    torch.nn.Linear.forward: _linear_forward_with_weight,
+    torch.nn.Conv1d.forward: _conv_forward_with_weight,
+    torch.nn.Conv2d.forward: _conv_forward_with_weight,
+    torch.nn.Conv3d.forward: _conv_forward_with_weight,
+}
+
+_QUANTIZED_WEIGHT_CACHE_NAME = "_quantized_weight_cache"
+
+# version of the weight last observed during calibration, reset to None once it is
+# invalidated by clear_quantized_weight_cache
+_WEIGHT_OBSERVED_NAME = "_weight_observed"
+
+_ORIGINAL_FORWARD_NAME = "_forward_before_quantization"
+
+# set on modules whose weight quantization was folded into their weight, so the
+# forward call never quantizes the weight again
+_WEIGHT_FOLDED_NAME = "_quantization_weight_folded"
+
+# kinds of quantized forward wrappers
+_FAKE_QUANTIZED_FORWARD = "fake_quantized"
+_INT8_FORWARD = "int8"
+
+# strategies supported by the integer matmul of compressed int8 linear modules
+_INT8_WEIGHT_STRATEGIES = (QuantizationStrategy.TENSOR, QuantizationStrategy.CHANNEL)
+_INT8_INPUT_STRATEGIES = (QuantizationStrategy.TENSOR, QuantizationStrategy.TOKEN)
+
+# statuses in which the forward call (fake) quantizes, modules in any other status
+# run their original forward
+_QUANTIZED_FORWARD_STATUSES = {
+    QuantizationStatus.CALIBRATION,
+    QuantizationStatus.FROZEN,
+}
+
+# observers computing dynamic per token qparams from the min and max of each token,
+# the default minmax observer is replaced by a memoryless one when dynamic
+_FUSED_DYNAMIC_OBSERVERS = ("minmax", "memoryless", "dynamic")
+
+_CALIBRATION_LOCK = threading.RLock()
+
+# held while a quantized weight is swapped into weight.data, re-entrant so modules
+# nested in a swapped forward can swap their own weights
+_WEIGHT_SWAP_LOCK = threading.RLock()
+
+# scratch buffers are per thread so concurrent forward calls never share them
+_SCRATCH_BUFFERS = threading.local()
+
+# number of scratch buffers kept per thread, the least recently used is freed first
+_MAX_SCRATCH_BUFFERS = 4
+
+
+def _get_quantized_weight(module: Module, args: QuantizationArgs) -> torch.Tensor:
+    if args.dynamic:
+        return maybe_calibrate_or_quantize(module, module.weight, "weight", args)
+
+    if is_torch_compiling():
+        # compiled graphs cannot compare cache keys or update the cache, frozen
+        # modules reuse the quantized weight cached outside the graph when they
+        # were frozen or last run eagerly, which dynamo guards as a graph input
+        cached = getattr(module, _QUANTIZED_WEIGHT_CACHE_NAME, None)
+        if (
+            cached is not None
+            and module.quantization_status == QuantizationStatus.FROZEN
+        ):
+            return cached[1]
+        return maybe_calibrate_or_quantize(module, module.weight, "weight", args)
+
+    if module.quantization_status == QuantizationStatus.CALIBRATION:
+        # the weight is only observed again once its version changes or
+        # clear_quantized_weight_cache marks it as updated. Observing the same
+        # weight repeatedly yields the same qparams
+        observed_key = getattr(module, _WEIGHT_OBSERVED_NAME, None)
+        if observed_key != _get_observed_weight_key(module):
+            _observe_weight(module)
+
+    if module.quantization_status in _QUANTIZED_FORWARD_STATUSES:
+        # frozen weights only change when the weight or its qparams are updated
+        return _get_cached_quantized_weight(module, args)
+
+    return maybe_calibrate_or_quantize(module, module.weight, "weight", args)
+
+
+def _get_cached_quantized_weight(
+    module: Module, args: QuantizationArgs
+) -> torch.Tensor:
+    """
+    Returns the fake quantized weight of a frozen or calibrating module, computing
+    it only if none is cached for the current weight and qparams. In place updates
+    and reassignments of the weight or its qparams are detected from their version
+    counters and data pointers, in place edits through `.data` change neither and
+    need a call to `clear_quantized_weight_cache`
+
+    :param module: module to get the quantized weight of
+    :param args: quantization args of the module weight
+    :return: fake quantized weight
+    """
+    cache_key = _get_weight_cache_key(module)
+    # the key and weight are stored together so concurrent calls never pair a
+    # key with the weight computed for another
+    cached = getattr(module, _QUANTIZED_WEIGHT_CACHE_NAME, None)
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    quantized_weight = fake_quantize(
+        module.weight, module.weight_scale, module.weight_zero_point, args
+    )
+    # a plain attribute is not saved to the state dict of the module
+    setattr(module, _QUANTIZED_WEIGHT_CACHE_NAME, (cache_key, quantized_weight))
+    return quantized_weight
+
+
+def _get_weight_cache_key(module: Module) -> Tuple:
+    # in place updates bump the version counter of a tensor, reassigning its data
+    # or moving the module changes its data pointer
+    tensors = (
+        module.weight,
+        getattr(module, "weight_scale", None),
+        getattr(module, "weight_zero_point", None),
+    )
+    return tuple(
+        (tensor._version, tensor.data_ptr()) if tensor is not None else None
+        for tensor in tensors
+    )
+
+
+def clear_quantized_weight_cache(module: Module):
+    """
+    Drops the quantized weight cached for a module and marks its weight to be
+    observed again if calibrating. Updates of the weight or its qparams are
+    otherwise detected when the weight is next used, except for in place edits
+    through `.data` which must be followed by a call to this function. Compiled
+    forward calls reuse the cached weight without checking for updates, so any
+    update of a frozen weight run compiled must be followed by a call to this
+    function
+
+    :param module: module to clear the cached quantized weight of
+    """
+    _drop_cached_quantized_weight(module)
+    if hasattr(module, _WEIGHT_OBSERVED_NAME):
+        setattr(module, _WEIGHT_OBSERVED_NAME, None)
+
+
+def _drop_cached_quantized_weight(module: Module):
+    if hasattr(module, _QUANTIZED_WEIGHT_CACHE_NAME):
+        delattr(module, _QUANTIZED_WEIGHT_CACHE_NAME)
+
+
+def _supports_fused_dynamic_quantization(args: QuantizationArgs) -> bool:
+    if not (
+        args.dynamic
+        and args.strategy == QuantizationStrategy.TOKEN
+        and args.type == QuantizationType.INT
+    ):
+        return False
+
+    if args.observer in _FUSED_DYNAMIC_OBSERVERS:
+        return True
+
+    # custom observers may compute dynamic qparams differently
+    if not is_torch_compiling():
+        _log_fused_dynamic_fallback(args.observer)
+    return False
+
+
+@lru_cache(maxsize=None)
+def _log_fused_dynamic_fallback(observer: str):
+    _LOGGER.info(
+        f"Dynamic per token quantization with the {observer} observer runs the "
+        "observer on every call instead of the fused per token quantization"
+    )
+
+
+@torch.no_grad()
+def _dynamic_quantize_per_token(
+    x: torch.Tensor, args: QuantizationArgs, do_dequantize: bool = True
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Quantizes x with per token qparams computed from its own min and max along the
+    hidden (last) dimension. Matches running a memoryless observer followed by
+    quantize or fake_quantize, but reads x only twice and keeps intermediate
+    values in a reused scratch buffer
+
+    :param x: input tensor, shaped [..., hidden]
+    :param args: dynamic token quantization args
+    :param do_dequantize: if True, return the fake quantized tensor in the dtype of
+        x, otherwise the quantized tensor in the dtype of args
+    :return: tuple of the (fake) quantized tensor, scale and zero point, qparams
+        are shaped [..., 1]
+    """
+    plan = get_quantization_plan(args, x.device, x.dtype)
+    min_vals, max_vals = torch.aminmax(x, dim=-1, keepdim=True)
+    scale, zero_point = calculate_qparams(min_vals, max_vals, args)
+
+    scaled = _get_scratch_buffer(x.shape, x.dtype, x.device)
+    torch.div(x, scale, out=scaled)
+    if not plan.symmetric:
+        scaled.add_(zero_point.to(x.dtype))
+    scaled.clamp_(plan.q_min, plan.q_max).round_()
+
+    if not do_dequantize:
+        return scaled.to(plan.quantized_dtype), scale, zero_point
+
+    if not plan.symmetric:
+        scaled.sub_(zero_point.to(scale.dtype))
+    return torch.mul(scaled, scale), scale, zero_point
+
+
+def _get_scratch_buffer(
+    shape: torch.Size, dtype: torch.dtype, device: torch.device
+) -> torch.Tensor:
+    # returns an uninitialized tensor for intermediate values that never outlive
+    # the call. Buffers are kept per thread for the few shapes most recently
+    # requested, so repeated calls on the same shapes reuse them while buffers of
+    # shapes no longer requested are freed
+    if is_torch_compiling():
+        return torch.empty(shape, dtype=dtype, device=device)
+
+    buffers = getattr(_SCRATCH_BUFFERS, "buffers", None)
+    if buffers is None:
+        buffers = _SCRATCH_BUFFERS.buffers = OrderedDict()
+
+    key = (tuple(shape), dtype, torch.device(device))
+    buffer = buffers.pop(key, None)
+    if buffer is None:
+        if len(buffers) >= _MAX_SCRATCH_BUFFERS:
+            buffers.popitem(last=False)
+        buffer = torch.empty(shape, dtype=dtype, device=device)
+    buffers[key] = buffer
+    return buffer
 
 
 @torch.no_grad()
@@ -320,9 +974,7 @@ def _quantize(
     x: torch.Tensor,
     scale: torch.Tensor,
     zero_point: torch.Tensor,
-    q_min: torch.Tensor,
-    q_max: torch.Tensor,
-    args: QuantizationArgs,
+    plan: QuantizationPlan,
     dtype: Optional[torch.dtype] = None,
 ) -> torch.Tensor:
 
@@ -330,10 +982,10 @@ def _quantize(
     # clamp first because cast isn't guaranteed to be saturated (ie for fp8)
     clamped_value = torch.clamp(
         scaled,
-        q_min,
-        q_max,
+        plan.q_min,
+        plan.q_max,
     )
-    quantized_value = round_to_quantized_type(clamped_value, args)
+    quantized_value = plan.round(clamped_value)
     if dtype is not None:
         quantized_value = quantized_value.to(dtype)
 
@@ -13,6 +13,11 @@
 # limitations under the License.
 
 
+from compressed_tensors.quantization.lifecycle.forward import (
+    _cache_frozen_quantized_weight,
+    _observe_weight_before_freeze,
+    update_module_forward_quantized,
+)
 from compressed_tensors.quantization.quant_config import QuantizationStatus
 from torch.nn import Module
 
@@ -39,6 +44,8 @@ def freeze_module_quantization(module: Module):
         # nothing to do, already frozen
         return
 
+    _observe_weight_before_freeze(module)
+
     # delete observers from module if not dynamic
     if scheme.input_activations and not scheme.input_activations.dynamic:
         delattr(module, "input_observer")
@@ -48,3 +55,5 @@ def freeze_module_quantization(module: Module):
         delattr(module, "output_observer")
 
     module.quantization_status = QuantizationStatus.FROZEN
+    update_module_forward_quantized(module)
+    _cache_frozen_quantized_weight(module)
@@ -14,11 +14,12 @@
 
 
 import logging
+from math import ceil
 from typing import Optional
 
 import torch
 from compressed_tensors.quantization.lifecycle.forward import (
-    wrap_module_forward_quantized,
+    update_module_forward_quantized,
 )
 from compressed_tensors.quantization.quant_args import (
     QuantizationArgs,
@@ -81,8 +82,8 @@ def initialize_module_for_quantization(
     module.quantization_scheme = scheme
     module.quantization_status = QuantizationStatus.INITIALIZED
 
-    # wrap forward call of module to perform quantized actions based on calltime status
-    wrap_module_forward_quantized(module, scheme)
+    # forward is only wrapped once the module is set for calibration
+    update_module_forward_quantized(module)
 
 
 def _initialize_scale_zero_point_observer(
@@ -98,7 +99,13 @@ def _initialize_scale_zero_point_observer(
     if quantization_args.dynamic:
         return  # no need to register a scale and zero point for a dynamic observer
 
-    device = next(module.parameters()).device
+    # scale and zero point are created on the device of the module parameters, which
+    # allocates nothing for modules on the meta device. They are materialized when
+    # loaded from a checkpoint, see `load_pretrained_quantization`
+    param = next(module.parameters(), None)
+    device = param.device if param is not None else None
+    weight = getattr(module, "weight", None)
+    scale_dtype = weight.dtype if weight is not None else torch.get_default_dtype()
 
     # infer expected scale/zero point shape
     expected_shape = 1  # per tensor
@@ -112,10 +119,17 @@ def _initialize_scale_zero_point_observer(
                 weight_shape[0],
                 weight_shape[1] // quantization_args.group_size,
             )
+        elif quantization_args.strategy == QuantizationStrategy.BLOCK:
+            # one scale per block, partial blocks along the edges included
+            block_rows, block_columns = quantization_args.block_shape()
+            expected_shape = (
+                ceil(weight_shape[0] / block_rows),
+                ceil(weight_shape[1] / block_columns),
+            )
 
     # initializes empty scale and zero point parameters for the module
     init_scale = Parameter(
-        torch.empty(expected_shape, dtype=module.weight.dtype, device=device),
+        torch.empty(expected_shape, dtype=scale_dtype, device=device),
         requires_grad=False,
     )
     module.register_parameter(f"{base_name}_scale", init_scale)
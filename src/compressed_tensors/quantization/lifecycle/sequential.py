@@ -0,0 +1,194 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import torch
+from compressed_tensors.quantization.lifecycle.apply import apply_quantization_status
+from compressed_tensors.quantization.quant_config import QuantizationStatus
+from torch.nn import Module
+from tqdm import tqdm
+
+
+__all__ = [
+    "sequential_calibration",
+]
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _BlockInputsCaptured(Exception):
+    """
+    Raised by the first block to stop the model forward once its inputs are cached
+    """
+
+
+@torch.no_grad()
+def sequential_calibration(
+    model: Module,
+    blocks: Sequence[Module],
+    calibration_data: Iterable[Any],
+    execution_device: Optional[Union[str, torch.device]] = None,
+    offload_device: Union[str, torch.device] = "cpu",
+    compress: bool = False,
+):
+    """
+    Calibrates the quantized modules of a model one block at a time, so only a single
+    block and the cached block inputs need to be on the execution device at once
+
+    The inputs of the first block are cached by running the model on the
+    calibration data up to that block. Each block is then moved to the execution
+    device, calibrated on the cached inputs, frozen (or compressed) and offloaded.
+    Its outputs replace the first positional input of the cached inputs of the next
+    block, all other inputs such as attention masks are reused as is, so models
+    should be run without a kv cache
+
+    The model must already be initialized for quantization, see
+    `apply_quantization_config`. Quantized modules outside of the blocks are not
+    calibrated
+
+    :param model: model to calibrate
+    :param blocks: blocks of the model in execution order, such as decoder layers
+    :param calibration_data: samples to run the model on, dicts are passed as
+        keyword arguments, tuples and lists as positional arguments
+    :param execution_device: device to calibrate blocks on. If None, modules are
+        calibrated wherever they are and nothing is moved
+    :param offload_device: device blocks are moved to once calibrated, only used if
+        execution_device is set
+    :param compress: compress the weights of each block once it is calibrated
+        instead of only freezing them
+    """
+    if len(blocks) == 0:
+        raise ValueError("At least one block is required for sequential calibration")
+
+    block_inputs = _capture_block_inputs(
+        model, blocks, calibration_data, execution_device, offload_device
+    )
+
+    status = QuantizationStatus.COMPRESSED if compress else QuantizationStatus.FROZEN
+    for block in tqdm(blocks, desc="Calibrating blocks"):
+        _move_tensors(block, execution_device)
+        apply_quantization_status(block, QuantizationStatus.CALIBRATION)
+
+        for index, (args, kwargs) in enumerate(block_inputs):
+            outputs = block(*args, **kwargs)
+            if isinstance(outputs, (tuple, list)):
+                outputs = outputs[0]
+            block_inputs[index] = ((outputs, *args[1:]), kwargs)
+
+        apply_quantization_status(block, status)
+        if execution_device is not None:
+            _move_tensors(block, offload_device)
+
+    _warn_uncalibrated_modules(model)
+
+
+def _capture_block_inputs(
+    model: Module,
+    blocks: Sequence[Module],
+    calibration_data: Iterable[Any],
+    execution_device: Optional[Union[str, torch.device]],
+    offload_device: Union[str, torch.device],
+) -> List[Tuple[Tuple, Dict]]:
+    # runs the modules before the first block on the execution device, blocks stay
+    # offloaded as the forward call is stopped before reaching them
+    block_module_ids = {id(module) for block in blocks for module in block.modules()}
+    outer_modules = [
+        module for module in model.modules() if id(module) not in block_module_ids
+    ]
+    for module in outer_modules:
+        _move_tensors(module, execution_device, recurse=False)
+
+    block_inputs = []
+
+    def capture_forward(*args, **kwargs):
+        if len(args) == 0:
+            raise ValueError(
+                "Sequential calibration requires the hidden states to be passed to "
+                "the first block as its first positional argument"
+            )
+        block_inputs.append((args, kwargs))
+        raise _BlockInputsCaptured()
+
+    first_block = blocks[0]
+    original_forward = first_block.__dict__.get("forward")
+    first_block.forward = capture_forward
+    try:
+        for sample in tqdm(calibration_data, desc="Caching block inputs"):
+            sample = _move_sample(sample, execution_device)
+            try:
+                if isinstance(sample, dict):
+                    model(**sample)
+                elif isinstance(sample, (tuple, list)):
+                    model(*sample)
+                else:
+                    model(sample)
+            except _BlockInputsCaptured:
+                pass
+    finally:
+        if original_forward is None:
+            del first_block.forward
+        else:
+            first_block.forward = original_forward
+
+        if execution_device is not None:
+            for module in outer_modules:
+                _move_tensors(module, offload_device, recurse=False)
+
+    return block_inputs
+
+
+def _move_tensors(
+    module: Module,
+    device: Optional[Union[str, torch.device]],
+    recurse: bool = True,
+):
+    if device is None:
+        return
+    if recurse:
+        module.to(device)
+        return
+
+    for param in module.parameters(recurse=False):
+        param.data = param.data.to(device)
+    for name, buffer in module.named_buffers(recurse=False):
+        module._buffers[name] = buffer.to(device)
+
+
+def _move_sample(sample: Any, device: Optional[Union[str, torch.device]]) -> Any:
+    if device is None:
+        return sample
+    if isinstance(sample, torch.Tensor):
+        return sample.to(device)
+    if isinstance(sample, dict):
+        return {key: _move_sample(value, device) for key, value in sample.items()}
+    if isinstance(sample, (tuple, list)):
+        return type(sample)(_move_sample(value, device) for value in sample)
+    return sample
+
+
+def _warn_uncalibrated_modules(model: Module):
+    uncalibrated = [
+        name
+        for name, module in model.named_modules()
+        if getattr(module, "quantization_status", None) is not None
+        and module.quantization_status < QuantizationStatus.FROZEN
+    ]
+    if uncalibrated:
+        _LOGGER.warning(
+            "Some quantized modules are outside of the calibrated blocks and were "
+            f"not calibrated: {uncalibrated}"
+        )
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from math import ceil
 from typing import Any, Iterable, Optional, Tuple, Union
 
 import torch
@@ -20,26 +21,68 @@ from compressed_tensors.quantization.quant_args import (
     QuantizationStrategy,
 )
 from compressed_tensors.registry.registry import RegistryMixin
+from compressed_tensors.utils.helpers import is_torch_compiling
 from torch import FloatTensor, IntTensor, Tensor
 from torch.nn import Module
 
 
 __all__ = ["Observer"]
 
+_TOKEN_SAMPLINGS = ("strided", "random")
+
 
 class Observer(Module, RegistryMixin):
     """
     Base Observer class to be subclassed for specific implementation.
     Subclasses should override `calculate_qparams` to return a scale, zero_point
     pair
+
+    Per tensor observers can observe a subsample of the tokens of each observed
+    tensor, the rows of its last dimension, to speed up calibration on long
+    sequences. Intended for activations, set through `observer_kwargs`
+
+    :param quantization_args: quantization args the qparams are calculated for
+    :param token_fraction: fraction of the tokens to observe, all tokens are
+        observed if 1.0
+    :param token_sampling: how tokens are subsampled, either "strided" to observe
+        evenly spaced tokens or "random" to observe tokens drawn without replacement
+    :param seed: seed of the random token sampling
     """
 
-    def __init__(self, quantization_args: QuantizationArgs):
+    def __init__(
+        self,
+        quantization_args: QuantizationArgs,
+        token_fraction: float = 1.0,
+        token_sampling: str = "strided",
+        seed: int = 0,
+    ):
         self.quantization_args: QuantizationArgs = quantization_args
         super().__init__()
         self._scale = None
         self._zero_point = None
 
+        if not 0.0 < token_fraction <= 1.0:
+            raise ValueError(
+                f"token_fraction must be in (0, 1], received {token_fraction}"
+            )
+        if token_sampling not in _TOKEN_SAMPLINGS:
+            raise ValueError(
+                f"token_sampling must be one of {_TOKEN_SAMPLINGS}, "
+                f"received {token_sampling}"
+            )
+        if token_fraction < 1.0 and (
+            quantization_args.strategy != QuantizationStrategy.TENSOR
+        ):
+            raise ValueError(
+                "Token subsampling is only supported for the tensor strategy, "
+                f"received {quantization_args.strategy}"
+            )
+        self.token_fraction = token_fraction
+        self.token_sampling = token_sampling
+        self._generator = None
+        if token_sampling == "random":
+            self._generator = torch.Generator().manual_seed(seed)
+
     @torch.no_grad()
     def forward(self, observed: Tensor) -> Tuple[FloatTensor, IntTensor]:
         """
@@ -64,6 +107,14 @@ class Observer(Module, RegistryMixin):
         """
         raise NotImplementedError(f"{self.__class__} must implement calculate_qparams")
 
+    def reset(self) -> None:
+        """
+        Clears the state kept from previously observed tensors, so the next call
+        calculates quantization parameters as a newly created observer would
+        """
+        self._scale = None
+        self._zero_point = None
+
     def post_calculate_qparams(self) -> None:
         """
         Run any logic specific to its observers after running calculate_qparams
@@ -86,40 +137,76 @@ class Observer(Module, RegistryMixin):
             group_size = self.quantization_args.group_size
 
             if self.quantization_args.strategy == QuantizationStrategy.TENSOR:
+                if self.token_fraction < 1.0:
+                    observed = self._subsample_tokens(observed)
 
                 # re-calculate scale and zero point, update the stored value
-                self._scale, self._zero_point = self.calculate_qparams(observed)
+                scale, zero_point = self.calculate_qparams(observed)
 
             elif self.quantization_args.strategy == QuantizationStrategy.GROUP:
-                columns = observed.shape[1]
-                scales, zero_points = [], []
-                group_idxs = range(0, columns, self.quantization_args.group_size)
-                for group_id, group_idx in enumerate(group_idxs):
-                    scale, zero_point = self.get_qparams_along_dim(
-                        observed[:, group_idx : (group_idx + group_size)],
-                        0,
-                        tensor_id=group_id,
-                    )
-                    scales.append(scale)
-                    zero_points.append(zero_point)
-
-                self._scale = torch.cat(scales, dim=1, out=self._scale)
-                self._zero_point = torch.cat(zero_points, dim=1, out=self._zero_point)
+                # view observed as [rows, num_groups, group_size] so the stats of
+                # every group are reduced in a single pass
+                observed = _pad_to_multiple(observed, 1, group_size)
+                observed = observed.unflatten(1, (-1, group_size))
+
+                scale, zero_point = self.calculate_qparams(observed, reduce_dims=(2,))
+                scale = scale.squeeze(2)
+                zero_point = zero_point.squeeze(2)
+
+            elif self.quantization_args.strategy == QuantizationStrategy.BLOCK:
+                # view observed as [row_blocks, block_rows, column_blocks,
+                # block_columns] so the stats of every block are reduced at once
+                block_rows, block_columns = self.quantization_args.block_shape()
+                observed = _pad_to_multiple(observed, 0, block_rows)
+                observed = _pad_to_multiple(observed, 1, block_columns)
+                observed = observed.unflatten(1, (-1, block_columns))
+                observed = observed.unflatten(0, (-1, block_rows))
+
+                scale, zero_point = self.calculate_qparams(observed, reduce_dims=(1, 3))
+                scale = scale.squeeze(3).squeeze(1)
+                zero_point = zero_point.squeeze(3).squeeze(1)
 
             elif self.quantization_args.strategy == QuantizationStrategy.CHANNEL:
                 # assume observed is transposed, because its the output, hence use dim 0
-                self._scale, self._zero_point = self.get_qparams_along_dim(observed, 0)
+                scale, zero_point = self.get_qparams_along_dim(observed, 0)
 
             elif self.quantization_args.strategy == QuantizationStrategy.TOKEN:
-                # use dim 1, assume the obsersed.shape = [batch, token, hidden]
-                # should be batch, token
-                self._scale, self._zero_point = self.get_qparams_along_dim(
+                # keep every dim but the last, observed.shape = [..., token, hidden]
+                scale, zero_point = self.get_qparams_along_dim(
                     observed,
-                    dim={0, 1},
+                    dim=set(range(observed.ndim - 1)),
+                )
+
+            else:
+                raise ValueError(
+                    "Unsupported quantization strategy "
+                    f"{self.quantization_args.strategy} for {self.__class__.__name__}"
                 )
 
+            # return the values calculated by this call rather than re-reading the
+            # stored ones, which a concurrent call may have already replaced
+            if not is_torch_compiling():
+                # storing state on the module would break a compiled graph
+                self._scale, self._zero_point = scale, zero_point
+            return scale, zero_point
+
         return self._scale, self._zero_point
 
+    def _subsample_tokens(self, observed: Tensor) -> Tensor:
+        tokens = observed.reshape(-1, observed.shape[-1])
+        num_tokens = tokens.shape[0]
+        num_samples = max(1, ceil(num_tokens * self.token_fraction))
+        if num_samples >= num_tokens:
+            return observed
+
+        if self.token_sampling == "strided":
+            # evenly spaced tokens spanning the first to the last token
+            indices = torch.linspace(0, num_tokens - 1, num_samples).long()
+        else:
+            indices = torch.randperm(num_tokens, generator=self._generator)
+            indices = indices[:num_samples]
+        return tokens.index_select(0, indices.to(tokens.device))
+
     def get_qparams_along_dim(
         self,
         observed,
@@ -132,3 +219,15 @@ class Observer(Module, RegistryMixin):
         return self.calculate_qparams(
             observed, reduce_dims=reduce_dims, tensor_id=tensor_id
         )
+
+
+def _pad_to_multiple(observed: Tensor, dim: int, multiple: int) -> Tensor:
+    # pad dim by repeating its last slice, which belongs to the last group or block,
+    # so the padding does not change any group's or block's min or max
+    padding = -observed.shape[dim] % multiple
+    if padding == 0:
+        return observed
+    last = observed.narrow(dim, observed.shape[dim] - 1, 1)
+    expanded_shape = list(observed.shape)
+    expanded_shape[dim] = padding
+    return torch.cat([observed, last.expand(expanded_shape)], dim=dim)
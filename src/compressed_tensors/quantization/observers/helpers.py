@@ -12,18 +12,123 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Tuple
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, Union
 
 import torch
 from compressed_tensors.quantization.quant_args import (
     FP8_DTYPE,
     QuantizationArgs,
+    QuantizationStrategy,
     QuantizationType,
 )
+from compressed_tensors.utils.helpers import is_torch_compiling
 from torch import FloatTensor, IntTensor, Tensor
 
 
-__all__ = ["calculate_qparams", "calculate_range"]
+__all__ = [
+    "calculate_qparams",
+    "calculate_range",
+    "QuantizationPlan",
+    "get_quantization_plan",
+]
+
+
+class QuantizationPlan(NamedTuple):
+    """
+    Constants derived from QuantizationArgs that are needed to quantize a tensor on
+    a given device and of a given dtype. Plans are cached, so their range tensors
+    must not be modified in place
+
+    :param q_min: min of the quantized range, on the plan device
+    :param q_max: max of the quantized range, on the plan device
+    :param strategy: quantization strategy
+    :param group_size: group length of the group strategy
+    :param block_shape: (rows, columns) of each block of the block strategy
+    :param symmetric: whether the quantization is symmetric about zero
+    :param dtype: dtype of the tensors quantized with the plan
+    :param quantized_dtype: torch dtype to store quantized values in
+    :param round: rounds a tensor to the nearest quantized value, keeping its dtype
+    """
+
+    q_min: Tensor
+    q_max: Tensor
+    strategy: QuantizationStrategy
+    group_size: Optional[int]
+    block_shape: Optional[Tuple[int, int]]
+    symmetric: bool
+    dtype: torch.dtype
+    quantized_dtype: torch.dtype
+    round: Callable[[Tensor], Tensor]
+
+
+def get_quantization_plan(
+    quantization_args: QuantizationArgs,
+    device: Union[str, torch.device],
+    dtype: torch.dtype,
+) -> QuantizationPlan:
+    """
+    :param quantization_args: settings to quantization
+    :param device: device of the tensors quantized with the plan
+    :param dtype: dtype of the tensors quantized with the plan
+    :return: cached quantization plan for the given args, device and dtype
+    """
+    device = torch.device(device)
+    if is_torch_compiling():
+        # compiled graphs build the plan inline as cache updates are side effects,
+        # its constants are folded into the graph
+        return _build_quantization_plan(quantization_args, device, dtype)
+
+    # args are mutable, so they are keyed by the fields that define the plan
+    key = (
+        quantization_args.num_bits,
+        quantization_args.type,
+        quantization_args.symmetric,
+        quantization_args.strategy,
+        quantization_args.group_size,
+        quantization_args.block_structure,
+        device,
+        dtype,
+    )
+    plan = _QUANTIZATION_PLANS.get(key)
+    if plan is None:
+        plan = _build_quantization_plan(quantization_args, device, dtype)
+        _QUANTIZATION_PLANS[key] = plan
+    return plan
+
+
+# plans by the fields of the args, device and dtype they were built for
+_QUANTIZATION_PLANS: Dict[Tuple, QuantizationPlan] = {}
+
+
+def _build_quantization_plan(
+    quantization_args: QuantizationArgs, device: torch.device, dtype: torch.dtype
+) -> QuantizationPlan:
+    q_min, q_max = calculate_range(quantization_args, device)
+    strategy = quantization_args.strategy
+    block_shape = (
+        quantization_args.block_shape()
+        if strategy == QuantizationStrategy.BLOCK
+        else None
+    )
+    return QuantizationPlan(
+        q_min=q_min,
+        q_max=q_max,
+        strategy=strategy,
+        group_size=quantization_args.group_size,
+        block_shape=block_shape,
+        symmetric=quantization_args.symmetric,
+        dtype=dtype,
+        quantized_dtype=quantization_args.pytorch_dtype(),
+        round=(
+            _round_float8
+            if quantization_args.type == QuantizationType.FLOAT
+            else torch.round
+        ),
+    )
+
+
+def _round_float8(tensor: Tensor) -> Tensor:
+    return tensor.to(FP8_DTYPE).to(tensor.dtype)
 
 
 def calculate_qparams(
@@ -41,11 +146,12 @@ def calculate_qparams(
     max_vals = torch.max(max_vals, torch.zeros_like(max_vals))
     device = min_vals.device
 
-    bit_min, bit_max = calculate_range(quantization_args, device)
+    plan = get_quantization_plan(quantization_args, device, min_vals.dtype)
+    bit_min, bit_max = plan.q_min, plan.q_max
     bit_range = bit_max - bit_min
-    zp_dtype = quantization_args.pytorch_dtype()
+    zp_dtype = plan.quantized_dtype
 
-    if quantization_args.symmetric:
+    if plan.symmetric:
         max_val_pos = torch.max(torch.abs(min_vals), torch.abs(max_vals))
         scales = max_val_pos / (float(bit_range) / 2)
         scales = torch.clamp(scales, min=torch.finfo(torch.float32).eps)
@@ -32,9 +32,12 @@ class MovingAverageMinMaxObserver(Observer):
     """
 
     def __init__(
-        self, quantization_args: QuantizationArgs, averaging_constant: float = 0.01
+        self,
+        quantization_args: QuantizationArgs,
+        averaging_constant: float = 0.01,
+        **kwargs,
     ):
-        super().__init__(quantization_args=quantization_args)
+        super().__init__(quantization_args=quantization_args, **kwargs)
 
         self.min_val = {}
         self.max_val = {}
@@ -87,6 +90,15 @@ class MovingAverageMinMaxObserver(Observer):
             updated_min_val, updated_max_val, self.quantization_args
         )
 
+    def reset(self) -> None:
+        """
+        Clears the moving averages of the observed min and max values along with
+        the last calculated quantization parameters
+        """
+        super().reset()
+        self.min_val = {}
+        self.max_val = {}
+
     def get_qparams_along_dim(
         self, observed, dim: int, tensor_id: Optional[Any] = None
     ):
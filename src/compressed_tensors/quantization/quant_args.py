@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import torch
 from pydantic import BaseModel, Field, validator
@@ -103,7 +103,9 @@ class QuantizationArgs(BaseModel, use_enum_values=True):
             # keeps state across samples for dynamic
             self.observer = "memoryless"
 
-        return Observer.load_from_registry(self.observer, quantization_args=self)
+        return Observer.load_from_registry(
+            self.observer, quantization_args=self, **self.observer_kwargs
+        )
 
     @validator("strategy", pre=True, always=True)
     def validate_strategy(cls, value, values):
@@ -133,6 +135,24 @@ class QuantizationArgs(BaseModel, use_enum_values=True):
 
         return value
 
+    @validator("block_structure", always=True)
+    def validate_block_structure(cls, value, values):
+        strategy = values.get("strategy")
+
+        if value is not None:
+            # raises if not of the format "2x4", "8x16", etc.
+            _parse_block_structure(value)
+        elif strategy == QuantizationStrategy.BLOCK:
+            raise ValueError(f"strategy {strategy} requires block_structure to be set.")
+
+        return value
+
+    def block_shape(self) -> Tuple[int, int]:
+        """
+        :return: (rows, columns) of each block of the block strategy
+        """
+        return _parse_block_structure(self.block_structure)
+
     def pytorch_dtype(self) -> torch.dtype:
         if self.type == QuantizationType.FLOAT:
             return FP8_DTYPE
@@ -147,6 +167,19 @@ class QuantizationArgs(BaseModel, use_enum_values=True):
             raise ValueError(f"Invalid quantization type {self.type}")
 
 
+def _parse_block_structure(block_structure: str) -> Tuple[int, int]:
+    try:
+        rows, columns = (int(dim) for dim in block_structure.lower().split("x"))
+    except ValueError:
+        raise ValueError(
+            f"Invalid block_structure {block_structure}, must be of the format "
+            "'2x4', '8x16', etc."
+        )
+    if rows <= 0 or columns <= 0:
+        raise ValueError(f"block_structure {block_structure} must be positive")
+    return rows, columns
+
+
 def round_to_quantized_type(
     tensor: torch.Tensor, args: QuantizationArgs
 ) -> torch.Tensor:
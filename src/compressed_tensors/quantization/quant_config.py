@@ -25,6 +25,7 @@ from compressed_tensors.quantization.utils import (
     calculate_compression_ratio,
     is_module_quantized,
     iter_named_leaf_modules,
+    leaf_module_index,
     module_type,
     parse_out_kv_cache_args,
 )
@@ -173,69 +174,73 @@ class QuantizationConfig(BaseModel):
         :param model: model to calculate quantization scheme of
         :return: filled out QuantizationScheme for the input model
         """
-        quant_scheme_to_layers = []
-        quantization_status = None
-        ignore = {}
-        quantization_type_names = set()
-        for name, submodule in iter_named_leaf_modules(model):
-            layer_type = module_type(submodule)
-            if not is_module_quantized(submodule):
-                if layer_type not in ignore:
-                    ignore[layer_type] = []
-                ignore[layer_type].append(name)
-            else:
-                quantization_status = submodule.quantization_status
-                scheme = submodule.quantization_scheme
-                quantization_type_names.add(layer_type)
-
-                match_found = False
-                for existing_scheme in quant_scheme_to_layers:
-                    if scheme == existing_scheme:
-                        match_found = True
-                        break
-                if not match_found:
-                    quant_scheme_to_layers.append(scheme)
-
-        if len(quant_scheme_to_layers) == 0:  # No quantized layers
-            return None
-
-        # clean up ignore list, we can leave out layers types if none of the
-        # instances are quantized
-        consolidated_ignore = []
-        for layer_type, ignore_names in ignore.items():
-            if layer_type in quantization_type_names:
-                # specific layers of a quantized type are ignored
-                consolidated_ignore += ignore_names
-            # else we leave it off the ignore list, doesn't fall under any of the
-            # existing quantization schemes so it won't be quantized
-
-        kv_cache_args, quant_scheme_to_layers = parse_out_kv_cache_args(
-            quant_scheme_to_layers
-        )
-        kv_cache_scheme = (
-            kv_cache_args.model_dump() if kv_cache_args is not None else kv_cache_args
-        )
-
-        config_groups = {}
-        for idx, scheme in enumerate(quant_scheme_to_layers):
-            group_name = "group_" + str(idx)
-            config_groups[group_name] = scheme
-
-        # TODO: this is incorrect in compressed mode, since we are overwriting the
-        # original weight we lose the uncompressed bit_depth indo
-        compression_ratio = calculate_compression_ratio(model)
-
-        if format is None:
-            if quantization_status == QuantizationStatus.COMPRESSED:
-                format = CompressionFormat.int_quantized.value
-            else:
-                format = CompressionFormat.dense.value
-
-        return QuantizationConfig(
-            config_groups=config_groups,
-            quantization_status=quantization_status,
-            kv_cache_scheme=kv_cache_scheme,
-            global_compression_ratio=compression_ratio,
-            format=format,
-            ignore=consolidated_ignore,
-        )
+        # the leaf modules are walked to find the schemes and the compression stats
+        with leaf_module_index(model):
+            quant_scheme_to_layers = []
+            quantization_status = None
+            ignore = {}
+            quantization_type_names = set()
+            for name, submodule in iter_named_leaf_modules(model):
+                layer_type = module_type(submodule)
+                if not is_module_quantized(submodule):
+                    if layer_type not in ignore:
+                        ignore[layer_type] = []
+                    ignore[layer_type].append(name)
+                else:
+                    quantization_status = submodule.quantization_status
+                    scheme = submodule.quantization_scheme
+                    quantization_type_names.add(layer_type)
+
+                    match_found = False
+                    for existing_scheme in quant_scheme_to_layers:
+                        if scheme == existing_scheme:
+                            match_found = True
+                            break
+                    if not match_found:
+                        quant_scheme_to_layers.append(scheme)
+
+            if len(quant_scheme_to_layers) == 0:  # No quantized layers
+                return None
+
+            # clean up ignore list, we can leave out layers types if none of the
+            # instances are quantized
+            consolidated_ignore = []
+            for layer_type, ignore_names in ignore.items():
+                if layer_type in quantization_type_names:
+                    # specific layers of a quantized type are ignored
+                    consolidated_ignore += ignore_names
+                # else we leave it off the ignore list, doesn't fall under any of the
+                # existing quantization schemes so it won't be quantized
+
+            kv_cache_args, quant_scheme_to_layers = parse_out_kv_cache_args(
+                quant_scheme_to_layers
+            )
+            kv_cache_scheme = (
+                kv_cache_args.model_dump()
+                if kv_cache_args is not None
+                else kv_cache_args
+            )
+
+            config_groups = {}
+            for idx, scheme in enumerate(quant_scheme_to_layers):
+                group_name = "group_" + str(idx)
+                config_groups[group_name] = scheme
+
+            # TODO: this is incorrect in compressed mode, since we are overwriting the
+            # original weight we lose the uncompressed bit_depth indo
+            compression_ratio = calculate_compression_ratio(model)
+
+            if format is None:
+                if quantization_status == QuantizationStatus.COMPRESSED:
+                    format = CompressionFormat.int_quantized.value
+                else:
+                    format = CompressionFormat.dense.value
+
+            return QuantizationConfig(
+                config_groups=config_groups,
+                quantization_status=quantization_status,
+                kv_cache_scheme=kv_cache_scheme,
+                global_compression_ratio=compression_ratio,
+                format=format,
+                ignore=consolidated_ignore,
+            )
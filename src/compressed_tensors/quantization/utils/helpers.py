@@ -13,24 +13,40 @@
 # limitations under the License.
 
 import logging
+import math
 import re
-from typing import List, Optional, Tuple
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 
 import torch
+from compressed_tensors.config import CompressionFormat
 from compressed_tensors.quantization.observers.base import Observer
 from compressed_tensors.quantization.quant_args import QuantizationArgs
 from compressed_tensors.quantization.quant_scheme import QuantizationScheme
+from pydantic import BaseModel
 from torch.nn import Module
 from tqdm import tqdm
 
 
+if TYPE_CHECKING:
+    from compressed_tensors.quantization.quant_config import QuantizationStatus
+
+
 __all__ = [
     "infer_quantization_status",
+    "get_quantization_status_table",
+    "record_quantized_modules",
     "is_module_quantized",
     "is_model_quantized",
     "iter_named_leaf_modules",
+    "leaf_module_index",
     "module_type",
     "calculate_compression_ratio",
+    "calculate_compression_stats",
+    "LayerCompressionStats",
+    "CompressionStats",
     "get_torch_bit_depth",
     "can_quantize",
     "parse_out_kv_cache_args",
@@ -41,6 +57,18 @@ __all__ = [
 KV_CACHE_TARGETS = ["re:.*k_proj", "re:.*v_proj"]
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
+# leaf modules of the models inside a leaf_module_index context by model id, with
+# the number of contexts entered for each model. Indexes only live for the duration
+# of the outermost context, so modules registered, replaced or deleted in between
+# are always seen
+_LEAF_MODULE_INDEXES: Dict[int, Tuple[int, Optional[List[Tuple[str, Module]]]]] = {}
+_LEAF_MODULE_INDEX_LOCK = threading.Lock()
+
+# weak references to the quantized modules of each model by name, recorded when the
+# quantization lifecycle is applied so their statuses can be read without scanning
+# the model
+_QUANTIZED_MODULE_TABLES = weakref.WeakKeyDictionary()
+
 
 def infer_quantization_status(model: Module) -> Optional["QuantizationStatus"]:  # noqa
     """
@@ -50,6 +78,15 @@ def infer_quantization_status(model: Module) -> Optional["QuantizationStatus"]:
     :param model: model to check quantization status for
     :return: quantization status if the model is quantized, otherwise None
     """
+    # recorded modules are validated lazily, stopping at the first one still in
+    # the model, and the model is scanned if none of them are
+    module_refs = _QUANTIZED_MODULE_TABLES.get(model, {})
+    for name, module_ref in module_refs.items():
+        module = module_ref()
+        status = getattr(module, "quantization_status", None)
+        if status is not None and _get_submodule(model, name) is module:
+            return status
+
     for module in model.modules():
         status = getattr(module, "quantization_status", None)
         if status is not None:
@@ -57,6 +94,66 @@ def infer_quantization_status(model: Module) -> Optional["QuantizationStatus"]:
     return None
 
 
+def get_quantization_status_table(
+    model: Module,
+) -> Optional[Dict[str, "QuantizationStatus"]]:
+    """
+    Reads the quantization status of each quantized module of a model from the
+    modules recorded when the quantization lifecycle was last applied to it. The
+    recorded modules are dropped once any of them has been deleted or replaced in
+    the model, until the lifecycle or a config is applied to the model again
+
+    :param model: model to get the quantization statuses of
+    :return: quantization status of each quantized module by name, None if no
+        quantized modules are recorded for the model
+    """
+    quantized_modules = _get_recorded_quantized_modules(model)
+    if quantized_modules is None:
+        return None
+
+    return {
+        name: getattr(module, "quantization_status", None)
+        for name, module in quantized_modules.items()
+    }
+
+
+def record_quantized_modules(model: Module, quantized_modules: Dict[str, Module]):
+    """
+    Records the quantized modules of a model, see `get_quantization_status_table`
+
+    :param model: model the modules belong to
+    :param quantized_modules: modules with a quantization scheme by name, in the
+        order of `model.named_modules()`
+    """
+    _QUANTIZED_MODULE_TABLES[model] = {
+        name: weakref.ref(module) for name, module in quantized_modules.items()
+    }
+
+
+def _get_recorded_quantized_modules(model: Module) -> Optional[Dict[str, Module]]:
+    module_refs = _QUANTIZED_MODULE_TABLES.get(model)
+    if module_refs is None:
+        return None
+
+    # every recorded module must still be the submodule of the model at its name
+    quantized_modules = {}
+    for name, module_ref in module_refs.items():
+        module = module_ref()
+        if module is None or _get_submodule(model, name) is not module:
+            del _QUANTIZED_MODULE_TABLES[model]
+            return None
+        quantized_modules[name] = module
+
+    return quantized_modules
+
+
+def _get_submodule(model: Module, name: str) -> Optional[Module]:
+    try:
+        return model.get_submodule(name)
+    except AttributeError:
+        return None
+
+
 def is_module_quantized(module: Module) -> bool:
     """
     Check if a module is quantized, based on the existence of a non-empty quantization
@@ -106,26 +203,60 @@ def module_type(module: Module) -> str:
     return type(module).__name__
 
 
-def iter_named_leaf_modules(model: Module) -> Tuple[str, Module]:
+def iter_named_leaf_modules(model: Module) -> Iterator[Tuple[str, Module]]:
     """
     Yields modules that do not have any submodules except observers. The observers
     themselves are not yielded
 
+    Within a `leaf_module_index` context of the model, the leaf modules are found
+    once and reused by every call
+
     :param model: model to get leaf modules of
     :returns: generator tuple of (name, leaf_submodule)
     """
+    key = id(model)
+    with _LEAF_MODULE_INDEX_LOCK:
+        depth, leaf_modules = _LEAF_MODULE_INDEXES.get(key, (0, None))
+        if depth > 0 and leaf_modules is None:
+            leaf_modules = _find_named_leaf_modules(model)
+            _LEAF_MODULE_INDEXES[key] = (depth, leaf_modules)
+
+    if leaf_modules is None:
+        leaf_modules = _find_named_leaf_modules(model)
+    yield from leaf_modules
+
+
+@contextmanager
+def leaf_module_index(model: Module):
+    """
+    Indexes the leaf modules of a model for the duration of the context, so the
+    calls to `iter_named_leaf_modules` made by a single operation walk the model
+    only once. Contexts may be nested, the index is dropped when the outermost one
+    exits. Submodules must not be added, replaced or deleted within the context
+
+    :param model: model to index the leaf modules of
+    """
+    key = id(model)
+    with _LEAF_MODULE_INDEX_LOCK:
+        depth, leaf_modules = _LEAF_MODULE_INDEXES.get(key, (0, None))
+        _LEAF_MODULE_INDEXES[key] = (depth + 1, leaf_modules)
+    try:
+        yield
+    finally:
+        with _LEAF_MODULE_INDEX_LOCK:
+            depth, leaf_modules = _LEAF_MODULE_INDEXES.pop(key)
+            if depth > 1:
+                _LEAF_MODULE_INDEXES[key] = (depth - 1, leaf_modules)
+
+
+def _find_named_leaf_modules(model: Module) -> List[Tuple[str, Module]]:
+    leaf_modules = []
     for name, submodule in model.named_modules():
-        children = list(submodule.children())
-        if len(children) == 0 and not isinstance(submodule, Observer):
-            yield name, submodule
-        else:
-            has_non_observer_children = False
-            for child in children:
-                if not isinstance(child, Observer):
-                    has_non_observer_children = True
+        if not any(not isinstance(child, Observer) for child in submodule.children()):
+            if not isinstance(submodule, Observer):
+                leaf_modules.append((name, submodule))
 
-            if not has_non_observer_children:
-                yield name, submodule
+    return leaf_modules
 
 
 def get_torch_bit_depth(value: torch.Tensor) -> int:
@@ -163,6 +294,51 @@ def can_quantize(value: torch.Tensor, quant_args: "QuantizationArgs") -> bool:
     return bit_depth > quant_args.num_bits
 
 
+class LayerCompressionStats(BaseModel):
+    """
+    Storage size of the parameters of a single module
+
+    :param name: name of the module
+    :param num_weights: number of elements of the module parameters, excluding
+        quantization parameters
+    :param original_bytes: size of the parameters before compression
+    :param compressed_bytes: size of the parameters after compression, including
+        packing padding, quantization parameters and sparsity metadata
+    :param qparam_bytes: size of the scales, zero points and group indices
+    :param sparsity_metadata_bytes: size of the sparsity bitmasks and row offsets
+    :param bits_per_weight: effective number of bits stored per weight
+    """
+
+    name: str
+    num_weights: int
+    original_bytes: float
+    compressed_bytes: float
+    qparam_bytes: float
+    sparsity_metadata_bytes: float
+    bits_per_weight: float
+
+
+class CompressionStats(BaseModel):
+    """
+    Storage size of the parameters of a model, per layer and in total
+
+    :param layers: stats of each leaf module with parameters
+    :param num_weights: number of elements of all parameters, excluding
+        quantization parameters
+    :param original_bytes: size of all parameters before compression
+    :param compressed_bytes: size of all parameters after compression
+    :param compression_ratio: original size divided by compressed size
+    :param bits_per_weight: effective number of bits stored per weight
+    """
+
+    layers: List[LayerCompressionStats]
+    num_weights: int
+    original_bytes: float
+    compressed_bytes: float
+    compression_ratio: float
+    bits_per_weight: float
+
+
 def calculate_compression_ratio(model: Module) -> float:
     """
     Calculates the quantization compression ratio of a pytorch model, based on the
@@ -172,23 +348,158 @@ def calculate_compression_ratio(model: Module) -> float:
     :param model: pytorch module to calculate compression ratio for
     :return: compression ratio of the whole model
     """
-    total_compressed = 0.0
-    total_uncompressed = 0.0
+    return calculate_compression_stats(model).compression_ratio
+
+
+def calculate_compression_stats(
+    model: Module,
+    quantization_format: Optional[str] = None,
+    sparsity_format: Optional[str] = None,
+) -> CompressionStats:
+    """
+    Calculates the storage size of every leaf module of a model before and after
+    compression in a single pass over its parameters. Shared parameters are counted
+    once
+
+    :param model: pytorch module to calculate compression stats for
+    :param quantization_format: format quantized weights are stored in, determines
+        packing overhead. If None, quantized weights take exactly num_bits each. If
+        marlin-24, weights are assumed to be 2:4 sparse
+    :param sparsity_format: format sparse weights are stored in, if sparse-bitmask
+        the non-zero values are stored along with a bitmask and row offsets
+    :return: per layer and total compression stats, a model without parameters has
+        a compression ratio of 1.0 and 0.0 bits per weight
+    """
+    layers = []
+    seen_parameters = set()
     for name, submodule in tqdm(
         iter_named_leaf_modules(model),
-        desc="Calculating quantization compression ratio",
+        desc="Calculating compression stats",
     ):
-        for parameter in model.parameters():
-            uncompressed_bits = get_torch_bit_depth(parameter)
-            compressed_bits = uncompressed_bits
-            if is_module_quantized(submodule):
-                compressed_bits = submodule.quantization_scheme.weights.num_bits
-
-            num_weights = parameter.numel()
-            total_compressed += compressed_bits * num_weights
-            total_uncompressed += uncompressed_bits * num_weights
-
-    return total_uncompressed / total_compressed
+        layer_stats = _calculate_layer_compression_stats(
+            name, submodule, quantization_format, sparsity_format, seen_parameters
+        )
+        if layer_stats is not None:
+            layers.append(layer_stats)
+
+    num_weights = sum(layer.num_weights for layer in layers)
+    original_bytes = sum(layer.original_bytes for layer in layers)
+    compressed_bytes = sum(layer.compressed_bytes for layer in layers)
+
+    # models without parameters are left uncompressed
+    compression_ratio = 1.0
+    bits_per_weight = 0.0
+    if compressed_bytes:
+        compression_ratio = original_bytes / compressed_bytes
+        bits_per_weight = 8 * compressed_bytes / num_weights
+    return CompressionStats(
+        layers=layers,
+        num_weights=num_weights,
+        original_bytes=original_bytes,
+        compressed_bytes=compressed_bytes,
+        compression_ratio=compression_ratio,
+        bits_per_weight=bits_per_weight,
+    )
+
+
+_QPARAM_SUFFIXES = ("_scale", "_zero_point", "_g_idx")
+# formats storing each quantized value in its own byte
+_BYTE_QUANTIZED_FORMATS = (
+    CompressionFormat.naive_quantized.value,
+    CompressionFormat.int_quantized.value,
+    CompressionFormat.float_quantized.value,
+)
+# formats packing quantized values of each row into int32s
+_INT32_PACKED_FORMATS = (
+    CompressionFormat.pack_quantized.value,
+    CompressionFormat.marlin.value,
+)
+
+
+def _calculate_layer_compression_stats(
+    name: str,
+    module: Module,
+    quantization_format: Optional[str],
+    sparsity_format: Optional[str],
+    seen_parameters: set,
+) -> Optional[LayerCompressionStats]:
+    weight_args = None
+    if is_module_quantized(module):
+        weight_args = module.quantization_scheme.weights
+
+    num_weights = 0
+    original_bits = 0
+    compressed_bits = 0
+    qparam_bits = 0
+    sparsity_metadata_bits = 0
+    for param_name, parameter in module.named_parameters(recurse=False):
+        if id(parameter) in seen_parameters:
+            continue
+        seen_parameters.add(id(parameter))
+
+        bit_depth = get_torch_bit_depth(parameter)
+        if param_name.endswith(_QPARAM_SUFFIXES):
+            if quantization_format == CompressionFormat.marlin_24.value:
+                # only weight scales are stored, as float16
+                if param_name == "weight_scale":
+                    qparam_bits += 16 * parameter.numel()
+                continue
+            qparam_bits += bit_depth * parameter.numel()
+            continue
+
+        num_weights += parameter.numel()
+        if param_name != "weight":
+            original_bits += bit_depth * parameter.numel()
+            compressed_bits += bit_depth * parameter.numel()
+            continue
+
+        value_bits = bit_depth
+        if weight_args is not None:
+            scale = getattr(module, "weight_scale", None)
+            if not parameter.is_floating_point() and scale is not None:
+                # weight is already compressed, scales keep the original dtype
+                bit_depth = get_torch_bit_depth(scale)
+            value_bits = weight_args.num_bits
+            if quantization_format in _BYTE_QUANTIZED_FORMATS:
+                value_bits = 8
+        original_bits += bit_depth * parameter.numel()
+
+        if (
+            weight_args is not None
+            and quantization_format == CompressionFormat.marlin_24.value
+        ):
+            # matches the layout of Marlin24Compressor, the half of the values kept
+            # by the 2:4 sparsity are packed into int32s and every 16 weights have
+            # 16 bits of metadata locating their kept values
+            pack_factor = 32 // weight_args.num_bits
+            compressed_bits += 32 * math.ceil(parameter.numel() / 2 / pack_factor)
+            sparsity_metadata_bits += 16 * math.ceil(parameter.numel() / 16)
+        elif sparsity_format == CompressionFormat.sparse_bitmask.value:
+            # matches the layout of BitmaskTensor
+            num_rows, num_columns = parameter.reshape(-1, parameter.shape[-1]).shape
+            compressed_bits += value_bits * torch.count_nonzero(parameter).item()
+            sparsity_metadata_bits += 8 * num_rows * math.ceil(num_columns / 8)
+            sparsity_metadata_bits += 64 * num_rows
+        elif weight_args is not None and quantization_format in _INT32_PACKED_FORMATS:
+            pack_factor = 32 // weight_args.num_bits
+            num_rows, num_columns = parameter.reshape(-1, parameter.shape[-1]).shape
+            compressed_bits += 32 * num_rows * math.ceil(num_columns / pack_factor)
+        else:
+            compressed_bits += value_bits * parameter.numel()
+
+    if num_weights == 0:
+        return None
+
+    compressed_bits += qparam_bits + sparsity_metadata_bits
+    return LayerCompressionStats(
+        name=name,
+        num_weights=num_weights,
+        original_bytes=original_bits / 8,
+        compressed_bytes=compressed_bits / 8,
+        qparam_bytes=qparam_bits / 8,
+        sparsity_metadata_bytes=sparsity_metadata_bits / 8,
+        bits_per_weight=compressed_bits / num_weights,
+    )
 
 
 def is_kv_cache_quant_scheme(scheme: QuantizationScheme) -> bool:
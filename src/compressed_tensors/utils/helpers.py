@@ -14,10 +14,17 @@
 
 from typing import Optional
 
+import torch
+from torch.nn import Module, Parameter
 from transformers import AutoConfig
 
 
-__all__ = ["infer_compressor_from_model_config", "fix_fsdp_module_name"]
+__all__ = [
+    "infer_compressor_from_model_config",
+    "fix_fsdp_module_name",
+    "is_torch_compiling",
+    "update_parameter_data",
+]
 
 FSDP_WRAPPER_NAME = "_fsdp_wrapped_module"
 
@@ -60,3 +67,39 @@ def fix_fsdp_module_name(name: str) -> str:
     return name.replace(FSDP_WRAPPER_NAME + ".", "").replace(
         "." + FSDP_WRAPPER_NAME, ""
     )
+
+
+def is_torch_compiling() -> bool:
+    """
+    :return: True if called while torch.compile or torch.export is tracing,
+        False otherwise or if the installed torch version has no compiler
+    """
+    compiler = getattr(torch, "compiler", None)
+    if compiler is not None and hasattr(compiler, "is_compiling"):
+        return compiler.is_compiling()
+    return False
+
+
+def update_parameter_data(module: Module, name: str, value: torch.Tensor):
+    """
+    Loads value into a parameter of a module, converting it to the dtype and device
+    of the parameter. Parameters on the meta device have no storage to load into,
+    so they are materialized as a new parameter on the device of value. Values
+    cached from the parameter, such as quantized weights, are not invalidated here
+    and must be cleared by the caller
+
+    :param module: module owning the parameter
+    :param name: name of the parameter in the module
+    :param value: data to load into the parameter
+    """
+    param = getattr(module, name)
+    if param.is_meta:
+        new_param = Parameter(
+            value.to(dtype=param.dtype), requires_grad=param.requires_grad
+        )
+        module.register_parameter(name, new_param)
+    elif param.shape == value.shape:
+        # copy in place, converting device and dtype in a single transfer
+        param.data.copy_(value)
+    else:
+        param.data = value.to(device=param.device, dtype=param.dtype)
@@ -16,6 +16,7 @@ import json
 import os
 import re
 import struct
+from contextlib import ExitStack
 from typing import Dict, List, Optional
 
 from safetensors import safe_open
@@ -32,6 +33,7 @@ __all__ = [
     "get_nested_weight_mappings",
     "get_quantization_state_dict",
     "is_quantization_param",
+    "LazyStateDict",
 ]
 
 
@@ -223,6 +225,58 @@ def get_quantization_state_dict(model_path: str) -> Dict[str, Tensor]:
     return state_dict
 
 
+class LazyStateDict:
+    """
+    Read-only view of a state dict saved in safetensors format. Tensors are only read
+    when accessed, and each safetensors file is opened once and kept open until the
+    state dict is closed
+
+    :param model_path: path to safetensors state dict, must contain either a single
+        safetensors file or multiple files with an index
+    :param device: device to read tensors to
+    """
+
+    def __init__(self, model_path: str, device: str = "cpu"):
+        self.weight_mappings = get_weight_mappings(model_path)
+        self.device = device
+        self._handles = {}
+        self._exit_stack = ExitStack()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.weight_mappings
+
+    def get(self, name: str, default: Optional[Tensor] = None) -> Optional[Tensor]:
+        """
+        :param name: name of the tensor to read
+        :param default: value to return if the tensor is not in the state dict
+        :return: tensor read from its safetensors file, or default
+        """
+        safe_path = self.weight_mappings.get(name)
+        if safe_path is None:
+            return default
+
+        handle = self._handles.get(safe_path)
+        if handle is None:
+            handle = self._exit_stack.enter_context(
+                safe_open(safe_path, framework="pt", device=self.device)
+            )
+            self._handles[safe_path] = handle
+        return handle.get_tensor(name)
+
+    def close(self):
+        """
+        Closes all opened safetensors files
+        """
+        self._handles = {}
+        self._exit_stack.close()
+
+    def __enter__(self) -> "LazyStateDict":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 def is_quantization_param(name: str) -> bool:
     """
     Checks is a parameter name is associated with a quantization parameter
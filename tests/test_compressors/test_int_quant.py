@@ -154,3 +154,34 @@ def test_reload_match(strategy, group_size, sc, zp, tmp_path):
     )
 
     shutil.rmtree(tmp_path)
+
+
+def test_block_reload_match(tmp_path):
+    weights = QuantizationArgs(strategy="block", block_structure="128x128")
+    dense = torch.rand((300, 1024))
+    scale, zero_point = weights.get_observer()(dense)
+    dense_state_dict = {
+        "dummy.weight": dense,
+        "dummy.weight_scale": scale,
+        "dummy.weight_zero_point": zero_point,
+    }
+    quant_config = QuantizationConfig(
+        config_groups={
+            "group_1": QuantizationScheme(targets=["Linear"], weights=weights)
+        },
+    )
+
+    compressor = IntQuantizationCompressor(config=quant_config)
+    quantized_modules_to_args = {"dummy": weights}
+    compressed_state_dict = compressor.compress(
+        dense_state_dict, names_to_scheme=quantized_modules_to_args
+    )
+    assert compressed_state_dict["dummy.weight"].dtype == torch.int8
+
+    save_file(compressed_state_dict, tmp_path / "model.safetensors")
+    reconstructed_dense = dict(
+        compressor.decompress(tmp_path, names_to_scheme=quantized_modules_to_args)
+    )
+
+    fake_quant_dummy = fake_quantize(dense, scale, zero_point, args=weights)
+    assert torch.equal(fake_quant_dummy, reconstructed_dense["dummy.weight"])
@@ -0,0 +1,173 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+
+import pytest
+import torch
+from compressed_tensors.compressors import (
+    Compressor,
+    MarlinCompressor,
+    map_modules_to_quant_args,
+)
+from compressed_tensors.compressors.marlin import (
+    pack_scales_marlin,
+    pack_weight_marlin,
+    unpack_scales_marlin,
+    unpack_weight_marlin,
+)
+from compressed_tensors.config import CompressionFormat
+from compressed_tensors.quantization import (
+    QuantizationArgs,
+    QuantizationConfig,
+    QuantizationScheme,
+    QuantizationStatus,
+    QuantizationStrategy,
+    apply_quantization_config,
+    apply_quantization_status,
+)
+from compressed_tensors.quantization.lifecycle.forward import fake_quantize
+from compressed_tensors.utils import merge_names
+from safetensors.torch import save_file
+from torch.nn.modules import Linear, Sequential
+
+
+def get_marlin_quant_config(num_bits, strategy, ignore):
+    gs = 128 if strategy is QuantizationStrategy.GROUP else None
+    weights = QuantizationArgs(num_bits=num_bits, strategy=strategy, group_size=gs)
+    scheme = QuantizationScheme(weights=weights, targets=["Linear"])
+    config = QuantizationConfig(config_groups={"group_0": scheme}, ignore=ignore)
+    return config
+
+
+def test_marlin_registered():
+    config_name = CompressionFormat.marlin.value
+    compressor = Compressor.load_from_registry(config_name)
+    assert isinstance(compressor, MarlinCompressor)
+
+
+def test_marlin_validate_quant_compatability():
+    MarlinCompressor.validate_quant_compatability(
+        {"layer": QuantizationArgs(num_bits=4, group_size=64)}
+    )
+    with pytest.raises(ValueError):
+        MarlinCompressor.validate_quant_compatability(
+            {"layer": QuantizationArgs(num_bits=4, group_size=100)}
+        )
+    with pytest.raises(ValueError):
+        MarlinCompressor.validate_quant_compatability(
+            {"layer": QuantizationArgs(num_bits=4, symmetric=False, group_size=128)}
+        )
+
+
+@pytest.mark.parametrize("weight_shape", [(96, 128), (128, 72)])
+def test_marlin_validate_weight_shape(weight_shape):
+    model_quant_args = {"layer": QuantizationArgs(num_bits=4, group_size=64)}
+    MarlinCompressor.validate_quant_compatability(
+        model_quant_args, {"layer": (128, 128)}
+    )
+    with pytest.raises(ValueError, match="in layer"):
+        MarlinCompressor.validate_quant_compatability(
+            model_quant_args, {"layer": weight_shape}
+        )
+
+
+def test_marlin_compress_rejects_weight_shape():
+    args = QuantizationArgs(num_bits=4, strategy="channel")
+    model_state = {
+        "layer.weight": torch.randn(96, 128),
+        "layer.weight_scale": torch.ones(96, 1),
+    }
+    compressor = MarlinCompressor()
+    with pytest.raises(ValueError, match="in layer"):
+        compressor.compress(model_state, names_to_scheme={"layer": args})
+
+
+@pytest.mark.parametrize("num_bits", [4, 8])
+@pytest.mark.parametrize("group_size", [None, 128, 1024])
+def test_marlin_repack(num_bits, group_size):
+    size_k, size_n = 1024, 256
+    args = QuantizationArgs(
+        num_bits=num_bits,
+        strategy="group" if group_size else "channel",
+        group_size=group_size,
+    )
+    weight = torch.randint(0, 1 << num_bits, (size_k, size_n), dtype=torch.int32)
+    num_groups = size_k // group_size if group_size else 1
+    scales = torch.rand((num_groups, size_n), dtype=torch.float16)
+
+    packed = pack_weight_marlin(weight, args)
+    assert packed.dtype == torch.int32
+    assert packed.shape == (size_k // 16, size_n * 16 // (32 // num_bits))
+    unpacked = unpack_weight_marlin(packed, args, (size_k, size_n))
+    assert torch.equal(weight, unpacked)
+
+    packed_scales = pack_scales_marlin(scales, args, (size_k, size_n))
+    assert packed_scales.shape == scales.shape
+    unpacked_scales = unpack_scales_marlin(packed_scales, args, (size_k, size_n))
+    assert torch.equal(scales, unpacked_scales)
+
+
+@pytest.mark.parametrize("num_bits", [4, 8])
+@pytest.mark.parametrize(
+    "strategy", [QuantizationStrategy.GROUP, QuantizationStrategy.CHANNEL]
+)
+@pytest.mark.parametrize("layer_shape", [(512, 128), (1024, 1024), (4096, 2048)])
+def test_marlin_reload_match(tmp_path, num_bits, strategy, layer_shape):
+    QUANT_NAME = "quant"
+    NOT_QUANT_NAME = "not_quant"
+    model = Sequential(
+        OrderedDict(
+            [
+                (QUANT_NAME, Linear(layer_shape[0], layer_shape[1], bias=False)),
+                (NOT_QUANT_NAME, Linear(layer_shape[1], 64, bias=False)),
+            ]
+        )
+    )
+    config = get_marlin_quant_config(num_bits, strategy, ignore=[NOT_QUANT_NAME])
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    _ = model(torch.rand((64, layer_shape[0])))
+
+    state_dict = model.state_dict()
+    model_to_quant_args = map_modules_to_quant_args(model)
+    compressor = MarlinCompressor()
+    compressed_state_dict = compressor.compress(state_dict, model_to_quant_args)
+
+    assert len(compressed_state_dict) == 3
+    assert torch.equal(
+        state_dict[f"{NOT_QUANT_NAME}.weight"],
+        compressed_state_dict[f"{NOT_QUANT_NAME}.weight"],
+    )
+    for param_name in compressor.COMPRESSION_PARAM_NAMES:
+        full_param_name = merge_names(QUANT_NAME, param_name)
+        assert full_param_name in compressed_state_dict
+
+    save_file(compressed_state_dict, tmp_path / "model.safetensors")
+    reconstructed_dense = dict(
+        compressor.decompress(tmp_path, names_to_scheme=model_to_quant_args)
+    )
+
+    # compression runs in float16, so compare against a float16 fake quantization
+    expected = fake_quantize(
+        state_dict[f"{QUANT_NAME}.weight"].to(torch.float16),
+        scale=state_dict[f"{QUANT_NAME}.weight_scale"].to(torch.float16),
+        zero_point=state_dict[f"{QUANT_NAME}.weight_zero_point"],
+        args=model_to_quant_args[QUANT_NAME],
+    )
+    assert torch.equal(expected, reconstructed_dense[f"{QUANT_NAME}.weight"])
+    assert torch.equal(
+        state_dict[f"{QUANT_NAME}.weight_scale"].to(torch.float16),
+        reconstructed_dense[f"{QUANT_NAME}.weight_scale"],
+    )
@@ -21,7 +21,10 @@ from compressed_tensors.compressors import (
     Marlin24Compressor,
     map_modules_to_quant_args,
 )
-from compressed_tensors.compressors.utils import mask_creator
+from compressed_tensors.compressors.utils import get_permutations_24, mask_creator
+from compressed_tensors.compressors.utils.semi_structured_conversions import (
+    _calculate_meta_reordering_scatter_offsets,
+)
 from compressed_tensors.config import CompressionFormat
 from compressed_tensors.quantization import (
     QuantizationArgs,
@@ -32,7 +35,9 @@ from compressed_tensors.quantization import (
     apply_quantization_config,
     apply_quantization_status,
 )
+from compressed_tensors.quantization.lifecycle.forward import fake_quantize
 from compressed_tensors.utils import merge_names
+from safetensors.torch import save_file
 from torch.nn.modules import Linear, Sequential
 
 
@@ -44,6 +49,21 @@ def get_2_4_quant_config(num_bits, strategy, ignore):
     return config
 
 
+def test_marlin24_index_caching():
+    assert get_permutations_24(4) is get_permutations_24(4)
+    assert get_permutations_24(4) is not get_permutations_24(8)
+
+    offsets = _calculate_meta_reordering_scatter_offsets(
+        128, 16, torch.int16, torch.device("cpu")
+    )
+    assert offsets is _calculate_meta_reordering_scatter_offsets(
+        128, 16, torch.int16, torch.device("cpu")
+    )
+    assert offsets is not _calculate_meta_reordering_scatter_offsets(
+        256, 16, torch.int16, torch.device("cpu")
+    )
+
+
 def test_marlin_registered():
     config_name = CompressionFormat.marlin_24.value
     compressor = Compressor.load_from_registry(config_name)
@@ -104,3 +124,54 @@ def test_marlin24_format(num_bits, strategy, layer_shape):
     for param_name in compressor.COMPRESSION_PARAM_NAMES:
         full_param_name = merge_names(QUANT_NAME, param_name)
         assert full_param_name in compressed_state_dict
+
+
+@pytest.mark.parametrize("num_bits", [4, 8])
+@pytest.mark.parametrize(
+    "strategy", [QuantizationStrategy.GROUP, QuantizationStrategy.CHANNEL]
+)
+@pytest.mark.parametrize("layer_shape", [(512, 128), (1024, 1024), (4096, 2048)])
+def test_marlin24_reload_match(tmp_path, num_bits, strategy, layer_shape):
+    QUANT_NAME = "quant"
+    NOT_QUANT_NAME = "not_quant"
+    model = Sequential(
+        OrderedDict(
+            [
+                (QUANT_NAME, Linear(layer_shape[0], layer_shape[1], bias=False)),
+                (NOT_QUANT_NAME, Linear(layer_shape[1], 64, bias=False)),
+            ]
+        )
+    )
+    config = get_2_4_quant_config(num_bits, strategy, ignore=[NOT_QUANT_NAME])
+    mask = mask_creator(model.quant.weight.data).bool()
+    model.quant.weight.data *= mask
+
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    _ = model(torch.rand((64, layer_shape[0])))
+
+    state_dict = model.state_dict()
+    model_to_quant_args = map_modules_to_quant_args(model)
+    compressor = Marlin24Compressor()
+    compressed_state_dict = compressor.compress(state_dict, model_to_quant_args)
+    save_file(compressed_state_dict, tmp_path / "model.safetensors")
+
+    reconstructed_dense = dict(
+        compressor.decompress(tmp_path, names_to_scheme=model_to_quant_args)
+    )
+    assert len(reconstructed_dense) == 2
+
+    # compression runs in float16, so compare against a float16 fake quantization
+    expected = fake_quantize(
+        state_dict[f"{QUANT_NAME}.weight"].to(torch.float16),
+        scale=state_dict[f"{QUANT_NAME}.weight_scale"].to(torch.float16),
+        zero_point=state_dict[f"{QUANT_NAME}.weight_zero_point"],
+        args=model_to_quant_args[QUANT_NAME],
+    )
+    decompressed = reconstructed_dense[f"{QUANT_NAME}.weight"]
+    assert decompressed.shape == expected.shape
+    assert torch.equal(expected, decompressed)
+    assert torch.equal(
+        state_dict[f"{QUANT_NAME}.weight_scale"].to(torch.float16),
+        reconstructed_dense[f"{QUANT_NAME}.weight_scale"],
+    )
@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import inspect
 from copy import deepcopy
 
 import pytest
+import torch
+from compressed_tensors.compressors import Compressor
 from compressed_tensors.compressors.model_compressor import ModelCompressor
 
 
@@ -66,3 +69,26 @@ def test_config_format(s_config, q_config):
     combined_config = _get_combined_config(s_config, q_config)
     assert ModelCompressor.parse_sparsity_config(combined_config) == s_config
     assert ModelCompressor.parse_quantization_config(combined_config) == q_config
+
+
+def test_replace_weights_top_level_parameter():
+    model = torch.nn.Linear(4, 4)
+    weight = torch.ones(4, 4)
+    bias = torch.zeros(4)
+    compressor = ModelCompressor()
+    compressor._replace_weights(iter([("weight", weight), ("bias", bias)]), model)
+    assert torch.equal(model.weight, weight)
+    assert torch.equal(model.bias, bias)
+
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    compressor._replace_weights(iter([("0.weight", weight)]), model)
+    assert torch.equal(model[0].weight, weight)
+
+
+@pytest.mark.parametrize(
+    "format", ["naive-quantized", "pack-quantized", "marlin", "marlin-24"]
+)
+def test_quantization_compressors_decompress_signature(format):
+    compressor = Compressor.load_from_registry(format)
+    parameters = list(inspect.signature(compressor.decompress).parameters)
+    assert parameters[:3] == ["path_to_model_or_tensors", "device", "names_to_scheme"]
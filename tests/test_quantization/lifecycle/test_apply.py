@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
 import re
+import weakref
 from typing import Optional
 
+import pytest
 import torch
 from compressed_tensors.config import CompressionFormat
 from compressed_tensors.quantization import (
@@ -24,10 +27,27 @@ from compressed_tensors.quantization import (
     freeze_module_quantization,
 )
 from compressed_tensors.quantization.lifecycle import (
+    ResolvedQuantizationConfig,
     apply_quantization_config,
     apply_quantization_status,
+    find_name_or_class_matches,
+    load_pretrained_quantization,
+    resolve_quantization_config,
 )
-from compressed_tensors.quantization.utils import iter_named_leaf_modules
+from compressed_tensors.quantization.lifecycle.apply import _TargetMatcher
+from compressed_tensors.quantization.lifecycle.forward import (
+    fake_quantize,
+    update_module_forward_quantized,
+)
+from compressed_tensors.quantization.utils import (
+    get_quantization_status_table,
+    helpers,
+    infer_quantization_status,
+    iter_named_leaf_modules,
+    record_quantized_modules,
+)
+from safetensors.torch import save_file
+from torch.nn import Conv2d, Linear
 from transformers import AutoModelForCausalLM
 
 
@@ -223,3 +243,360 @@ def get_sample_tinyllama_quant_config(status: str = "frozen"):
         "ignore": ["LlamaRotaryEmbedding", "model.layers.1.mlp.down_proj"],
     }
     return QuantizationConfig.parse_obj(config_dict)
+
+
+@pytest.mark.parametrize("check_contains", [True, False])
+@pytest.mark.parametrize(
+    "targets",
+    [
+        [],
+        ["Linear", "re:.*down_proj", "model.layers.0.mlp.down_proj"],
+        ["re:.*proj$", "re:.*layers.0.*", "linear", "re:(a)\\1", "Conv"],
+        ["re:model.*", "re:.*", "Linear", "Linear", "re:lm_head|.*q_proj"],
+    ],
+)
+def test_target_matcher(targets, check_contains):
+    matcher = _TargetMatcher(targets, check_contains=check_contains)
+    names = [
+        "model.layers.0.mlp.down_proj",
+        "model.layers.1.mlp.down_proj",
+        "model.layers.0.self_attn.q_proj",
+        "lm_head",
+        "Linear",
+    ]
+    for name in names:
+        for module in (Linear(1, 1), Conv2d(1, 1, 1)):
+            expected = find_name_or_class_matches(
+                name, module, targets, check_contains=check_contains
+            )
+            assert matcher.find_matches(name, module) == expected
+
+
+def test_resolved_quantization_config(tmp_path):
+    model = torch.nn.Sequential(
+        torch.nn.Linear(8, 16), torch.nn.ReLU(), torch.nn.Linear(16, 8)
+    )
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "ignore": ["2"],
+            "quantization_status": "frozen",
+        }
+    )
+
+    resolved = resolve_quantization_config(model, config)
+    assert resolved.modules == {"0": "group:group_0"}
+    assert not hasattr(model[0], "quantization_scheme")
+
+    resolved.save(tmp_path)
+    loaded = ResolvedQuantizationConfig.load(tmp_path)
+    assert loaded == resolved
+
+    names_to_scheme = apply_quantization_config(model, resolved_config=loaded)
+    assert list(names_to_scheme) == ["0"]
+    assert model[0].quantization_scheme == config.config_groups["group_0"]
+    assert model[0].quantization_status == QuantizationStatus.FROZEN
+    assert model.resolved_quantization_config is loaded
+    assert not hasattr(model[2], "quantization_scheme")
+
+    other_model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    with pytest.raises(ValueError):
+        apply_quantization_config(other_model, resolved_config=loaded)
+
+
+def test_apply_quantization_config_attaches_resolved_config(tmp_path):
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "ignore": ["1"],
+        }
+    )
+
+    # the config resolved while applying it can be saved from the same pass
+    apply_quantization_config(model, config)
+    resolved = model.resolved_quantization_config
+    assert resolved == resolve_quantization_config(model, config)
+    resolved.save(tmp_path)
+
+    other_model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    loaded = ResolvedQuantizationConfig.load(tmp_path)
+    apply_quantization_config(other_model, resolved_config=loaded)
+    assert other_model[0].quantization_scheme == model[0].quantization_scheme
+    assert not hasattr(other_model[1], "quantization_scheme")
+
+
+def test_resolved_quantization_config_scheme_ids():
+    model = torch.nn.ModuleDict({"q_proj": Linear(8, 8), "k_proj": Linear(8, 8)})
+    # the kv cache scheme is merged into the scheme of k_proj, under an id that
+    # must not collide with the config group of the same name
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "k_proj": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "kv_cache_scheme": {"num_bits": 8},
+        }
+    )
+
+    resolved = resolve_quantization_config(model, config)
+    assert resolved.modules == {"q_proj": "group:k_proj", "k_proj": "module:k_proj"}
+    assert resolved.schemes["group:k_proj"].output_activations is None
+    assert resolved.schemes["module:k_proj"].output_activations is not None
+
+    apply_quantization_config(model, resolved_config=resolved)
+    assert model["q_proj"].quantization_scheme.output_activations is None
+    assert model["k_proj"].quantization_scheme.output_activations is not None
+
+
+def test_load_pretrained_quantization(tmp_path):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 8, "strategy": "channel"},
+                    "input_activations": {"num_bits": 8, "symmetric": False},
+                    "targets": ["Linear"],
+                },
+            },
+            "quantization_status": "frozen",
+        }
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    apply_quantization_config(model, config)
+    state_dict = {
+        "0.weight_scale": torch.rand(16, 1),
+        "0.input_scale": torch.rand(1),
+        "0.input_zero_point": torch.tensor([3], dtype=torch.int8),
+        "1.weight_scale": torch.rand(8, 1, dtype=torch.float16),
+        "1.input_scale": torch.rand(1),
+    }
+    save_file(state_dict, tmp_path / "model.safetensors")
+
+    load_pretrained_quantization(model, str(tmp_path))
+    assert torch.equal(model[0].weight_scale, state_dict["0.weight_scale"])
+    assert torch.equal(model[0].input_scale, state_dict["0.input_scale"])
+    assert torch.equal(model[0].input_zero_point, state_dict["0.input_zero_point"])
+    assert model[1].weight_scale.dtype == model[1].weight.dtype
+    assert torch.allclose(model[1].weight_scale, state_dict["1.weight_scale"].float())
+    # missing zero points are zeroed
+    assert torch.all(model[0].weight_zero_point == 0)
+    assert torch.all(model[1].input_zero_point == 0)
+
+
+def test_load_pretrained_quantization_clears_quantized_weight(tmp_path):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 8, "symmetric": False},
+                    "targets": ["Linear"],
+                },
+            },
+            "quantization_status": "frozen",
+        }
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    apply_quantization_config(model, config)
+    # the large zero point clamps the quantized weight, so a stale cached weight
+    # differs from one quantized with a zeroed zero point
+    for layer in model:
+        layer.weight_scale.data.fill_(0.01)
+        layer.weight_zero_point.data.fill_(100)
+        update_module_forward_quantized(layer)
+
+    inputs = torch.randn(2, 8)
+    with torch.no_grad():
+        model(inputs)
+
+    # the checkpoint has no zero point for the first layer, it is zeroed in place
+    state_dict = {
+        "0.weight_scale": torch.tensor([0.01]),
+        "1.weight_scale": torch.tensor([0.02]),
+    }
+    save_file(state_dict, tmp_path / "model.safetensors")
+    load_pretrained_quantization(model, str(tmp_path))
+    assert torch.all(model[0].weight_zero_point == 0)
+
+    weight = fake_quantize(
+        model[0].weight,
+        model[0].weight_scale,
+        model[0].weight_zero_point,
+        config.config_groups["group_0"].weights,
+    )
+    expected = torch.nn.functional.linear(inputs, weight, model[0].bias)
+    with torch.no_grad():
+        assert torch.equal(model[0](inputs), expected)
+
+
+@pytest.mark.parametrize("format", [None, "pack-quantized", "marlin-24"])
+def test_load_pretrained_quantization_missing_scale(tmp_path, format):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 4, "strategy": "group", "group_size": 4},
+                    "input_activations": {"num_bits": 8},
+                    "targets": ["Linear"],
+                },
+            },
+            "quantization_status": "frozen",
+        }
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16))
+    apply_quantization_config(model, config)
+    save_file({"0.input_scale": torch.rand(1)}, tmp_path / "model.safetensors")
+
+    # only formats storing packed weight scales may leave them out
+    if format != "marlin-24":
+        with pytest.raises(ValueError, match="0.weight_scale"):
+            load_pretrained_quantization(model, str(tmp_path), format=format)
+    else:
+        load_pretrained_quantization(model, str(tmp_path), format=format)
+        assert torch.all(model[0].weight_zero_point == 0)
+
+    # missing input scales are never restored by a decompressor
+    save_file({"0.weight_scale": torch.rand(16, 2)}, tmp_path / "model.safetensors")
+    with pytest.raises(ValueError, match="0.input_scale"):
+        load_pretrained_quantization(model, str(tmp_path), format="marlin-24")
+
+
+def test_load_pretrained_quantization_meta_device(tmp_path):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 4, "strategy": "group", "group_size": 4},
+                    "targets": ["Linear"],
+                },
+            },
+            "quantization_status": "compressed",
+        }
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16, device="meta"))
+    apply_quantization_config(model, config)
+    assert model[0].weight_scale.is_meta
+    assert model[0].weight_zero_point.is_meta
+    assert model[0].quantization_status == QuantizationStatus.COMPRESSED
+
+    state_dict = {"0.weight_scale": torch.rand(16, 2)}
+    save_file(state_dict, tmp_path / "model.safetensors")
+
+    load_pretrained_quantization(model, str(tmp_path))
+    assert torch.equal(model[0].weight_scale, state_dict["0.weight_scale"])
+    assert model[0].weight_zero_point.device == torch.device("cpu")
+    assert model[0].weight_zero_point.shape == (16, 2)
+    assert torch.all(model[0].weight_zero_point == 0)
+    assert model[0].weight.is_meta
+
+
+@pytest.mark.parametrize("num_workers", [None, 2])
+def test_apply_quantization_status_per_module(num_workers):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "quantization_status": "initialized",
+        }
+    )
+    model = torch.nn.Sequential(
+        torch.nn.Linear(8, 16), torch.nn.ReLU(), torch.nn.Linear(16, 8)
+    )
+    apply_quantization_config(model, config)
+    assert get_quantization_status_table(model) == {
+        "0": QuantizationStatus.INITIALIZED,
+        "2": QuantizationStatus.INITIALIZED,
+    }
+
+    # modules at different statuses each follow their own path
+    apply_quantization_status(model[2], QuantizationStatus.FROZEN)
+    assert not hasattr(model[2], "weight_observer")
+
+    apply_quantization_status(model, QuantizationStatus.COMPRESSED, num_workers)
+    assert get_quantization_status_table(model) == {
+        "0": QuantizationStatus.COMPRESSED,
+        "2": QuantizationStatus.COMPRESSED,
+    }
+    assert infer_quantization_status(model) == QuantizationStatus.COMPRESSED
+    assert model[0].weight.dtype == model[2].weight.dtype == torch.int8
+    assert get_quantization_status_table(torch.nn.Linear(1, 1)) is None
+
+
+def test_quantization_status_table_membership():
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "quantization_status": "frozen",
+        }
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Linear(16, 8))
+    apply_quantization_config(model, config)
+    assert list(get_quantization_status_table(model)) == ["0", "1"]
+
+    # replacing a recorded module drops the table rather than reporting the status
+    # of a module no longer in the model
+    model[1] = torch.nn.Linear(16, 8)
+    assert get_quantization_status_table(model) is None
+    assert infer_quantization_status(model) == QuantizationStatus.FROZEN
+
+    # applying the config again records the modules of the model
+    apply_quantization_config(model, config)
+    assert get_quantization_status_table(model) == {
+        "0": QuantizationStatus.FROZEN,
+        "1": QuantizationStatus.FROZEN,
+    }
+
+    del model[1]
+    assert get_quantization_status_table(model) is None
+
+    # the table does not keep recorded modules alive
+    module = torch.nn.Linear(8, 8)
+    module_ref = weakref.ref(module)
+    record_quantized_modules(model, {"0": model[0], "1": module})
+    del module
+    gc.collect()
+    assert module_ref() is None
+    assert get_quantization_status_table(model) is None
+
+
+def test_infer_quantization_status_validates_lazily(monkeypatch):
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {"weights": {"num_bits": 8}, "targets": ["Linear"]},
+            },
+            "quantization_status": "frozen",
+        }
+    )
+    model = torch.nn.Sequential(*(torch.nn.Linear(8, 8) for _ in range(4)))
+    apply_quantization_config(model, config)
+
+    validated = []
+    get_submodule = helpers._get_submodule
+
+    def recording_get_submodule(model, name):
+        validated.append(name)
+        return get_submodule(model, name)
+
+    monkeypatch.setattr(helpers, "_get_submodule", recording_get_submodule)
+    assert infer_quantization_status(model) == QuantizationStatus.FROZEN
+    assert validated == ["0"]
+
+    # detached recorded modules are skipped
+    detached = model[0]
+    model[0] = torch.nn.Linear(8, 8)
+    validated.clear()
+    assert infer_quantization_status(model) == QuantizationStatus.FROZEN
+    assert validated == ["0", "1"]
+    assert detached.quantization_status == QuantizationStatus.FROZEN
+
+    for idx in range(4):
+        model[idx] = torch.nn.Linear(8, 8)
+    assert infer_quantization_status(model) is None
@@ -0,0 +1,76 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from copy import deepcopy
+
+import pytest
+import torch
+from compressed_tensors.quantization import (
+    QuantizationArgs,
+    QuantizationConfig,
+    QuantizationScheme,
+    QuantizationStatus,
+    apply_quantization_config,
+    apply_quantization_status,
+    compress_quantized_model,
+)
+from compressed_tensors.quantization.lifecycle.forward import quantize
+from torch.nn import Linear, Sequential
+
+
+def _calibrated_model(weights: QuantizationArgs) -> Sequential:
+    scheme = QuantizationScheme(targets=["Linear"], weights=weights)
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(192, 160), Linear(160, 96), Linear(96, 64))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(4, 192))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+    return model
+
+
+@pytest.mark.parametrize(
+    "weights",
+    [
+        QuantizationArgs(),
+        QuantizationArgs(strategy="channel", symmetric=False),
+        QuantizationArgs(num_bits=4, group_size=32),
+        QuantizationArgs(strategy="block", block_structure="24x32"),
+    ],
+)
+@pytest.mark.parametrize("num_workers", [None, 4])
+def test_compress_quantized_model(weights, num_workers):
+    model = _calibrated_model(weights)
+    expected = [
+        quantize(
+            layer.weight,
+            layer.weight_scale,
+            layer.weight_zero_point,
+            weights,
+            dtype=torch.int8,
+        )
+        for layer in model
+    ]
+
+    # chunks of a few rows, which do not divide the weights evenly
+    compressed_model = deepcopy(model)
+    compress_quantized_model(
+        compressed_model, num_workers=num_workers, max_chunk_numel=1000
+    )
+
+    for layer, expected_weight in zip(compressed_model, expected):
+        assert layer.quantization_status == QuantizationStatus.COMPRESSED
+        assert layer.weight.dtype == torch.int8
+        assert torch.equal(layer.weight, expected_weight)
@@ -0,0 +1,110 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import torch
+from compressed_tensors.quantization.lifecycle import forward
+from compressed_tensors.quantization.lifecycle.apply import apply_quantization_status
+from compressed_tensors.quantization.lifecycle.calibration import (
+    set_module_for_calibration,
+)
+from compressed_tensors.quantization.lifecycle.folded import fold_quantization
+from compressed_tensors.quantization.lifecycle.forward import (
+    update_module_forward_quantized,
+    wrap_module_forward_quantized,
+)
+from compressed_tensors.quantization.lifecycle.frozen import freeze_module_quantization
+from compressed_tensors.quantization.lifecycle.initialize import (
+    initialize_module_for_quantization,
+)
+from compressed_tensors.quantization.quant_args import QuantizationArgs
+from compressed_tensors.quantization.quant_config import QuantizationStatus
+from torch.nn import Linear, Sequential
+
+
+@pytest.mark.parametrize("quantize_inputs", [True, False])
+def test_fold_quantization(create_quantization_scheme, quantize_inputs):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=4, group_size=16),
+        input_activations=QuantizationArgs(num_bits=8) if quantize_inputs else None,
+    )
+    model = Sequential(Linear(32, 64), Linear(64, 16))
+    for layer in model:
+        initialize_module_for_quantization(layer, quantization_scheme)
+        set_module_for_calibration(layer)
+    with torch.no_grad():
+        model(torch.randn(8, 32))
+    for layer in model:
+        freeze_module_quantization(layer)
+
+    inputs = torch.randn(8, 32)
+    with torch.no_grad():
+        expected = model(inputs)
+
+    fold_quantization(model)
+
+    for layer in model:
+        assert layer.quantization_status == QuantizationStatus.FROZEN
+        assert layer.quantization_scheme == quantization_scheme
+        assert not hasattr(layer, "weight_observer")
+        # forward is only wrapped while activations are quantized
+        assert ("forward" in layer.__dict__) == quantize_inputs
+
+    with torch.no_grad():
+        assert torch.equal(model(inputs), expected)
+
+
+@pytest.mark.parametrize("quantize_inputs", [True, False])
+def test_folded_weight_not_quantized_again(
+    create_quantization_scheme, quantize_inputs, monkeypatch
+):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=4, group_size=16),
+        input_activations=QuantizationArgs(num_bits=8) if quantize_inputs else None,
+    )
+    model = Sequential(Linear(32, 64), Linear(64, 16))
+    for layer in model:
+        initialize_module_for_quantization(layer, quantization_scheme)
+        set_module_for_calibration(layer)
+    with torch.no_grad():
+        model(torch.randn(8, 32))
+    fold_quantization(model)
+    folded_weights = [layer.weight.detach().clone() for layer in model]
+
+    quantized_weights = []
+    get_quantized_weight = forward._get_quantized_weight
+
+    def recording_get_quantized_weight(module, *args, **kwargs):
+        quantized_weights.append(module)
+        return get_quantized_weight(module, *args, **kwargs)
+
+    monkeypatch.setattr(
+        forward, "_get_quantized_weight", recording_get_quantized_weight
+    )
+
+    # later forward updates and lifecycle calls keep the weight folded
+    if quantize_inputs:
+        for layer in model:
+            wrap_module_forward_quantized(layer, layer.quantization_scheme)
+    model.apply(update_module_forward_quantized)
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+    with torch.no_grad():
+        model(torch.randn(8, 32))
+
+    assert quantized_weights == []
+    for layer, folded_weight in zip(model, folded_weights):
+        assert torch.equal(layer.weight, folded_weight)
+        assert ("forward" in layer.__dict__) == quantize_inputs
@@ -12,19 +12,55 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import logging
+import os
+import timeit
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import torch
+from compressed_tensors.quantization import (
+    QuantizationConfig,
+    QuantizationScheme,
+    QuantizationStatus,
+    apply_quantization_config,
+    apply_quantization_status,
+    freeze_module_quantization,
+    remove_quantization_wrappers,
+    set_module_for_calibration,
+)
+from compressed_tensors.quantization.lifecycle import forward
 from compressed_tensors.quantization.lifecycle.forward import (
+    _MAX_SCRATCH_BUFFERS,
+    _SCRATCH_BUFFERS,
+    _dynamic_quantize_per_token,
+    _get_scratch_buffer,
+    clear_quantized_weight_cache,
+    dequantize,
+    fake_quantize,
     maybe_calibrate_or_quantize,
+    quantize,
+    update_module_forward_quantized,
     wrap_module_forward_quantized,
 )
 from compressed_tensors.quantization.lifecycle.initialize import (
     initialize_module_for_quantization,
 )
-from compressed_tensors.quantization.quant_args import QuantizationArgs
-from compressed_tensors.quantization.quant_config import QuantizationStatus
-from torch.nn import Linear
+from compressed_tensors.quantization.observers import MemorylessObserver, Observer
+from compressed_tensors.quantization.quant_args import (
+    QuantizationArgs,
+    QuantizationStrategy,
+)
+from compressed_tensors.utils.helpers import update_parameter_data
+from torch.nn import Linear, Sequential
+
+
+# benchmarks compare timings, which are unreliable on shared machines, so they only
+# run when opted in. Run with -s to see the measured timings
+requires_benchmark = pytest.mark.skipif(
+    not os.environ.get("COMPRESSED_TENSORS_BENCHMARK"),
+    reason="set COMPRESSED_TENSORS_BENCHMARK=1 to run benchmarks",
+)
 
 
 def test_wrap_module_forward_quantized(create_quantization_scheme):
@@ -80,3 +116,722 @@ def test_maybe_calibrate_or_quantize(create_quantization_scheme, quantization_st
             out = maybe_calibrate_or_quantize(
                 layer, layer.weight.data, "input", quantization_args
             )
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float16])
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("shape,group_size", [((64, 512), 32), ((16, 64), 128)])
+def test_group_quantization_matches_per_group(dtype, symmetric, shape, group_size):
+    x = (torch.randn(shape) * 4).to(dtype)
+    num_groups = max(shape[1] // group_size, 1)
+    scale = (torch.rand((shape[0], num_groups)) + 0.01).to(dtype)
+    zero_point = torch.randint(-8, 8, (shape[0], num_groups), dtype=torch.int8)
+    if symmetric:
+        zero_point = torch.zeros_like(zero_point)
+
+    group_args = QuantizationArgs(num_bits=4, group_size=group_size)
+    channel_args = QuantizationArgs(num_bits=4, strategy=QuantizationStrategy.CHANNEL)
+
+    # reference: quantize each group independently with its own channel qparams
+    width = min(group_size, shape[1])
+    expected_q, expected_dq, expected_fq = [], [], []
+    for idx in range(num_groups):
+        cols = slice(idx * width, (idx + 1) * width)
+        sc, zp = scale[:, idx : idx + 1], zero_point[:, idx : idx + 1]
+        expected_q.append(quantize(x[:, cols], sc, zp, channel_args, dtype=torch.int8))
+        expected_dq.append(dequantize(expected_q[-1], sc, zp, channel_args))
+        expected_fq.append(fake_quantize(x[:, cols], sc, zp, channel_args))
+    expected_q = torch.cat(expected_q, dim=1)
+    expected_dq = torch.cat(expected_dq, dim=1)
+    expected_fq = torch.cat(expected_fq, dim=1)
+
+    x_q = quantize(x, scale, zero_point, group_args, dtype=torch.int8)
+    assert x_q.dtype == torch.int8
+    assert torch.equal(x_q, expected_q)
+
+    x_fq = fake_quantize(x, scale, zero_point, group_args)
+    assert x_fq.dtype == dtype
+    assert torch.equal(x_fq, expected_fq)
+
+    x_dq = dequantize(x_q, scale, zero_point, group_args)
+    assert torch.equal(x_dq, expected_dq)
+
+
+def test_frozen_forward_caches_quantized_weight(create_quantization_scheme):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+    )
+    layer = Linear(64, 32)
+    initialize_module_for_quantization(layer, quantization_scheme)
+    set_module_for_calibration(layer)
+    layer(torch.randn(4, 64))
+    freeze_module_quantization(layer)
+
+    def expected_output(inputs):
+        weight = fake_quantize(
+            layer.weight,
+            layer.weight_scale,
+            layer.weight_zero_point,
+            quantization_scheme.weights,
+        )
+        return torch.nn.functional.linear(inputs, weight, layer.bias)
+
+    inputs = torch.randn(4, 64)
+    weight = layer.weight.detach().clone()
+    expected = expected_output(inputs)
+
+    with torch.no_grad():
+        out = layer(inputs)
+        _, cached_weight = layer._quantized_weight_cache
+        assert torch.equal(out, expected)
+        assert torch.equal(layer.weight, weight)
+        assert "_quantized_weight_cache" not in layer.state_dict()
+
+        # cached weight is reused while the weight and qparams are unchanged
+        layer(inputs)
+        assert layer._quantized_weight_cache[1] is cached_weight
+
+        # in place updates of the qparams produce a fresh result
+        layer.weight_scale.mul_(2)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+        assert layer._quantized_weight_cache[1] is not cached_weight
+
+        # so do loaded weights
+        state_dict = layer.state_dict()
+        state_dict["weight"] = state_dict["weight"] * 2
+        layer.load_state_dict(state_dict)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+        # and in place edits through .data once the cache is cleared
+        _, cached_weight = layer._quantized_weight_cache
+        clear_quantized_weight_cache(layer)
+        layer(inputs)
+        assert layer._quantized_weight_cache[1] is not cached_weight
+
+    # with gradients enabled the cached weight is used, and its gradient passed
+    # straight through to the weight parameter
+    _, cached_weight = layer._quantized_weight_cache
+    out = layer(inputs)
+    assert layer._quantized_weight_cache[1] is cached_weight
+    assert torch.equal(out, expected_output(inputs))
+    out.sum().backward()
+    expected_grad = inputs.sum(dim=0).expand_as(layer.weight)
+    assert torch.allclose(layer.weight.grad, expected_grad)
+
+    # optimizer steps update the weight in place
+    torch.optim.SGD(layer.parameters(), lr=0.1).step()
+    with torch.no_grad():
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+
+def test_frozen_forward_cache_cleared_after_updates(create_quantization_scheme):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+    )
+    layer = Linear(64, 32)
+    initialize_module_for_quantization(layer, quantization_scheme)
+    set_module_for_calibration(layer)
+    layer(torch.randn(4, 64))
+    freeze_module_quantization(layer)
+
+    def expected_output(inputs):
+        weight = fake_quantize(
+            layer.weight,
+            layer.weight_scale,
+            layer.weight_zero_point,
+            quantization_scheme.weights,
+        )
+        return torch.nn.functional.linear(inputs, weight, layer.bias)
+
+    inputs = torch.randn(4, 64)
+    with torch.no_grad():
+        layer(inputs)
+
+        layer.weight_scale.data.mul_(2)
+        clear_quantized_weight_cache(layer)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+        update_parameter_data(layer, "weight_scale", layer.weight_scale * 2)
+        clear_quantized_weight_cache(layer)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+        layer.weight.data = layer.weight.data * 2
+        clear_quantized_weight_cache(layer)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+        # status changes also recompute the cached weight
+        layer.weight.data.mul_(2)
+        update_module_forward_quantized(layer)
+        assert torch.equal(layer(inputs), expected_output(inputs))
+
+
+def test_frozen_forward_cache_follows_module(create_quantization_scheme):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+    )
+    layer = Linear(64, 32)
+    initialize_module_for_quantization(layer, quantization_scheme)
+    set_module_for_calibration(layer)
+    layer(torch.randn(4, 64))
+    freeze_module_quantization(layer)
+
+    with torch.no_grad():
+        layer(torch.randn(4, 64))
+        layer.to(torch.float64)
+        assert layer(torch.randn(4, 64, dtype=torch.float64)).dtype == torch.float64
+        assert layer._quantized_weight_cache[1].dtype == torch.float64
+
+
+class _CustomLinear(Linear):
+    # a forward that cannot be passed an explicit weight
+    def forward(self, input):
+        return super().forward(input) * 2
+
+
+@pytest.mark.parametrize("grad_enabled", [False, True])
+@pytest.mark.parametrize("num_threads", [8])
+def test_concurrent_quantized_forward(num_threads, grad_enabled):
+    scheme = QuantizationScheme(
+        targets=["Linear", "_CustomLinear"],
+        weights=QuantizationArgs(num_bits=4, group_size=32),
+        input_activations=QuantizationArgs(num_bits=8, dynamic=True),
+        output_activations=QuantizationArgs(num_bits=8),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(128, 256), _CustomLinear(256, 64))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(16, 128))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    inputs = [torch.randn(16, 128) * (idx + 1) for idx in range(num_threads)]
+    weights = [layer.weight.detach().clone() for layer in model]
+    with torch.no_grad():
+        expected = [model(x) for x in inputs]
+
+    def run(idx):
+        # grad mode is thread local
+        with torch.set_grad_enabled(grad_enabled):
+            return model(inputs[idx]).detach()
+
+    # every input is run several times, interleaved across threads
+    idxs = [idx % len(inputs) for idx in range(len(inputs) * 64)]
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        outputs = list(executor.map(run, idxs))
+
+    for idx, output in zip(idxs, outputs):
+        assert torch.equal(output, expected[idx])
+    # the unquantized weights are restored
+    for layer, weight in zip(model, weights):
+        assert torch.equal(layer.weight, weight)
+
+
+def test_forward_wrapped_by_status():
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+        input_activations=QuantizationArgs(num_bits=8),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(16, 16), Linear(16, 16))
+    inputs = torch.randn(4, 16)
+    with torch.no_grad():
+        expected = model(inputs)
+
+    # initialized modules run their original forward
+    apply_quantization_config(model, config)
+    for layer in model:
+        assert "forward" not in layer.__dict__
+    with torch.no_grad():
+        assert torch.equal(model(inputs), expected)
+
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    wrapped_forwards = [layer.forward for layer in model]
+    for layer in model:
+        assert layer.forward.__func__ is not Linear.forward
+    with torch.no_grad():
+        model(inputs)
+
+    # the wrapper is kept when freezing
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+    for layer, wrapped_forward in zip(model, wrapped_forwards):
+        assert layer.forward is wrapped_forward
+    with torch.no_grad():
+        assert not torch.equal(model(inputs), expected)
+
+    remove_quantization_wrappers(model)
+    for layer in model:
+        assert "forward" not in layer.__dict__
+        assert layer.quantization_status == QuantizationStatus.FROZEN
+    with torch.no_grad():
+        assert torch.equal(model(inputs), expected)
+
+    # compressed modules without an int8 forward are unwrapped
+    weight_only_scheme = QuantizationScheme(
+        targets=["Linear"], weights=QuantizationArgs(num_bits=4, group_size=8)
+    )
+    config = QuantizationConfig(config_groups={"group_0": weight_only_scheme})
+    model = Sequential(Linear(16, 16), Linear(16, 16))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(inputs)
+    apply_quantization_status(model, QuantizationStatus.COMPRESSED)
+    for layer in model:
+        assert "forward" not in layer.__dict__
+
+
+def test_inactive_forward_overhead(create_quantization_scheme):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+        input_activations=QuantizationArgs(num_bits=8),
+    )
+    layer = Linear(8, 8)
+    initialize_module_for_quantization(layer, quantization_scheme)
+
+    def assert_original_forward(module):
+        # the forward call resolves to the original bound method with no wrapper or
+        # hooks in between, so it has no per call overhead
+        assert "forward" not in module.__dict__
+        assert module.forward.__func__ is Linear.forward
+        assert not hasattr(module, "_forward_before_quantization")
+        assert not module._forward_hooks and not module._forward_pre_hooks
+
+    assert_original_forward(layer)
+
+    set_module_for_calibration(layer)
+    assert "forward" in layer.__dict__
+    freeze_module_quantization(layer)
+    remove_quantization_wrappers(layer)
+    assert_original_forward(layer)
+
+
+@requires_benchmark
+def test_inactive_forward_overhead_benchmark(create_quantization_scheme):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+        input_activations=QuantizationArgs(num_bits=8),
+    )
+    inputs = torch.randn(1, 8)
+
+    def time_forward(module):
+        with torch.no_grad():
+            return min(timeit.repeat(lambda: module(inputs), repeat=5, number=10000))
+
+    layer = Linear(8, 8)
+    initialized_layer = Linear(8, 8)
+    initialize_module_for_quantization(initialized_layer, quantization_scheme)
+    # an initialized module run through the quantized wrapper, which passes the
+    # weight and activations through unchanged
+    wrapped_layer = Linear(8, 8)
+    initialize_module_for_quantization(wrapped_layer, quantization_scheme)
+    wrap_module_forward_quantized(wrapped_layer, quantization_scheme)
+
+    baseline = time_forward(layer)
+    initialized = time_forward(initialized_layer)
+    wrapped = time_forward(wrapped_layer)
+    print(
+        f"\ninactive forward, 10000 calls: unquantized {baseline:.4f}s, "
+        f"initialized {initialized:.4f}s, wrapped {wrapped:.4f}s"
+    )
+
+    # an initialized module has no per call overhead over an unquantized one
+    assert initialized < 1.5 * baseline
+
+
+@pytest.mark.skipif(
+    not hasattr(torch, "compile"), reason="torch.compile is not available"
+)
+@pytest.mark.parametrize("dynamic", [True, False])
+def test_compiled_forward_no_graph_breaks(dynamic):
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(num_bits=4, group_size=16),
+        input_activations=QuantizationArgs(num_bits=8, dynamic=dynamic),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(32, 64), Linear(64, 16))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(8, 32))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    inputs = torch.randn(8, 32)
+    with torch.no_grad():
+        expected = model(inputs)
+
+        # fullgraph raises on any graph break
+        torch._dynamo.reset()
+        compiled_model = torch.compile(model, backend="eager", fullgraph=True)
+        assert torch.equal(compiled_model(inputs), expected)
+
+
+@pytest.mark.skipif(
+    not hasattr(torch, "compile"), reason="torch.compile is not available"
+)
+def test_compiled_forward_reuses_frozen_weight(monkeypatch):
+    scheme = QuantizationScheme(
+        targets=["Linear"], weights=QuantizationArgs(num_bits=4, group_size=16)
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(32, 64), Linear(64, 16))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(8, 32))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    inputs = torch.randn(8, 32)
+    with torch.no_grad():
+        expected = model(inputs)
+
+        # the weights quantized when freezing are reused by the compiled graph
+        quantize_calls = []
+        fake_quantize = forward.fake_quantize
+
+        def counting_fake_quantize(*args, **kwargs):
+            quantize_calls.append(None)
+            return fake_quantize(*args, **kwargs)
+
+        monkeypatch.setattr(forward, "fake_quantize", counting_fake_quantize)
+        torch._dynamo.reset()
+        compiled_model = torch.compile(model, backend="eager", fullgraph=True)
+        assert torch.equal(compiled_model(inputs), expected)
+        assert not quantize_calls
+
+        # an updated weight is quantized again once its cache is cleared
+        model[0].weight.mul_(2)
+        clear_quantized_weight_cache(model[0])
+        assert torch.equal(compiled_model(inputs), model(inputs))
+
+
+@requires_benchmark
+@pytest.mark.skipif(
+    not hasattr(torch, "compile"), reason="torch.compile is not available"
+)
+@pytest.mark.parametrize("dynamic", [True, False])
+def test_compiled_forward_throughput_benchmark(dynamic):
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(num_bits=4, group_size=128),
+        input_activations=QuantizationArgs(num_bits=8, dynamic=dynamic),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(1024, 1024), Linear(1024, 1024))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(8, 1024))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    inputs = torch.randn(64, 1024)
+    with torch.no_grad():
+        torch._dynamo.reset()
+        compiled_model = torch.compile(model, fullgraph=True)
+        assert torch.allclose(compiled_model(inputs), model(inputs))
+
+        def time_forward(forward):
+            return timeit.timeit(lambda: forward(inputs), number=50)
+
+        # rounds are interleaved so load changes affect both forwards alike
+        eager, compiled = float("inf"), float("inf")
+        for _ in range(10):
+            eager = min(eager, time_forward(model))
+            compiled = min(compiled, time_forward(compiled_model))
+    print(
+        f"\nfrozen forward, 50 calls of {tuple(inputs.shape)}: eager {eager:.4f}s, "
+        f"compiled {compiled:.4f}s"
+    )
+
+    # compiled graphs reuse the quantized weights cached when freezing
+    assert compiled <= eager
+
+
+@pytest.mark.parametrize(
+    "weights,input_activations",
+    [
+        (QuantizationArgs(), QuantizationArgs()),
+        (QuantizationArgs(), QuantizationArgs(symmetric=False)),
+        (
+            QuantizationArgs(strategy="channel"),
+            QuantizationArgs(strategy="token", dynamic=True),
+        ),
+        (
+            QuantizationArgs(strategy="channel"),
+            QuantizationArgs(strategy="token", dynamic=True, symmetric=False),
+        ),
+    ],
+)
+def test_int8_compressed_forward(weights, input_activations):
+    torch.manual_seed(0)
+    scheme = QuantizationScheme(
+        targets=["Linear"], weights=weights, input_activations=input_activations
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(64, 128), Linear(128, 32))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(16, 64))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    # layers are compared on the same inputs, as a rounding difference in the
+    # output of one layer could move a quantized input of the next by a full step
+    inputs = torch.randn(2, 8, 64)
+    with torch.no_grad():
+        layer_inputs = [inputs, model[0](inputs)]
+        expected = [layer(x) for layer, x in zip(model, layer_inputs)]
+
+    apply_quantization_status(model, QuantizationStatus.COMPRESSED)
+    for layer in model:
+        assert layer.weight.dtype == torch.int8
+
+    with torch.no_grad():
+        for layer, x, expected_output in zip(model, layer_inputs, expected):
+            output = layer(x)
+            assert output.shape == expected_output.shape
+            assert output.dtype == expected_output.dtype
+
+            # the integer matmul is exact while the fake quantized matmul rounds
+            # its float products, outputs agree to within a couple of steps of
+            # the product of the input and weight scales
+            if input_activations.dynamic:
+                input_scale, _ = input_activations.get_observer()(x)
+            else:
+                input_scale = layer.input_scale
+            step = input_scale.max() * layer.weight_scale.max()
+            assert torch.allclose(output, expected_output, rtol=0, atol=2 * step)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+def test_int8_compressed_forward_dtype_and_fallback(symmetric, monkeypatch):
+    torch.manual_seed(0)
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(strategy="channel"),
+        input_activations=QuantizationArgs(
+            strategy="token", dynamic=True, symmetric=symmetric
+        ),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    layer = Sequential(Linear(64, 32))
+    apply_quantization_config(layer, config)
+    apply_quantization_status(layer, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        layer(torch.randn(16, 64))
+    apply_quantization_status(layer, QuantizationStatus.COMPRESSED)
+    layer = layer[0]
+    assert layer.bias.dtype == torch.float32
+
+    inputs = torch.randn(16, 64)
+    with torch.no_grad():
+        expected = layer(inputs)
+
+        # a float32 bias does not promote the output of half precision inputs
+        output = layer(inputs.to(torch.bfloat16))
+        assert output.dtype == torch.bfloat16
+
+        # devices without an integer matmul compute the same product from the
+        # dequantized input and weight
+        monkeypatch.setattr(forward, "_int8_mm", lambda input_q, weight_q: None)
+        output = layer(inputs)
+    assert output.dtype == torch.float32
+    assert torch.allclose(output, expected, rtol=0, atol=1e-4)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("shape", [(16, 64), (2, 8, 64)])
+def test_dynamic_quantize_per_token(symmetric, shape):
+    args = QuantizationArgs(strategy="token", dynamic=True, symmetric=symmetric)
+    observer = args.get_observer()
+    x = torch.randn(shape) * 4
+
+    scale, zero_point = observer(x)
+    assert list(scale.shape) == [*shape[:-1], 1]
+
+    x_fq, fused_scale, fused_zero_point = _dynamic_quantize_per_token(x, args)
+    assert torch.equal(fused_scale, scale)
+    assert torch.equal(fused_zero_point, zero_point)
+    assert torch.equal(x_fq, fake_quantize(x, scale, zero_point, args))
+
+    x_q, _, _ = _dynamic_quantize_per_token(x, args, do_dequantize=False)
+    assert x_q.dtype == torch.int8
+    assert torch.equal(x_q, quantize(x, scale, zero_point, args, dtype=torch.int8))
+
+    # token qparams are broadcast whatever shape they are passed with
+    flat_q = quantize(x, scale.flatten(), zero_point.flatten(), args, torch.int8)
+    assert torch.equal(flat_q, x_q)
+
+
+@Observer.register("test_custom_memoryless")
+class _CustomMemorylessObserver(MemorylessObserver):
+    pass
+
+
+@pytest.mark.parametrize("observer", ["minmax", "memoryless", "test_custom_memoryless"])
+def test_dynamic_per_token_fused_selection(observer, monkeypatch, caplog):
+    args = QuantizationArgs(strategy="token", dynamic=True, observer=observer)
+    layer = Linear(64, 32)
+    # initializing replaces the default observer of the scheme args, the passed
+    # args keep the configured observer
+    initialize_module_for_quantization(
+        layer,
+        QuantizationScheme(targets=["Linear"], input_activations=args.model_copy()),
+    )
+    assert args.observer == observer
+    set_module_for_calibration(layer)
+
+    fused_calls = []
+
+    def recording_quantize_per_token(x, args, do_dequantize=True):
+        fused_calls.append(x)
+        return _dynamic_quantize_per_token(x, args, do_dequantize)
+
+    monkeypatch.setattr(
+        forward, "_dynamic_quantize_per_token", recording_quantize_per_token
+    )
+    forward._log_fused_dynamic_fallback.cache_clear()
+    with caplog.at_level(logging.INFO):
+        for _ in range(2):
+            maybe_calibrate_or_quantize(layer, torch.randn(4, 64), "input", args)
+
+    # the default observer is replaced by a memoryless one, only custom observers
+    # fall back to running the observer, which is logged once
+    fused = observer != "test_custom_memoryless"
+    assert len(fused_calls) == (2 if fused else 0)
+    fallback_logs = [r for r in caplog.records if "fused" in r.getMessage()]
+    assert len(fallback_logs) == (0 if fused else 1)
+
+
+def test_scratch_buffer_reuse():
+    buffer = _get_scratch_buffer(torch.Size([8, 64]), torch.float32, "cpu")
+    reused = _get_scratch_buffer(torch.Size([8, 64]), torch.float32, "cpu")
+    assert reused.shape == (8, 64)
+    assert reused.data_ptr() == buffer.data_ptr()
+
+    other = _get_scratch_buffer(torch.Size([4, 64]), torch.float32, "cpu")
+    assert other.shape == (4, 64)
+    assert _get_scratch_buffer(torch.Size([8, 64]), torch.float32, "cpu") is buffer
+
+    # buffers of shapes no longer requested are freed
+    for rows in range(16, 16 + _MAX_SCRATCH_BUFFERS):
+        _get_scratch_buffer(torch.Size([rows, 64]), torch.float32, "cpu")
+    assert _get_scratch_buffer(torch.Size([8, 64]), torch.float32, "cpu") is not buffer
+    assert len(_SCRATCH_BUFFERS.buffers) == _MAX_SCRATCH_BUFFERS
+
+
+@pytest.mark.parametrize("shape", [(256, 512), (200, 300)])
+def test_block_quantization_matches_per_block(shape):
+    block_args = QuantizationArgs(
+        num_bits=8, strategy="block", block_structure="64x128"
+    )
+    tensor_args = QuantizationArgs(num_bits=8)
+
+    x = torch.randn(shape)
+    scale, zero_point = block_args.get_observer()(x)
+
+    x_q = quantize(x, scale, zero_point, block_args, dtype=torch.int8)
+    x_fq = fake_quantize(x, scale, zero_point, block_args)
+    assert x_q.shape == x.shape
+    assert x_fq.shape == x.shape
+    assert torch.equal(dequantize(x_q, scale, zero_point, block_args), x_fq)
+
+    for row in range(scale.shape[0]):
+        for column in range(scale.shape[1]):
+            rows = slice(row * 64, (row + 1) * 64)
+            columns = slice(column * 128, (column + 1) * 128)
+            sc = scale[row, column].reshape(1)
+            zp = zero_point[row, column].reshape(1)
+            assert torch.equal(
+                x_q[rows, columns],
+                quantize(x[rows, columns], sc, zp, tensor_args, dtype=torch.int8),
+            )
+            expected_fq = fake_quantize(x[rows, columns], sc, zp, tensor_args)
+            assert torch.equal(x_fq[rows, columns], expected_fq)
+
+
+def test_block_quantization_lifecycle():
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(strategy="block", block_structure="32x64"),
+    )
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    model = Sequential(Linear(128, 96), Linear(96, 40))
+    apply_quantization_config(model, config)
+    assert model[0].weight_scale.shape == (3, 2)
+    assert model[1].weight_scale.shape == (2, 2)
+
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(4, 128))
+    assert model[0].weight_scale.shape == (3, 2)
+    assert model[1].weight_scale.shape == (2, 2)
+
+
+@pytest.mark.parametrize("grad_enabled", [False, True])
+def test_calibration_observes_weight_once(create_quantization_scheme, grad_enabled):
+    quantization_scheme = create_quantization_scheme(
+        targets=["*"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+        input_activations=QuantizationArgs(num_bits=8, symmetric=True),
+    )
+    layer = Linear(64, 32)
+    initialize_module_for_quantization(layer, quantization_scheme)
+    set_module_for_calibration(layer)
+
+    observed = {"weight": 0, "input": 0}
+    for base_name in observed:
+        observer = getattr(layer, f"{base_name}_observer")
+
+        def counting_forward(value, base_name=base_name, forward=observer.forward):
+            observed[base_name] += 1
+            return forward(value)
+
+        observer.forward = counting_forward
+
+    with torch.set_grad_enabled(grad_enabled):
+        for _ in range(4):
+            layer(torch.randn(4, 64))
+        assert observed == {"weight": 1, "input": 4}
+
+        # in place updates change the weight version, so the weight is observed
+        # again and produces new qparams
+        scale = layer.weight_scale.clone()
+        with torch.no_grad():
+            layer.weight.mul_(2)
+        layer(torch.randn(4, 64))
+        assert observed == {"weight": 2, "input": 5}
+        assert torch.equal(layer.weight_scale, _fresh_weight_scale(layer))
+        assert not torch.equal(layer.weight_scale, scale)
+
+        # the observer is reset, so the new weight is not averaged with the old one.
+        # Edits through .data are seen once the cache is cleared
+        layer.weight.data.mul_(10)
+        layer(torch.randn(4, 64))
+        assert observed == {"weight": 2, "input": 6}
+        clear_quantized_weight_cache(layer)
+        layer(torch.randn(4, 64))
+        assert observed == {"weight": 3, "input": 7}
+        assert torch.equal(layer.weight_scale, _fresh_weight_scale(layer))
+
+        # a weight updated since it was last observed is observed at freeze
+        with torch.no_grad():
+            layer.weight.div_(4)
+        expected_scale = _fresh_weight_scale(layer)
+
+    freeze_module_quantization(layer)
+    assert observed == {"weight": 4, "input": 7}
+    assert torch.equal(layer.weight_scale, expected_scale)
+
+
+def _fresh_weight_scale(layer):
+    observer = layer.quantization_scheme.weights.get_observer()
+    scale, _ = observer(layer.weight)
+    return scale
@@ -0,0 +1,135 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from copy import deepcopy
+
+import pytest
+import torch
+from compressed_tensors.quantization import (
+    QuantizationConfig,
+    QuantizationStatus,
+    apply_quantization_config,
+    apply_quantization_status,
+    sequential_calibration,
+)
+from compressed_tensors.quantization.lifecycle import sequential
+from torch.nn import Linear, Module, ModuleList
+
+
+class _Block(Module):
+    def __init__(self):
+        super().__init__()
+        self.linear_1 = Linear(8, 16)
+        self.linear_2 = Linear(16, 8)
+
+    def forward(self, hidden_states, scale=1.0):
+        hidden_states = self.linear_2(torch.relu(self.linear_1(hidden_states)))
+        return (hidden_states * scale,)
+
+
+class _Model(Module):
+    def __init__(self):
+        super().__init__()
+        self.embed = Linear(4, 8)
+        self.blocks = ModuleList([_Block(), _Block()])
+        self.head = Linear(8, 2)
+
+    def forward(self, inputs):
+        hidden_states = self.embed(inputs)
+        for block in self.blocks:
+            hidden_states = block(hidden_states, scale=0.5)[0]
+        return self.head(hidden_states)
+
+
+def _get_quantized_model():
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 8, "strategy": "channel"},
+                    "input_activations": {"num_bits": 8, "symmetric": False},
+                    "targets": ["Linear"],
+                },
+            },
+            "ignore": ["embed", "head"],
+            "quantization_status": "initialized",
+        }
+    )
+    model = _Model()
+    apply_quantization_config(model, config)
+    return model
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_sequential_calibration(compress):
+    model = _get_quantized_model()
+    sequential_model = deepcopy(model)
+    samples = [torch.randn(2, 3, 4) for _ in range(4)]
+
+    # calibrating the whole model at once
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        for sample in samples:
+            model(sample)
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    sequential_calibration(
+        sequential_model, sequential_model.blocks, samples, compress=compress
+    )
+
+    status = QuantizationStatus.COMPRESSED if compress else QuantizationStatus.FROZEN
+    for block, sequential_block in zip(model.blocks, sequential_model.blocks):
+        for name in ("linear_1", "linear_2"):
+            module = getattr(block, name)
+            sequential_module = getattr(sequential_block, name)
+            assert sequential_module.quantization_status == status
+            for param_name in ("weight_scale", "input_scale", "input_zero_point"):
+                assert torch.allclose(
+                    getattr(module, param_name), getattr(sequential_module, param_name)
+                )
+
+    # the capturing forward of the first block is removed
+    assert "forward" not in sequential_model.blocks[0].__dict__
+
+
+def test_sequential_calibration_offload(monkeypatch):
+    model = _get_quantized_model()
+    samples = [torch.randn(2, 3, 4) for _ in range(2)]
+
+    moves = []
+    move_tensors = sequential._move_tensors
+
+    def recording_move_tensors(module, device, recurse=True):
+        moves.append((module, device))
+        move_tensors(module, device, recurse=recurse)
+
+    monkeypatch.setattr(sequential, "_move_tensors", recording_move_tensors)
+    sequential_calibration(
+        model, model.blocks, samples, execution_device="cpu", offload_device="cpu:0"
+    )
+
+    def devices_of(module):
+        return [device for moved, device in moves if moved is module]
+
+    # each block is moved to the execution device to be calibrated, then offloaded
+    for block in model.blocks:
+        assert devices_of(block) == ["cpu", "cpu:0"]
+        for module in (block.linear_1, block.linear_2):
+            assert module.quantization_status == QuantizationStatus.FROZEN
+
+    # the modules outside of the blocks are offloaded once the block inputs are
+    # cached, and the first block runs its own forward again
+    for module in (model, model.embed, model.head):
+        assert devices_of(module) == ["cpu", "cpu:0"]
+    assert "forward" not in model.blocks[0].__dict__
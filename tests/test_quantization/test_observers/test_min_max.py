@@ -13,11 +13,23 @@
 # limitations under the License.
 
 
+import math
+import os
+import timeit
+
 import pytest
 import torch
 from compressed_tensors.quantization.quant_args import QuantizationArgs
 
 
+# benchmarks compare timings, which are unreliable on shared machines, so they only
+# run when opted in. Run with -s to see the measured timings
+requires_benchmark = pytest.mark.skipif(
+    not os.environ.get("COMPRESSED_TENSORS_BENCHMARK"),
+    reason="set COMPRESSED_TENSORS_BENCHMARK=1 to run benchmarks",
+)
+
+
 @pytest.mark.parametrize(
     "symmetric,expected_scale,expected_zero_point",
     [
@@ -89,3 +101,183 @@ def test_min_max_observer_value_update():
         else:
             assert abs(curr_max - 2.2600) < delta
             assert abs(curr_min - (-0.2900)) < delta
+
+
+def test_min_max_observer_reset():
+    weights = QuantizationArgs(num_bits=8, symmetric=True)
+    observer = weights.get_observer()
+    observer(torch.tensor([1.0, -1.0]))
+    scale, zero_point = observer(torch.tensor([10.0, -10.0]))
+    assert observer.max_val["default"] < 10.0
+
+    observer.reset()
+    assert observer.get_qparams() == (None, None)
+    scale, zero_point = observer(torch.tensor([10.0, -10.0]))
+    expected_scale, expected_zero_point = weights.get_observer()(
+        torch.tensor([10.0, -10.0])
+    )
+    assert torch.equal(scale, expected_scale)
+    assert torch.equal(zero_point, expected_zero_point)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("shape,group_size", [((64, 512), 32), ((16, 200), 64)])
+def test_min_max_observer_group(symmetric, shape, group_size):
+    group_args = QuantizationArgs(
+        num_bits=4, symmetric=symmetric, group_size=group_size
+    )
+    channel_args = QuantizationArgs(num_bits=4, symmetric=symmetric, strategy="channel")
+    observer = group_args.get_observer()
+
+    num_groups = math.ceil(shape[1] / group_size)
+    group_observers = [channel_args.get_observer() for _ in range(num_groups)]
+
+    for _ in range(3):
+        tensor = torch.randn(shape)
+        scale, zero_point = observer(tensor)
+
+        expected_scales, expected_zero_points = [], []
+        for idx, group_observer in enumerate(group_observers):
+            group = tensor[:, idx * group_size : (idx + 1) * group_size]
+            group_scale, group_zero_point = group_observer(group)
+            expected_scales.append(group_scale)
+            expected_zero_points.append(group_zero_point)
+
+        assert scale.shape == (shape[0], num_groups)
+        assert torch.equal(scale, torch.cat(expected_scales, dim=1))
+        assert torch.equal(zero_point, torch.cat(expected_zero_points, dim=1))
+
+    # running statistics of all groups are tracked in a single tensor
+    assert list(observer.min_val.keys()) == ["default"]
+    assert observer.min_val["default"].shape[:2] == (shape[0], num_groups)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("shape", [(256, 512), (200, 300)])
+def test_min_max_observer_block(symmetric, shape):
+    block_args = QuantizationArgs(
+        num_bits=8, symmetric=symmetric, strategy="block", block_structure="128x128"
+    )
+    tensor_args = QuantizationArgs(num_bits=8, symmetric=symmetric)
+    observer = block_args.get_observer()
+
+    tensor = torch.randn(shape)
+    scale, zero_point = observer(tensor)
+
+    row_blocks, column_blocks = math.ceil(shape[0] / 128), math.ceil(shape[1] / 128)
+    assert scale.shape == (row_blocks, column_blocks)
+    assert zero_point.shape == (row_blocks, column_blocks)
+    for row in range(row_blocks):
+        for column in range(column_blocks):
+            rows = slice(row * 128, (row + 1) * 128)
+            columns = slice(column * 128, (column + 1) * 128)
+            block = tensor[rows, columns]
+            block_scale, block_zero_point = tensor_args.get_observer()(block)
+            assert torch.equal(scale[row, column], block_scale[0])
+            assert torch.equal(zero_point[row, column], block_zero_point[0])
+
+
+@pytest.mark.parametrize("token_sampling", ["strided", "random"])
+def test_min_max_observer_token_subsampling(token_sampling):
+    generator = torch.Generator().manual_seed(0)
+    activations = torch.randn(2, 16, 8, generator=generator)
+    observer_kwargs = {"token_fraction": 0.25, "token_sampling": token_sampling}
+
+    def get_observer(observer_kwargs):
+        args = QuantizationArgs(num_bits=8, observer_kwargs=observer_kwargs)
+        return args.get_observer()
+
+    full_scale = get_observer({})(activations)[0]
+    observer = get_observer(observer_kwargs)
+    scale = observer(activations)[0]
+    same_seed_scale = get_observer(observer_kwargs)(activations)[0]
+
+    # only a quarter of the tokens is observed, which cannot widen the range
+    tokens = get_observer(observer_kwargs)._subsample_tokens(activations)
+    assert tokens.shape == (8, 8)
+    assert torch.equal(scale, get_observer({})(tokens)[0])
+    assert scale <= full_scale
+    assert torch.equal(scale, same_seed_scale)
+
+
+def _long_sequence_activations():
+    # a single 8k token sequence, where subsampling is meant to pay off
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(1, 8192, 512, generator=generator)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("token_sampling", ["strided", "random"])
+def test_min_max_observer_token_subsampling_error(symmetric, token_sampling):
+    activations = _long_sequence_activations()
+
+    def get_qparams(observer_kwargs):
+        args = QuantizationArgs(
+            num_bits=8, symmetric=symmetric, observer_kwargs=observer_kwargs
+        )
+        return args.get_observer()(activations)
+
+    full_scale, full_zero_point = get_qparams({})
+
+    # the default fraction observes every token
+    scale, zero_point = get_qparams({"token_sampling": token_sampling})
+    assert torch.equal(scale, full_scale)
+    assert torch.equal(zero_point, full_zero_point)
+
+    # observing a quarter of the tokens misses at most the few most extreme values
+    scale, zero_point = get_qparams(
+        {"token_fraction": 0.25, "token_sampling": token_sampling}
+    )
+    assert scale <= full_scale
+    assert (full_scale - scale) / full_scale < 0.1
+    assert (zero_point.int() - full_zero_point.int()).abs() <= 4
+
+
+@requires_benchmark
+@pytest.mark.parametrize("token_sampling", ["strided", "random"])
+def test_min_max_observer_token_subsampling_benchmark(token_sampling):
+    activations = _long_sequence_activations()
+    full_observer = QuantizationArgs(num_bits=8).get_observer()
+    observer = QuantizationArgs(
+        num_bits=8,
+        observer_kwargs={"token_fraction": 0.25, "token_sampling": token_sampling},
+    ).get_observer()
+
+    def time_observer(observer):
+        return min(timeit.repeat(lambda: observer(activations), repeat=5, number=10))
+
+    full = time_observer(full_observer)
+    subsampled = time_observer(observer)
+    scale_error = (full_observer(activations)[0] - observer(activations)[0]).abs()
+    scale_error = (scale_error / full_observer(activations)[0]).item()
+    print(
+        f"\n{token_sampling} subsampling of 0.25 of {activations.shape[1]} tokens: "
+        f"full {full:.4f}s, subsampled {subsampled:.4f}s, "
+        f"speedup {full / subsampled:.2f}x, scale error {scale_error:.2%}"
+    )
+
+    assert subsampled < full
+
+
+@pytest.mark.parametrize("num_tokens", [10, 16, 1000])
+def test_strided_token_subsampling_spans_tokens(num_tokens):
+    args = QuantizationArgs(num_bits=8, observer_kwargs={"token_fraction": 0.6})
+    observer = args.get_observer()
+    tokens = torch.arange(num_tokens, dtype=torch.float32).reshape(num_tokens, 1)
+
+    sampled = observer._subsample_tokens(tokens)
+    assert sampled.shape[0] == math.ceil(num_tokens * 0.6)
+    assert sampled[0].item() == 0
+    assert sampled[-1].item() == num_tokens - 1
+    assert sampled.unique().numel() == sampled.shape[0]
+
+
+def test_min_max_observer_token_subsampling_validation():
+    with pytest.raises(ValueError):
+        QuantizationArgs(observer_kwargs={"token_fraction": 0.0}).get_observer()
+    with pytest.raises(ValueError):
+        QuantizationArgs(observer_kwargs={"token_sampling": "top_k"}).get_observer()
+    with pytest.raises(ValueError):
+        QuantizationArgs(
+            strategy="channel", observer_kwargs={"token_fraction": 0.5}
+        ).get_observer()
@@ -0,0 +1,65 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import torch
+from compressed_tensors.quantization.observers.helpers import (
+    calculate_range,
+    get_quantization_plan,
+)
+from compressed_tensors.quantization.quant_args import (
+    QuantizationArgs,
+    round_to_quantized_type,
+)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        QuantizationArgs(num_bits=4, group_size=128),
+        QuantizationArgs(num_bits=8, strategy="channel", symmetric=False),
+        QuantizationArgs(strategy="block", block_structure="128x128"),
+        QuantizationArgs(type="float"),
+    ],
+)
+def test_quantization_plan(args):
+    plan = get_quantization_plan(args, "cpu", torch.float32)
+
+    # plans are shared between equal args, devices and dtypes
+    assert get_quantization_plan(args.model_copy(), "cpu", torch.float32) is plan
+    assert get_quantization_plan(args, torch.device("cpu"), torch.float32) is plan
+    assert get_quantization_plan(args, "cpu", torch.float16) is not plan
+
+    q_min, q_max = calculate_range(args, "cpu")
+    assert torch.equal(plan.q_min, q_min)
+    assert torch.equal(plan.q_max, q_max)
+    assert plan.strategy == args.strategy
+    assert plan.group_size == args.group_size
+    assert plan.symmetric == args.symmetric
+    assert plan.quantized_dtype == args.pytorch_dtype()
+    if args.block_structure is not None:
+        assert plan.block_shape == args.block_shape()
+
+    tensor = torch.randn(16, 16) * 4
+    assert torch.equal(plan.round(tensor), round_to_quantized_type(tensor, args))
+
+
+def test_quantization_plan_keyed_by_args():
+    args = QuantizationArgs(num_bits=8)
+    plan = get_quantization_plan(args, "cpu", torch.float32)
+    other_plan = get_quantization_plan(
+        QuantizationArgs(num_bits=4), "cpu", torch.float32
+    )
+    assert other_plan is not plan
+    assert other_plan.q_max == 7
@@ -46,6 +46,7 @@ def test_block():
     block = QuantizationArgs(**kwargs)
     assert block.strategy == QuantizationStrategy.BLOCK
     assert block.block_structure == kwargs["block_structure"]
+    assert block.block_shape() == (2, 4)
 
 
 def test_infer_strategy():
@@ -63,3 +64,7 @@ def test_invalid():
         _ = QuantizationArgs(strategy="invalid")
     with pytest.raises(ValidationError):
         _ = QuantizationArgs(strategy=QuantizationStrategy.GROUP)
+    with pytest.raises(ValidationError):
+        _ = QuantizationArgs(strategy=QuantizationStrategy.BLOCK)
+    with pytest.raises(ValidationError):
+        _ = QuantizationArgs(strategy="block", block_structure="2x")
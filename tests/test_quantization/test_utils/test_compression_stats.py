@@ -0,0 +1,150 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+import pytest
+import torch
+from compressed_tensors.compressors import Marlin24Compressor, map_modules_to_quant_args
+from compressed_tensors.compressors.sparse_bitmask import BitmaskTensor
+from compressed_tensors.compressors.utils import mask_creator
+from compressed_tensors.quantization import (
+    QuantizationConfig,
+    apply_quantization_config,
+)
+from compressed_tensors.quantization.utils import (
+    calculate_compression_ratio,
+    calculate_compression_stats,
+)
+
+
+def _get_quantized_model():
+    model = torch.nn.Sequential(
+        torch.nn.Linear(20, 16), torch.nn.ReLU(), torch.nn.Linear(16, 4, bias=False)
+    )
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": 4, "strategy": "channel"},
+                    "targets": ["Linear"],
+                },
+            },
+            "ignore": ["2"],
+            "quantization_status": "frozen",
+        }
+    )
+    apply_quantization_config(model, config)
+    return model
+
+
+def test_compression_stats():
+    model = _get_quantized_model()
+    stats = calculate_compression_stats(model)
+
+    assert [layer.name for layer in stats.layers] == ["0", "2"]
+    quantized, dense = stats.layers
+
+    qparam_bytes = sum(
+        param.numel() * param.element_size()
+        for name, param in model[0].named_parameters()
+        if name.startswith("weight_")
+    )
+    assert quantized.num_weights == 20 * 16 + 16
+    assert quantized.original_bytes == (20 * 16 + 16) * 4
+    assert quantized.qparam_bytes == qparam_bytes
+    assert quantized.compressed_bytes == 20 * 16 / 2 + 16 * 4 + qparam_bytes
+    assert dense.original_bytes == dense.compressed_bytes == 16 * 4 * 4
+    assert dense.bits_per_weight == 32
+
+    assert stats.original_bytes == quantized.original_bytes + dense.original_bytes
+    assert stats.compression_ratio == stats.original_bytes / stats.compressed_bytes
+    assert calculate_compression_ratio(model) == stats.compression_ratio
+
+    # machine readable report
+    assert stats.model_dump()["layers"][0]["name"] == "0"
+
+
+def test_compression_stats_packing_overhead():
+    model = _get_quantized_model()
+    packed = calculate_compression_stats(model, quantization_format="pack-quantized")
+    naive = calculate_compression_stats(model, quantization_format="naive-quantized")
+
+    qparam_bytes = packed.layers[0].qparam_bytes
+    # 20 4-bit values of each row are padded to 3 int32s
+    assert packed.layers[0].compressed_bytes == 16 * 3 * 4 + 16 * 4 + qparam_bytes
+    assert naive.layers[0].compressed_bytes == 20 * 16 + 16 * 4 + qparam_bytes
+
+
+def test_compression_stats_sparse_bitmask():
+    linear = torch.nn.Linear(20, 16, bias=False)
+    with torch.no_grad():
+        linear.weight.mul_(torch.rand_like(linear.weight) > 0.5)
+    model = torch.nn.Sequential(linear)
+
+    stats = calculate_compression_stats(model, sparsity_format="sparse-bitmask")
+    bitmask = BitmaskTensor.from_dense(linear.weight.data)
+    assert stats.compressed_bytes == bitmask.curr_memory_size_bytes()
+    assert stats.layers[0].sparsity_metadata_bytes == 16 * math.ceil(20 / 8) + 16 * 8
+
+
+def test_compression_stats_shared_parameters():
+    embedding = torch.nn.Embedding(16, 8)
+    lm_head = torch.nn.Linear(8, 16, bias=False)
+    lm_head.weight = embedding.weight
+    model = torch.nn.Sequential(embedding, lm_head)
+
+    stats = calculate_compression_stats(model)
+    assert [layer.name for layer in stats.layers] == ["0"]
+    assert stats.original_bytes == 16 * 8 * 4
+
+
+def test_compression_stats_no_parameters():
+    stats = calculate_compression_stats(torch.nn.Sequential(torch.nn.ReLU()))
+    assert stats.layers == []
+    assert stats.compression_ratio == 1.0
+    assert stats.bits_per_weight == 0.0
+
+
+@pytest.mark.parametrize("num_bits", [4, 8])
+def test_compression_stats_marlin_24(num_bits):
+    model = torch.nn.Sequential(torch.nn.Linear(256, 128, bias=False))
+    with torch.no_grad():
+        model[0].weight.mul_(mask_creator(model[0].weight))
+    config = QuantizationConfig.parse_obj(
+        {
+            "config_groups": {
+                "group_0": {
+                    "weights": {"num_bits": num_bits, "strategy": "channel"},
+                    "targets": ["Linear"],
+                },
+            },
+            "quantization_status": "calibration",
+        }
+    )
+    apply_quantization_config(model, config)
+    with torch.no_grad():
+        model(torch.randn(4, 256))
+
+    stats = calculate_compression_stats(model, quantization_format="marlin-24")
+    compressed_state_dict = Marlin24Compressor().compress(
+        model.state_dict(), map_modules_to_quant_args(model)
+    )
+    compressed_bytes = sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in compressed_state_dict.values()
+    )
+    meta_bytes = compressed_state_dict["0.meta"].numel() * 2
+    assert stats.compressed_bytes == compressed_bytes
+    assert stats.layers[0].sparsity_metadata_bytes == meta_bytes
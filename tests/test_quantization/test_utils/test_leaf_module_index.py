@@ -0,0 +1,140 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import weakref
+
+import torch
+from compressed_tensors.compressors.model_compressor import ModelCompressor
+from compressed_tensors.quantization import (
+    QuantizationArgs,
+    QuantizationConfig,
+    QuantizationScheme,
+    QuantizationStatus,
+    apply_quantization_config,
+    apply_quantization_status,
+)
+from compressed_tensors.quantization.observers import MovingAverageMinMaxObserver
+from compressed_tensors.quantization.utils import (
+    helpers,
+    is_model_quantized,
+    iter_named_leaf_modules,
+    leaf_module_index,
+)
+from safetensors.torch import save_file
+
+
+def _count_walks(monkeypatch):
+    walks = []
+    find_named_leaf_modules = helpers._find_named_leaf_modules
+
+    def counting_find_named_leaf_modules(module):
+        walks.append(module)
+        return find_named_leaf_modules(module)
+
+    monkeypatch.setattr(
+        helpers, "_find_named_leaf_modules", counting_find_named_leaf_modules
+    )
+    return walks
+
+
+def test_leaf_module_index(monkeypatch):
+    model = torch.nn.Sequential(
+        torch.nn.Linear(4, 4), torch.nn.Sequential(torch.nn.ReLU())
+    )
+    observer = MovingAverageMinMaxObserver(QuantizationArgs())
+    model[0].register_module("weight_observer", observer)
+    walks = _count_walks(monkeypatch)
+
+    # observers are neither leaves themselves nor prevent their parent from being one
+    with leaf_module_index(model):
+        assert [name for name, _ in iter_named_leaf_modules(model)] == ["0", "1.0"]
+        with leaf_module_index(model):
+            assert [name for name, _ in iter_named_leaf_modules(model)] == ["0", "1.0"]
+        assert [name for name, _ in iter_named_leaf_modules(model)] == ["0", "1.0"]
+    assert len(walks) == 1
+    assert not helpers._LEAF_MODULE_INDEXES
+
+    # outside of a context every call sees the current modules of the model
+    model[0] = torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.Linear(4, 4))
+    assert [name for name, _ in iter_named_leaf_modules(model)] == [
+        "0.0",
+        "0.1",
+        "1.0",
+    ]
+    del model[1]
+    assert [name for name, _ in iter_named_leaf_modules(model)] == ["0.0", "0.1"]
+    assert len(walks) == 3
+
+
+def test_leaf_module_index_releases_modules():
+    model = torch.nn.Linear(4, 4)
+    model_ref = weakref.ref(model)
+    with leaf_module_index(model):
+        assert is_model_quantized(model) is False
+    del model
+    gc.collect()
+    assert model_ref() is None
+
+
+def test_apply_quantization_config_sees_current_modules():
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    assert is_model_quantized(model) is False
+
+    # modules replaced after the model was last walked are found
+    model[0] = torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.Linear(4, 4))
+    scheme = QuantizationScheme(targets=["Linear"], weights=QuantizationArgs())
+    config = QuantizationConfig(config_groups={"group_0": scheme})
+    names_to_scheme = apply_quantization_config(model, config)
+    assert list(names_to_scheme) == ["0.0", "0.1"]
+    assert is_model_quantized(model)
+
+
+def test_quantization_config_from_pretrained_walks_once(monkeypatch):
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.Linear(4, 4))
+    scheme = QuantizationScheme(targets=["Linear"], weights=QuantizationArgs())
+    apply_quantization_config(
+        model, QuantizationConfig(config_groups={"group_0": scheme})
+    )
+
+    walks = _count_walks(monkeypatch)
+    assert QuantizationConfig.from_pretrained(model) is not None
+    assert len(walks) == 1
+
+
+def test_decompress_walks_once(monkeypatch, tmp_path):
+    scheme = QuantizationScheme(
+        targets=["Linear"],
+        weights=QuantizationArgs(num_bits=8, symmetric=True),
+        input_activations=QuantizationArgs(num_bits=8, symmetric=True),
+    )
+    config = QuantizationConfig(
+        config_groups={"group_0": scheme}, format="int-quantized"
+    )
+    model = torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.Linear(16, 16))
+    apply_quantization_config(model, config)
+    apply_quantization_status(model, QuantizationStatus.CALIBRATION)
+    with torch.no_grad():
+        model(torch.randn(4, 16))
+    apply_quantization_status(model, QuantizationStatus.FROZEN)
+
+    compressor = ModelCompressor(quantization_config=config)
+    save_file(compressor.compress(model), tmp_path / "model.safetensors")
+
+    decompressed = torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.Linear(16, 16))
+    walks = _count_walks(monkeypatch)
+    compressor.decompress(str(tmp_path), decompressed)
+    assert len(walks) == 1
+    assert torch.equal(decompressed[0].weight_scale, model[0].weight_scale)
+    assert torch.equal(decompressed[1].input_scale, model[1].input_scale)
@@ -0,0 +1,50 @@
+# Copyright (c) 2021 - present / Neuralmagic, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+import torch
+from compressed_tensors.utils import LazyStateDict
+from safetensors.torch import save_file
+from transformers.utils import SAFE_WEIGHTS_INDEX_NAME
+
+
+def test_lazy_state_dict(tmp_path):
+    shards = {
+        "model-00001.safetensors": {"a.weight": torch.rand(2, 3)},
+        "model-00002.safetensors": {
+            "b.weight": torch.rand(4),
+            "b.weight_scale": torch.rand(1),
+        },
+    }
+    weight_map = {}
+    for file_name, tensors in shards.items():
+        save_file(tensors, os.path.join(tmp_path, file_name))
+        weight_map.update({name: file_name for name in tensors})
+    with open(os.path.join(tmp_path, SAFE_WEIGHTS_INDEX_NAME), "w") as file:
+        json.dump({"weight_map": weight_map}, file)
+
+    with LazyStateDict(str(tmp_path)) as state_dict:
+        assert "b.weight_scale" in state_dict
+        assert "c.weight" not in state_dict
+        assert state_dict.get("c.weight") is None
+        for tensors in shards.values():
+            for name, tensor in tensors.items():
+                assert torch.equal(state_dict.get(name), tensor)
+
+        # one handle per shard, reused across reads
+        assert len(state_dict._handles) == 2
+
+    assert len(state_dict._handles) == 0